@@ -0,0 +1,35 @@
+"""add_referral_code_sequence
+
+Revision ID: 3c1d9a7b52e4
+Revises: 8ee7f667f606
+Create Date: 2026-10-16 09:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d9a7b52e4'
+down_revision: Union[str, Sequence[str], None] = '8ee7f667f606'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Block allocator backing collision-free referral codes (app.core.referral_codes)
+    op.execute("""
+        CREATE TABLE referral.referral_code_sequence (
+            name TEXT PRIMARY KEY,
+            next_value BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    op.execute("INSERT INTO referral.referral_code_sequence (name, next_value) VALUES ('referral_links', 0);")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE referral.referral_code_sequence;")
@@ -0,0 +1,52 @@
+"""add_email_outbox
+
+Revision ID: 5a7e2f1c9b83
+Revises: 3c1d9a7b52e4
+Create Date: 2026-10-16 11:02:17.334912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7e2f1c9b83'
+down_revision: Union[str, Sequence[str], None] = '3c1d9a7b52e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE TYPE email_outbox_status AS ENUM ('PENDING', 'SENT', 'DEAD');")
+
+    # Transactional outbox drained by the arq worker (app.worker)
+    op.execute("""
+        CREATE TABLE referral.email_outbox (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            kind TEXT NOT NULL,
+            recipient TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            html TEXT NOT NULL,
+            status email_outbox_status NOT NULL DEFAULT 'PENDING',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            last_error TEXT,
+            provider_message_id TEXT,
+            sent_at TIMESTAMPTZ,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    # The worker only ever scans due PENDING rows
+    op.create_index(
+        'idx_email_outbox_due', 'email_outbox', ['next_attempt_at'], schema='referral',
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE referral.email_outbox;")
+    op.execute("DROP TYPE email_outbox_status;")
@@ -0,0 +1,39 @@
+"""add_pending_invitation_indexes
+
+Revision ID: 7d4b8e2a6f10
+Revises: 5a7e2f1c9b83
+Create Date: 2026-10-16 13:47:05.918240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '7d4b8e2a6f10'
+down_revision: Union[str, Sequence[str], None] = '5a7e2f1c9b83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Duplicate check in create_invitation / bulk import: email lookup with the expiry
+    # carried in the index, so the check never touches the heap
+    op.create_index(
+        'idx_invitations_pending_email', 'invitations', ['email'], schema='referral',
+        postgresql_include=['expires_at'],
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+    # Expiry sweeper: keyset walk over overdue pending invitations in (expires_at, id) order
+    op.create_index(
+        'idx_invitations_pending_expires_at', 'invitations', ['expires_at', 'id'], schema='referral',
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_invitations_pending_expires_at', table_name='invitations', schema='referral')
+    op.drop_index('idx_invitations_pending_email', table_name='invitations', schema='referral')
@@ -0,0 +1,41 @@
+"""add_processed_transactions
+
+Revision ID: 9b3f6c2d8e41
+Revises: 7d4b8e2a6f10
+Create Date: 2026-10-16 15:20:41.602318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9b3f6c2d8e41'
+down_revision: Union[str, Sequence[str], None] = '7d4b8e2a6f10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Idempotency records for conversion calls; the primary key is what makes a
+    # retried transaction_id a no-op
+    op.execute("""
+        CREATE TABLE referral.processed_transactions (
+            transaction_id TEXT PRIMARY KEY,
+            request_fingerprint TEXT NOT NULL,
+            status_code INTEGER NOT NULL,
+            response_body BYTEA NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+    """)
+    # Age-based pruning walks the oldest records first
+    op.create_index(
+        'idx_processed_transactions_created_at', 'processed_transactions', ['created_at'], schema='referral'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE referral.processed_transactions;")
@@ -0,0 +1,37 @@
+"""add_referral_link_counter_shards
+
+Revision ID: c4e8a1f7d205
+Revises: 9b3f6c2d8e41
+Create Date: 2026-10-17 09:12:36.481907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f7d205'
+down_revision: Union[str, Sequence[str], None] = '9b3f6c2d8e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partial click/conversion counters, folded into referral_links by the worker
+    # (app.core.link_counters)
+    op.execute("""
+        CREATE TABLE referral.referral_link_counter_shards (
+            link_id UUID NOT NULL REFERENCES referral.referral_links(id) ON DELETE CASCADE,
+            shard INTEGER NOT NULL,
+            click_count INTEGER NOT NULL DEFAULT 0,
+            conversion_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (link_id, shard)
+        );
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE referral.referral_link_counter_shards;")
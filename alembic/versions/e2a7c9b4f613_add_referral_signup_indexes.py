@@ -0,0 +1,33 @@
+"""add_referral_signup_indexes
+
+Revision ID: e2a7c9b4f613
+Revises: c4e8a1f7d205
+Create Date: 2026-10-17 11:40:09.275164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7c9b4f613'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f7d205'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Incremental refresh of the referred user filter (app.core.referred_user_filter):
+    # referred users who signed up since the last refresh
+    op.create_index(
+        'idx_referrals_signed_up_at', 'referrals', ['signed_up_at'], schema='referral',
+        postgresql_include=['referred_user_id'],
+        postgresql_where=sa.text("referred_user_id IS NOT NULL")
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_referrals_signed_up_at', table_name='referrals', schema='referral')
@@ -0,0 +1,49 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.click_buffer import click_buffer
+from app.dependencies import get_db
+from app.services.link_service import LinkService
+
+router = APIRouter(tags=["Tracking"])
+
+
+def landing_url(unique_code: str, referral_id) -> str:
+    """The signup page URL carrying the referral code and the click's referral id."""
+    parts = urlsplit(settings.referral_landing_url)
+    query = parse_qsl(parts.query) + [("ref", unique_code), ("referral_id", str(referral_id))]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+@router.get(
+    "/r/{unique_code}",
+    status_code=status.HTTP_302_FOUND,
+    summary="Follow a referral link",
+    description="Records a click on the referral link and redirects the visitor to the signup page with the referral code and a referral id for the signup to report.",
+    response_class=RedirectResponse,
+)
+async def follow_referral_link(
+    unique_code: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Resolves the code (usually from the in-process link cache) and buffers the
+    click; the click count and the PENDING referral are written by the next
+    batched flush, not by this request.
+    """
+    link_id = await LinkService(db).resolve_code(unique_code)
+    if link_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Referral link not found"
+        )
+    referral_id = click_buffer.record(link_id)
+    return RedirectResponse(
+        landing_url(unique_code, referral_id),
+        status_code=status.HTTP_302_FOUND,
+        headers={"Cache-Control": "no-store"} # Every click must reach us to be counted
+    )
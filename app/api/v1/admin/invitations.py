@@ -1,10 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+import tempfile
+from collections import Counter
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.core.streaming import batched, iter_csv_column, iter_json_array
 from app.dependencies import get_db, get_current_admin_user # Assuming these dependencies exist
 from app.services.auth_service import AuthService
 from app.schemas.invitation import InvitationCreateResponse # Assuming this schema exists
-from app.exceptions import ConflictError # Import the custom exception
+from app.exceptions import ConflictError, ValidationError # Import the custom exceptions
 
 router = APIRouter(prefix="/admin/invitations", tags=["Admin - Invitations"])
 
@@ -13,7 +20,7 @@ router = APIRouter(prefix="/admin/invitations", tags=["Admin - Invitations"])
     response_model=InvitationCreateResponse, # Define response model
     status_code=status.HTTP_201_CREATED,
     summary="Create and send a participant invitation",
-    description="Creates a new invitation record and sends an email to the prospective participant. Requires Admin authentication."
+    description="Creates a new invitation record and queues an email to the prospective participant. Requires Admin authentication."
 )
 async def create_invitation(
     email: str, # Input for the email address
@@ -40,8 +47,90 @@ async def create_invitation(
             detail=str(e)
         )
     except Exception as e:
-        # Catch other potential errors during invitation creation or email sending
+        # Catch other potential errors during invitation creation
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create invitation: {e}"
-        )
\ No newline at end of file
+        )
+
+
+CSV_CONTENT_TYPES = {"text/csv", "application/csv", "text/plain"}
+RESULT_STATUSES = ("created", "already_invited", "duplicate", "invalid")
+
+
+async def _json_emails(chunks):
+    """Accepts a JSON array of email strings or of objects with an "email" key."""
+    async for item in iter_json_array(chunks):
+        yield item.get("email") if isinstance(item, dict) else item
+
+
+async def _stream_spooled(spool, chunk_size: int = 64 * 1024):
+    try:
+        spool.seek(0)
+        while chunk := spool.read(chunk_size):
+            yield chunk
+    finally:
+        spool.close()
+
+
+@router.post(
+    "/bulk",
+    status_code=status.HTTP_200_OK,
+    summary="Bulk import participant invitations",
+    description=(
+        "Creates invitations for a CSV (one email per row, optional \"email\" header) or JSON array "
+        "upload and queues the invitation emails in the email outbox. Responds with newline-delimited "
+        "JSON: one result per email followed by a summary line. Requires Admin authentication."
+    ),
+    response_class=StreamingResponse,
+)
+async def create_invitations_bulk(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_admin_user: dict = Depends(get_current_admin_user)
+):
+    """
+    Handles bulk invitation imports. The upload is parsed incrementally and processed
+    in batches (one duplicate check, multi-row INSERTs and one commit per batch),
+    and per-email results are spooled to a temporary file, so memory stays bounded
+    however large the upload is.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "application/json":
+        emails = _json_emails(request.stream())
+    elif content_type in CSV_CONTENT_TYPES:
+        emails = iter_csv_column(request.stream(), "email")
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload must be text/csv or application/json"
+        )
+
+    auth_service = AuthService(db)
+    summary = Counter({result_status: 0 for result_status in RESULT_STATUSES})
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.invitation_import_spool_bytes)
+    error = None
+    try:
+        async for batch in batched(emails, settings.invitation_import_batch_size):
+            for result in await auth_service.create_invitations_bulk(batch):
+                summary[result["status"]] += 1
+                result.pop("token", None)
+                spool.write(json.dumps(result, default=str).encode("utf-8") + b"\n")
+    except ValidationError as e:
+        if not sum(summary.values()):
+            spool.close()
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.detail)
+        # Earlier batches are already committed, so report them along with the error
+        error = e.detail
+    except Exception as e:
+        spool.close()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import invitations: {e}"
+        )
+
+    closing = {"summary": dict(summary, total=sum(summary.values()))}
+    if error:
+        closing["error"] = error
+    spool.write(json.dumps(closing).encode("utf-8") + b"\n")
+    return StreamingResponse(_stream_spooled(spool), media_type="application/x-ndjson")
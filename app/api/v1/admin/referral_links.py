@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dependencies import get_db, get_current_admin_user
+from app.services.link_service import LinkService
+from app.schemas.referral import ReferralLinkResponse
+from app.exceptions import NotFoundError
+
+router = APIRouter(prefix="/admin/referral-links", tags=["Admin - Referral Links"])
+
+@router.get(
+    "/{unique_code}",
+    response_model=ReferralLinkResponse,
+    summary="Get a referral link with exact counters",
+    description="Returns a referral link with its exact click and conversion totals, including increments not yet compacted from counter shards. Requires Admin authentication."
+)
+async def get_referral_link(
+    unique_code: str,
+    db: AsyncSession = Depends(get_db),
+    current_admin_user: dict = Depends(get_current_admin_user)
+):
+    link_service = LinkService(db)
+    try:
+        return await link_service.get_link(unique_code)
+    except NotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.detail
+        )
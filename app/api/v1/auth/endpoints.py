@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_db
 from app.services.auth_service import AuthService
 from app.schemas.auth import ParticipantRegisterPayload, JWTTokens
-from app.exceptions import NotFoundError, ConflictError, ValidationError
+from app.exceptions import NotFoundError, ConflictError, ValidationError, ServiceUnavailableError
 
 router = APIRouter(tags=["Authentication"])
 
@@ -50,6 +50,12 @@ async def register_participant(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=str(e)
         )
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.detail,
+            headers=e.headers
+        )
     except Exception as e:
         # Log the exception for debugging
         print(f"Error during registration: {e}")
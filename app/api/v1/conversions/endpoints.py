@@ -0,0 +1,160 @@
+import json
+from collections import Counter
+from typing import AsyncIterator
+
+import pydantic
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
+
+from app.config import settings
+from app.core.streaming import DuplexStreamingResponse, batched, iter_lines
+from app.dependencies import get_db, verify_api_key
+from app.services.tracking_service import BATCH_RESULT_STATUSES, TrackingService
+from app.schemas.conversion import ConversionPayload, ConversionResponse
+from app.exceptions import NotFoundError, ConflictError, ValidationError, ServiceUnavailableError
+
+router = APIRouter(tags=["Tracking"])
+
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+@router.post(
+    "",
+    response_model=ConversionResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Record a paid conversion",
+    description="Called by the Main SaaS platform for every successful payment by a referred user. Schedules an earning for the referrer. Idempotent on transaction_id: a retry receives the original response, marked with Idempotent-Replayed: true. Returns 503 with Retry-After when the write queue is full. Requires the X-API-KEY header.",
+    dependencies=[Depends(verify_api_key)]
+)
+async def process_conversion(
+    payload: ConversionPayload,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record a conversion for a referred user.
+
+    - **referred_user_id**: The user's ID in the Main SaaS platform
+    - **payment_amount**: The amount paid
+    - **transaction_id**: The payment processor's transaction ID
+    """
+    tracking_service = TrackingService(db)
+
+    try:
+        result = await tracking_service.process_conversion(payload)
+        # Send the stored bytes as-is so retries see exactly the original response
+        return Response(
+            content=result.body,
+            status_code=result.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"} if result.replayed else None
+        )
+    except NotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.detail
+        )
+    except ConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=e.detail
+        )
+    except ServiceUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=e.detail,
+            headers=e.headers
+        )
+    except Exception as e:
+        # Log the exception for debugging
+        print(f"Conversion processing error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while processing the conversion"
+        )
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_200_OK,
+    summary="Record a stream of paid conversions",
+    description=(
+        "Accepts newline-delimited JSON, one ConversionPayload per line, for catch-up replays. Records are "
+        "applied in chunks, each in its own transaction, and one result line per record (processed, "
+        "duplicate, not_found, cycle_complete, conflict or invalid) is streamed back as each chunk commits, "
+        "followed by a summary line. Idempotent on transaction_id. Requires the X-API-KEY header."
+    ),
+    response_class=StreamingResponse,
+    dependencies=[Depends(verify_api_key)]
+)
+async def process_conversions_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Handles batch conversion ingestion. The body is parsed line by line and each
+    chunk is applied before the next is read, so memory use depends on the chunk
+    size, not on the size of the upload.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Upload must be application/x-ndjson"
+        )
+    return DuplexStreamingResponse(
+        _stream_batch_results(_ndjson_records(request.stream()), TrackingService(db)),
+        media_type="application/x-ndjson"
+    )
+
+
+async def _ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple]:
+    """Yields (line number, payload, error) for each non-blank line; payload is None if invalid."""
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, ConversionPayload.model_validate_json(line), None
+        except pydantic.ValidationError as e:
+            yield line_number, None, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'record'}: {error['msg']}" for error in e.errors()
+            )
+
+
+async def _stream_batch_results(records: AsyncIterator[tuple], tracking_service: TrackingService) -> AsyncIterator[bytes]:
+    summary = Counter({result_status: 0 for result_status in BATCH_RESULT_STATUSES})
+    error = None
+    try:
+        async for chunk in batched(records, settings.conversion_batch_chunk_size):
+            payloads = [payload for _, payload, _ in chunk if payload is not None]
+            statuses = iter(await tracking_service.process_conversions_batch(payloads) if payloads else [])
+            lines = []
+            for line_number, payload, record_error in chunk:
+                if payload is None:
+                    result = {"line": line_number, "status": "invalid", "error": record_error}
+                else:
+                    result = {"line": line_number, "transaction_id": payload.transaction_id, "status": next(statuses)}
+                summary[result["status"]] += 1
+                lines.append(json.dumps(result))
+            # The chunk is committed; report it before reading the next one
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+    except ValidationError as e:
+        # Earlier chunks are already committed, so report them along with the error
+        error = e.detail
+    except ClientDisconnect:
+        # Nobody to report to; the unfinished chunk is rolled back when the session closes
+        raise
+    except Exception as e:
+        # Log the exception for debugging
+        print(f"Batch conversion processing error: {str(e)}")
+        await tracking_service.db.rollback()
+        error = "An error occurred while processing the batch; records after the last reported chunk were not applied"
+    finally:
+        await tracking_service.db.close()
+
+    closing = {"summary": dict(summary, total=sum(summary.values()))}
+    if error:
+        closing["error"] = error
+    yield (json.dumps(closing) + "\n").encode("utf-8")
@@ -1,15 +1,27 @@
 from fastapi import APIRouter
 
 from .admin import invitations as admin_invitations_router # Import the admin invitations router
+from .admin import referral_links as admin_referral_links_router # Import the admin referral links router
 from .auth import router as auth_router # Import the auth router
+from .conversions import router as conversions_router # Import the conversions router
+from .signups import router as signups_router # Import the signups router
 
 api_router = APIRouter()
 
 # Include the admin invitations router
 api_router.include_router(admin_invitations_router.router)
 
+# Include the admin referral links router
+api_router.include_router(admin_referral_links_router.router)
+
 # Include the auth router with prefix
 api_router.include_router(auth_router, prefix="/auth")
 
+# Include the conversions router (server-to-server, X-API-KEY)
+api_router.include_router(conversions_router, prefix="/conversions")
+
+# Include the signups router (server-to-server, X-API-KEY)
+api_router.include_router(signups_router, prefix="/signups")
+
 # You would include other routers for v1 here as they are created
 # api_router.include_router(participant_router.router)
\ No newline at end of file
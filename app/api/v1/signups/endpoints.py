@@ -0,0 +1,53 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dependencies import get_db, verify_api_key
+from app.services.link_service import LinkService
+from app.services.tracking_service import TrackingService
+from app.schemas.referral import SignupPayload, SignupResponse
+from app.exceptions import ConflictError
+
+router = APIRouter(tags=["Tracking"])
+
+@router.post(
+    "",
+    response_model=SignupResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Record a referred signup",
+    description="Called by the Main SaaS platform when a visitor who followed a referral link creates an account. Links the new user's ID to the referral so later payments count as conversions. Safe to retry. Requires the X-API-KEY header.",
+    dependencies=[Depends(verify_api_key)]
+)
+async def record_signup(
+    payload: SignupPayload,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record a signup for a referral.
+
+    - **referral_id**: The referral_id from the signup URL
+    - **referral_code**: The ref code from the signup URL
+    - **referred_user_id**: The new user's ID in the Main SaaS platform
+    """
+    link_id = await LinkService(db).resolve_code(payload.referral_code)
+    if link_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Referral link not found"
+        )
+
+    tracking_service = TrackingService(db)
+    try:
+        await tracking_service.record_signup(payload, link_id)
+        return SignupResponse()
+    except ConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=e.detail
+        )
+    except Exception as e:
+        # Log the exception for debugging
+        print(f"Signup processing error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while recording the signup"
+        )
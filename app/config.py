@@ -1,5 +1,6 @@
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
+from decimal import Decimal
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -12,7 +13,104 @@ class Settings(BaseSettings):
     jwt_secret_key: str = "test-secret-key-for-development-only-change-in-production"
     mpesa_api_key: Optional[str] = None
     resend_api_key: Optional[str] = None
+    resend_base_url: str = "https://api.resend.com"
     referral_base_url: str = "http://localhost:8000"
+    # Main SaaS signup page that /r/{code} redirects visitors to
+    referral_landing_url: str = "http://localhost:3000/signup"
+    # Static key the Main SaaS platform sends in X-API-KEY (conversions endpoint)
+    conversion_api_key: Optional[str] = None
+    redis_url: str = "redis://localhost:6379"
+
+    # Password hashing worker pool ("thread" or "process")
+    password_hash_pool: str = "thread"
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+
+    # Decoded JWT cache (0 disables caching)
+    jwt_cache_max_size: int = 10000
+    # Resolved principal cache for get_current_user (0 TTL disables it)
+    principal_cache_ttl_seconds: float = 30.0
+    principal_cache_max_size: int = 10000
+
+    # Referral code allocation. The key seeds the code permutation and must never
+    # change once codes have been issued, or new codes may collide with old ones.
+    referral_code_key: str = "jijenga-referral-codes"
+    referral_code_block_size: int = 100
+
+    # Bulk invitation import: rows per INSERT/commit, and how many bytes of
+    # per-email results are kept in memory before spilling to a temporary file
+    invitation_import_batch_size: int = 500
+    invitation_import_spool_bytes: int = 1024 * 1024
+
+    # Referral link clicks (/r/{code}): resolved codes are cached in process, and
+    # clicks are buffered and written in batches
+    referral_link_cache_ttl_seconds: float = 60.0
+    referral_link_cache_max_size: int = 100000
+    click_flush_interval_seconds: float = 2.0
+    click_buffer_max_pending: int = 5000 # Flush early once this many clicks are waiting
+
+    # Sharded link counters. With N > 0, click and conversion increments go to one of
+    # N shard rows per link instead of the link's own row, and a worker job folds
+    # them back into referral_links; 0 updates the columns directly.
+    link_counter_shards: int = 0
+    link_counter_compact_chunk_size: int = 1000 # Links per compaction transaction
+    link_counter_compact_max_chunks: int = 100 # Per run
+
+    # Bloom filter of known referred_user_ids that answers conversions for users who
+    # were never referred without a database lookup. 2 MiB holds 1M ids at a
+    # false-positive rate of about 0.03%; 0 disables the filter.
+    referred_user_filter_bytes: int = 2 * 1024 * 1024
+    referred_user_filter_expected_items: int = 1000000
+    referred_user_filter_refresh_seconds: float = 5.0 # Picks up signups from other replicas
+
+    # Earnings created per paid conversion
+    earning_amount: Decimal = Decimal("50.00")
+    earning_due_days: int = 0 # Days after the conversion before an earning can be paid out
+
+    # NDJSON batch conversions: records per transaction (and per streamed result chunk)
+    conversion_batch_chunk_size: int = 500
+
+    # Group commit of single conversions: requests are queued and written in
+    # micro-batches of up to max_batch_size, or whatever arrived within the window
+    # after the first, one transaction per batch. A full queue answers 503; a batch
+    # size of 0 commits every request on its own.
+    conversion_queue_max_batch_size: int = 100
+    conversion_queue_window_seconds: float = 0.002
+    conversion_queue_max_pending: int = 2000
+
+    # Conversion idempotency (processed_transactions). Retention must be longer than
+    # the Main SaaS platform's retry window, or a late retry would be processed again.
+    idempotency_cache_max_size: int = 50000
+    idempotency_cache_ttl_seconds: float = 3600.0
+    idempotency_retention_days: int = 30
+    idempotency_prune_chunk_size: int = 5000
+
+    # Invitation expiry sweeper (app.worker)
+    invitation_sweep_chunk_size: int = 1000
+    invitation_sweep_max_chunks: int = 100 # Per run
+
+    # Resend HTTP client. A single send (retries included) must finish within the
+    # request deadline; the outbox worker's batch sends get the longer batch deadline.
+    email_http2: bool = True
+    email_max_connections: int = 20
+    email_max_keepalive_connections: int = 10
+    email_keepalive_expiry_seconds: float = 30.0
+    email_connect_timeout_seconds: float = 0.1
+    email_request_deadline_seconds: float = 0.3
+    email_batch_deadline_seconds: float = 5.0
+    email_max_retries: int = 2
+    email_retry_backoff_seconds: float = 0.05
+    email_breaker_failure_threshold: int = 5
+    email_breaker_reset_seconds: float = 30.0
+
+    # Email outbox delivery (app.worker)
+    email_outbox_poll_seconds: int = 5
+    email_outbox_batch_size: int = 100
+    email_outbox_max_batches: int = 50 # Per drain run
+    email_outbox_max_attempts: int = 8 # Then the email is marked DEAD
+    email_outbox_backoff_base_seconds: float = 30.0
+    email_outbox_backoff_max_seconds: float = 3600.0
+    email_outbox_lease_seconds: int = 300
     
     model_config = SettingsConfigDict(
         env_file='.env',
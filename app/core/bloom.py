@@ -0,0 +1,42 @@
+"""
+Fixed-size Bloom filter.
+
+Answers "definitely not present" or "possibly present" for string keys in a
+bytearray of a configurable size. Bit positions come from double hashing of one
+BLAKE2b digest per key, so add() and membership tests cost one hash regardless
+of the number of hash functions.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Bloom filter of size_bytes bytes tuned for expected_items keys."""
+
+    def __init__(self, size_bytes: int, expected_items: int):
+        self.size_bytes = max(1, size_bytes)
+        self.bit_count = self.size_bytes * 8
+        # Optimal number of hash functions for the expected load: (m / n) ln 2
+        self.hash_count = max(1, round(self.bit_count / max(1, expected_items) * math.log(2)))
+        self.items = 0
+        self._bits = bytearray(self.size_bytes)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.bit_count
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.items += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_false_positive_rate(self) -> float:
+        """(1 - e^(-kn/m))^k for the keys added so far."""
+        return (1 - math.exp(-self.hash_count * self.items / self.bit_count)) ** self.hash_count
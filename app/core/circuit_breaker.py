@@ -0,0 +1,89 @@
+"""
+Circuit breaker for calls to external services.
+
+After failure_threshold consecutive failures the breaker opens and every call fails
+fast with CircuitOpenError instead of waiting on a provider that is down. Once
+reset_timeout seconds have passed it lets a limited number of probe calls through
+(half-open): a successful probe closes it again, a failed one re-opens it.
+
+Callers report outcomes themselves, so they decide what counts as a failure
+(typically timeouts, connection errors and 5xx responses, but not 4xx).
+"""
+import time
+from typing import Callable
+
+from app.core import metrics
+from app.exceptions import CircuitOpenError
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = metrics.gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)")
+breaker_rejected = metrics.counter("circuit_breaker_rejected_total", "Calls rejected while a circuit breaker was open")
+breaker_opened = metrics.counter("circuit_breaker_opened_total", "Times a circuit breaker opened")
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe phase."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        breaker_state.set(_STATE_VALUES[CLOSED], name=name)
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker will let a probe call through."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not be attempted."""
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._probes >= self.half_open_max_calls):
+            breaker_rejected.inc(name=self.name)
+            raise CircuitOpenError(self.name, retry_after=self.retry_after() or self.reset_timeout)
+        if state == HALF_OPEN:
+            self._probes += 1
+
+    def record_success(self):
+        self._failures = 0
+        if self._state != CLOSED:
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+            self._transition(OPEN)
+
+    def reset(self):
+        self._failures = 0
+        self._transition(CLOSED)
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = self._clock()
+            breaker_opened.inc(name=self.name)
+        breaker_state.set(_STATE_VALUES[state], name=self.name)
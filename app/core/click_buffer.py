@@ -0,0 +1,157 @@
+"""
+Write-coalesced referral click tracking.
+
+A click must not cost an UPDATE of its link's row: popular links would serialise
+every visitor on that one row lock. Instead the redirect endpoint records clicks in
+process (ClickBuffer.record is a dict increment and a list append) and a background
+task flushes them every click_flush_interval_seconds, or as soon as
+click_buffer_max_pending clicks are waiting, in one transaction:
+
+    UPDATE referral_links SET click_count = click_count + :clicks WHERE id = :id
+        -- executemany, one row per clicked link
+    INSERT INTO referrals (...) VALUES (...), (...)
+        -- the PENDING referral of every click
+
+so a link clicked a thousand times between flushes costs one row update (or one
+shard upsert, see app.core.link_counters). Clicks
+still buffered when the process stops are flushed by the application lifespan; a
+crash loses at most one interval of clicks. Failed flushes are put back and
+retried on the next tick.
+"""
+import asyncio
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core import metrics
+from app.core.link_counters import add_to_links
+from app.models.database_utils import dialect_insert
+from app.models.referral import Referral, ReferralStatus
+
+clicks_recorded = metrics.counter("referral_clicks_total", "Referral link clicks recorded")
+clicks_dropped = metrics.counter("referral_clicks_dropped_total", "Buffered clicks dropped after failed flushes")
+click_flush_seconds = metrics.histogram("referral_click_flush_seconds", "Time spent flushing buffered clicks")
+clicks_pending = metrics.gauge("referral_clicks_pending", "Clicks waiting to be flushed")
+
+
+class ClickBuffer:
+    """In-process accumulator of link clicks and their PENDING referrals."""
+
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._counts: Counter = Counter()
+        self._referrals: List[dict] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._referrals)
+
+    def record(self, link_id: uuid.UUID) -> uuid.UUID:
+        """Counts a click on link_id and returns the id of its (not yet written) referral."""
+        now = datetime.utcnow()
+        referral_id = uuid.uuid4()
+        self._counts[link_id] += 1
+        self._referrals.append(dict(
+            id=referral_id,
+            referral_link_id=link_id,
+            status=ReferralStatus.PENDING,
+            earnings_paid_count=0,
+            created_at=now,
+            updated_at=now
+        ))
+        clicks_recorded.inc()
+        clicks_pending.set(len(self._referrals))
+        if len(self._referrals) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+        return referral_id
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Writes every buffered click in one transaction and returns how many were written."""
+        counts, referrals = self._counts, self._referrals
+        if not referrals:
+            return 0
+        self._counts, self._referrals = Counter(), []
+        now = datetime.utcnow()
+        started = asyncio.get_running_loop().time()
+        try:
+            await add_to_links(db, "click_count", counts, now)
+            # A signup reported before its click was flushed has already created the referral
+            await db.execute(
+                dialect_insert(db.bind.dialect.name, Referral.__table__)
+                .on_conflict_do_nothing(index_elements=[Referral.__table__.c.id]),
+                referrals
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            self._requeue(counts, referrals)
+            raise
+        finally:
+            click_flush_seconds.observe(asyncio.get_running_loop().time() - started)
+            clicks_pending.set(len(self._referrals))
+        return len(referrals)
+
+    def _requeue(self, counts: Dict[uuid.UUID, int], referrals: List[dict]):
+        """Puts a failed flush back in front of newer clicks, within the pending limit."""
+        room = max(0, 10 * self.max_pending - len(self._referrals))
+        if len(referrals) > room:
+            clicks_dropped.inc(len(referrals) - room)
+            referrals = referrals[:room]
+            counts = Counter(row["referral_link_id"] for row in referrals)
+        self._referrals = referrals + self._referrals
+        self._counts.update(counts)
+
+    def reset(self):
+        """Forgets every buffered click."""
+        self._counts, self._referrals = Counter(), []
+        clicks_pending.set(0)
+
+    def start(self, session_factory: Callable[[], AsyncSession]):
+        """Starts the periodic flush task (called from the application lifespan)."""
+        if self._task is None:
+            self._session_factory = session_factory
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the flush task and writes whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._wakeup = None
+        if self._session_factory is not None and self.pending:
+            async with self._session_factory() as db:
+                await self.flush(db)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                async with self._session_factory() as db:
+                    await self.flush(db)
+            except Exception as e:
+                # Log and retry on the next tick; the clicks were put back
+                print(f"Click flush failed: {e}")
+
+
+# Instantiate the buffer (process-wide; started and drained by the application lifespan)
+click_buffer = ClickBuffer(
+    flush_interval=settings.click_flush_interval_seconds,
+    max_pending=settings.click_buffer_max_pending,
+)
@@ -0,0 +1,97 @@
+"""
+Bounded worker pools for CPU-bound work that must not run on the event loop.
+
+A BoundedExecutor wraps a thread or process pool and limits how much work may
+be waiting for it. When both the workers and the queue are full, new work is
+rejected with ServiceUnavailableError (503) instead of piling up behind the
+event loop.
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from app.core import metrics
+from app.exceptions import ServiceUnavailableError
+
+pool_queue_depth = metrics.gauge("worker_pool_queue_depth", "Tasks waiting for a free worker")
+pool_in_flight = metrics.gauge("worker_pool_in_flight", "Tasks currently running on a worker")
+pool_rejected = metrics.counter("worker_pool_rejected_total", "Tasks rejected because the pool was saturated")
+pool_task_seconds = metrics.histogram("worker_pool_task_seconds", "Execution time of pool tasks")
+pool_wait_seconds = metrics.histogram("worker_pool_wait_seconds", "Time tasks spent queued before running")
+
+
+def _timed_call(fn: Callable, *args) -> tuple:
+    """Runs fn inside the worker and reports when it started and how long it took."""
+    started = time.time()
+    result = fn(*args)
+    return started, time.time() - started, result
+
+
+class BoundedExecutor:
+    """Thread or process pool with a bounded queue and per-pool metrics."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, kind: str = "thread"):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unsupported pool kind: {kind}")
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.kind = kind
+        self._executor: Optional[Executor] = None
+        self._pending = 0  # queued + running tasks
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of submitted tasks still waiting for a worker."""
+        return max(0, self._pending - self.max_workers)
+
+    @property
+    def in_flight(self) -> int:
+        return min(self._pending, self.max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix=self.name
+                )
+        return self._executor
+
+    def _update_gauges(self):
+        pool_queue_depth.set(self.queue_depth, pool=self.name)
+        pool_in_flight.set(self.in_flight, pool=self.name)
+
+    async def run(self, fn: Callable, *args, op: str = "task") -> Any:
+        """
+        Runs fn(*args) on the pool and awaits its result.
+
+        Raises:
+            ServiceUnavailableError: If the pool and its queue are already full
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            pool_rejected.inc(pool=self.name, op=op)
+            raise ServiceUnavailableError(f"The {self.name} pool is saturated, please retry shortly")
+
+        self._pending += 1
+        self._update_gauges()
+        submitted = time.time()
+        try:
+            loop = asyncio.get_running_loop()
+            started, elapsed, result = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, *args
+            )
+            pool_wait_seconds.observe(max(0.0, started - submitted), pool=self.name, op=op)
+            pool_task_seconds.observe(elapsed, pool=self.name, op=op)
+            return result
+        finally:
+            self._pending -= 1
+            self._update_gauges()
+
+    def shutdown(self, wait: bool = True):
+        """Stops the underlying pool; a new one is created lazily on next use."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
@@ -0,0 +1,148 @@
+"""
+Group commit for small, latency-tolerant writes.
+
+Committing every request on its own costs one transaction (and one WAL fsync on
+PostgreSQL) per request, which caps write throughput under bursts. A
+GroupCommitQueue instead puts each submitted item on a bounded asyncio queue; one
+writer task takes up to max_batch_size items at a time, waiting at most
+max_wait seconds after the first one for more to arrive, and hands the whole
+micro-batch to apply(db, items) in one session. apply returns one result per item
+(an exception instance fails just that item) and each caller's future is resolved
+once the batch has committed.
+
+A full queue rejects new items with ServiceUnavailableError (503) instead of
+letting latency grow without bound. Items still queued when the process stops are
+written by the application lifespan.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import metrics
+from app.exceptions import ServiceUnavailableError
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+group_commit_batch_size = metrics.histogram(
+    "group_commit_batch_size", "Items written per group-commit transaction", buckets=BATCH_SIZE_BUCKETS
+)
+group_commit_wait_seconds = metrics.histogram(
+    "group_commit_wait_seconds", "Time items spent queued before their batch was written"
+)
+group_commit_seconds = metrics.histogram("group_commit_seconds", "Time spent writing a group-commit batch")
+group_commit_rejected = metrics.counter("group_commit_rejected_total", "Items rejected because the queue was full")
+group_commit_pending = metrics.gauge("group_commit_pending", "Items waiting for the writer")
+
+ApplyBatch = Callable[[AsyncSession, List[Any]], Awaitable[List[Any]]]
+
+
+class GroupCommitQueue:
+    """Bounded queue of items written in micro-batches by a single writer task."""
+
+    def __init__(self, name: str, apply: ApplyBatch, max_batch_size: int, max_wait: float, max_pending: int):
+        self.name = name
+        self.apply = apply
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self.max_pending = max(1, max_pending)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+
+    @property
+    def running(self) -> bool:
+        """True while submit() accepts items."""
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item: Any) -> Any:
+        """
+        Queues item and waits until its batch has committed. Returns its result or
+        raises the exception apply() reported for it.
+
+        Raises:
+            ServiceUnavailableError: If the queue is full (or not running)
+        """
+        if not self.running:
+            raise ServiceUnavailableError(f"The {self.name} queue is not accepting writes, please retry shortly")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        try:
+            self._queue.put_nowait((item, future, loop.time()))
+        except asyncio.QueueFull:
+            group_commit_rejected.inc(queue=self.name)
+            raise ServiceUnavailableError(f"The {self.name} queue is full, please retry shortly")
+        group_commit_pending.set(self.pending, queue=self.name)
+        return await future
+
+    def start(self, session_factory: Callable[[], AsyncSession]):
+        """Starts the writer task (called from the application lifespan)."""
+        if self._task is None:
+            self._session_factory = session_factory
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops accepting items and waits for the writer to commit the ones already queued."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(None) # Queued behind every accepted item
+        await task
+        self._queue = None
+        group_commit_pending.set(0, queue=self.name)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            entry = await self._queue.get()
+            if entry is None:
+                break
+            batch = [entry]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    entry = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        entry = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            group_commit_pending.set(self.pending, queue=self.name)
+            await self._write(batch)
+
+    async def _write(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _, _, submitted in batch:
+            group_commit_wait_seconds.observe(started - submitted, queue=self.name)
+        group_commit_batch_size.observe(len(batch), queue=self.name)
+        try:
+            async with self._session_factory() as db:
+                results = await self.apply(db, [item for item, _, _ in batch])
+        except Exception as e:
+            # Log it; every caller in the batch gets the error
+            print(f"{self.name} group commit failed: {e}")
+            results = [e] * len(batch)
+        finally:
+            group_commit_seconds.observe(loop.time() - started, queue=self.name)
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue # The caller went away; a retry replays the committed result
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,154 @@
+"""
+Two-tier idempotency store for retried server-to-server calls.
+
+The processed_transactions table is the source of truth: a call claims its
+transaction id with INSERT ... ON CONFLICT DO NOTHING in the same transaction as
+its writes, so exactly one delivery of a transaction id can commit, and the row
+carries the exact response (status and body bytes) that delivery returned.
+
+In front of it sits a process-local LRU/TTL cache of recent responses. A retry that
+reaches the same process is answered from memory with no database round trip; one
+that reaches another replica costs a single primary-key read. Either way the stored
+bytes are replayed unchanged. A reused transaction id whose request differs from
+the original is rejected rather than replayed.
+
+Records older than settings.idempotency_retention_days are deleted by
+prune_processed_transactions (scheduled in app.worker).
+"""
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, NamedTuple, Optional
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.core.ttl_cache import TTLCache
+from app.models.database_utils import dialect_insert
+from app.models.processed_transaction import ProcessedTransaction
+
+idempotent_replays = metrics.counter("idempotent_replays_total", "Duplicate transactions answered with a stored response")
+
+
+class StoredResponse(NamedTuple):
+    status_code: int
+    body: bytes
+    fingerprint: str
+    replayed: bool = False
+
+
+_cache = TTLCache(
+    max_size=settings.idempotency_cache_max_size,
+    ttl=settings.idempotency_cache_ttl_seconds,
+)
+
+
+def request_fingerprint(*parts: str) -> str:
+    """SHA-256 of the request fields that define a transaction."""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def cached_response(transaction_id: str) -> Optional[StoredResponse]:
+    return _cache.get(transaction_id)
+
+
+def remember_response(transaction_id: str, response: StoredResponse):
+    _cache.set(transaction_id, response._replace(replayed=False))
+
+
+def clear_idempotency_cache():
+    _cache.clear()
+
+
+def replay(response: StoredResponse, fingerprint: str, source: str) -> Optional[StoredResponse]:
+    """
+    Returns the stored response for a duplicate, or None if the transaction id was
+    first used for a different request.
+    """
+    if response.fingerprint != fingerprint:
+        return None
+    idempotent_replays.inc(source=source)
+    return response._replace(replayed=True)
+
+
+def _record_values(transaction_id: str, response: StoredResponse, now: datetime) -> dict:
+    return dict(
+        transaction_id=transaction_id,
+        request_fingerprint=response.fingerprint,
+        status_code=response.status_code,
+        response_body=response.body,
+        created_at=now
+    )
+
+
+def claim_statement(dialect_name: str, transaction_id: str, response: StoredResponse, now: datetime):
+    """
+    INSERT of the idempotency record that returns the transaction id only if this
+    call claimed it (no row means the transaction was already processed).
+    """
+    return claim_many_statement(dialect_name, {transaction_id: response}, now)
+
+
+def claim_many_statement(dialect_name: str, responses: Dict[str, StoredResponse], now: datetime):
+    """Multi-row claim; returns the transaction ids that were claimed."""
+    table = ProcessedTransaction.__table__
+    return (
+        dialect_insert(dialect_name, table)
+        .values([_record_values(transaction_id, response, now) for transaction_id, response in responses.items()])
+        .on_conflict_do_nothing(index_elements=[table.c.transaction_id])
+        .returning(table.c.transaction_id)
+    )
+
+
+def release_statement(transaction_ids: Iterable[str]):
+    """Deletes claims for transactions that were not processed, so they can be retried."""
+    table = ProcessedTransaction.__table__
+    return delete(table).where(table.c.transaction_id.in_(list(transaction_ids)))
+
+
+async def load_response(db: AsyncSession, transaction_id: str) -> Optional[StoredResponse]:
+    """Reads a committed idempotency record and warms the cache with it."""
+    return (await load_responses(db, [transaction_id])).get(transaction_id)
+
+
+async def load_responses(db: AsyncSession, transaction_ids: Iterable[str]) -> Dict[str, StoredResponse]:
+    """Reads committed idempotency records in one query and warms the cache with them."""
+    table = ProcessedTransaction.__table__
+    rows = (await db.execute(
+        select(table.c.transaction_id, table.c.status_code, table.c.response_body, table.c.request_fingerprint)
+        .where(table.c.transaction_id.in_(list(transaction_ids)))
+    )).all()
+    responses = {}
+    for row in rows:
+        responses[row.transaction_id] = StoredResponse(row.status_code, bytes(row.response_body), row.request_fingerprint)
+        remember_response(row.transaction_id, responses[row.transaction_id])
+    return responses
+
+
+async def prune_processed_transactions(db: AsyncSession, retention: Optional[timedelta] = None,
+                                       chunk_size: Optional[int] = None) -> int:
+    """
+    Deletes idempotency records older than the retention period in chunks of at
+    most chunk_size rows, each committed on its own, and returns how many were removed.
+    """
+    retention = retention or timedelta(days=settings.idempotency_retention_days)
+    chunk_size = chunk_size or settings.idempotency_prune_chunk_size
+    table = ProcessedTransaction.__table__
+    cutoff = datetime.utcnow() - retention
+    pruned = 0
+    while True:
+        chunk = (
+            select(table.c.transaction_id)
+            .where(table.c.created_at < cutoff)
+            .order_by(table.c.created_at)
+            .limit(chunk_size)
+            .with_for_update(skip_locked=True) # Ignored on SQLite
+            .scalar_subquery()
+        )
+        deleted = (await db.execute(delete(table).where(table.c.transaction_id.in_(chunk)))).rowcount
+        await db.commit()
+        pruned += deleted
+        if deleted < chunk_size:
+            return pruned
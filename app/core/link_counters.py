@@ -0,0 +1,159 @@
+"""
+Optionally sharded click and conversion counters for referral links.
+
+referral_links.click_count and conversion_count are single columns, so every
+conversion (and every click flush) for one popular referrer queues on that link's
+row lock. With settings.link_counter_shards = N > 0, increments instead upsert one
+of N rows in referral_link_counter_shards, chosen at random, so N writers to the
+same link proceed in parallel:
+
+    INSERT INTO referral_link_counter_shards (link_id, shard, click_count, conversion_count)
+    VALUES (:link_id, :random_shard, :clicks, :conversions)
+    ON CONFLICT (link_id, shard) DO UPDATE
+        SET click_count = shards.click_count + excluded.click_count, ...
+
+A link's exact totals are its columns plus the sum of its shards (link_totals reads
+both in one statement). compact_link_counters, run by the worker, deletes shard rows
+and adds them to the columns in the same transaction, so totals are never counted
+twice or lost, and the columns stay close to current for plain reads.
+
+With N = 0 (the default) increments update the columns directly.
+"""
+import random
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, delete, func, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.models.database_utils import dialect_insert
+from app.models.referral_link import ReferralLink
+from app.models.referral_link_counter_shard import ReferralLinkCounterShard
+
+COUNTER_COLUMNS = ("click_count", "conversion_count")
+
+links_compacted = metrics.counter("link_counter_links_compacted_total", "Links whose counter shards were folded into referral_links")
+
+
+def sharding_enabled() -> bool:
+    return settings.link_counter_shards > 0
+
+
+def random_shard() -> int:
+    return random.randrange(settings.link_counter_shards)
+
+
+def shard_upsert(dialect_name: str, rows):
+    """
+    Upsert adding click_count/conversion_count to shard rows. rows is a list of
+    values (no two for the same link_id and shard) or a SELECT of
+    (link_id, shard, click_count, conversion_count).
+    """
+    table = ReferralLinkCounterShard.__table__
+    statement = dialect_insert(dialect_name, table)
+    if isinstance(rows, list):
+        statement = statement.values(rows)
+    else:
+        statement = statement.from_select(["link_id", "shard", *COUNTER_COLUMNS], rows)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.link_id, table.c.shard],
+        set_={column: table.c[column] + statement.excluded[column] for column in COUNTER_COLUMNS}
+    )
+
+
+def shard_increment_select(link_id_column, column: str):
+    """SELECT feeding shard_upsert: adds one to column for each link id selected."""
+    return select(
+        link_id_column,
+        literal(random_shard()),
+        *[literal(1 if name == column else 0) for name in COUNTER_COLUMNS]
+    )
+
+
+async def add_to_links(db: AsyncSession, column: str, increments: Dict[uuid.UUID, int], now: datetime):
+    """Adds increments[link_id] to each link's column, or to a random shard of it."""
+    # Sorted so concurrent writers lock rows in the same order
+    ordered = sorted(increments.items(), key=lambda item: str(item[0]))
+    if not ordered:
+        return
+    if sharding_enabled():
+        await db.execute(shard_upsert(db.bind.dialect.name, [
+            dict({name: 0 for name in COUNTER_COLUMNS}, link_id=link_id, shard=random_shard(), **{column: count})
+            for link_id, count in ordered
+        ]))
+        return
+    links = ReferralLink.__table__
+    await db.execute(
+        update(links)
+        .where(links.c.id == bindparam("b_id"))
+        .values({column: links.c[column] + bindparam("b_count"), "updated_at": now}),
+        [{"b_id": link_id, "b_count": count} for link_id, count in ordered]
+    )
+
+
+async def link_totals(db: AsyncSession, link_ids: Iterable[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, int]]:
+    """Exact click and conversion totals (columns plus shards) of each link, in one query."""
+    links = ReferralLink.__table__
+    shards = ReferralLinkCounterShard.__table__
+    link_ids = list(link_ids)
+    shard_sums = (
+        select(shards.c.link_id, *[func.sum(shards.c[column]).label(column) for column in COUNTER_COLUMNS])
+        .where(shards.c.link_id.in_(link_ids))
+        .group_by(shards.c.link_id)
+        .subquery()
+    )
+    rows = (await db.execute(
+        select(links.c.id, *[
+            (links.c[column] + func.coalesce(shard_sums.c[column], 0)).label(column) for column in COUNTER_COLUMNS
+        ])
+        .outerjoin(shard_sums, shard_sums.c.link_id == links.c.id)
+        .where(links.c.id.in_(link_ids))
+    )).all()
+    return {row.id: {column: int(row._mapping[column]) for column in COUNTER_COLUMNS} for row in rows}
+
+
+async def compact_link_counters(db: AsyncSession, chunk_size: Optional[int] = None,
+                                max_chunks: Optional[int] = None) -> int:
+    """
+    Folds counter shards into referral_links, chunk_size links per transaction, and
+    returns how many links were compacted. Each chunk deletes its shard rows
+    (RETURNING their counts) and adds the sums to the links atomically.
+    """
+    chunk_size = chunk_size or settings.link_counter_compact_chunk_size
+    max_chunks = max_chunks or settings.link_counter_compact_max_chunks
+    links = ReferralLink.__table__
+    shards = ReferralLinkCounterShard.__table__
+    compacted = 0
+    for _ in range(max_chunks):
+        chunk = select(shards.c.link_id).distinct().limit(chunk_size).scalar_subquery()
+        drained = (await db.execute(
+            delete(shards)
+            .where(shards.c.link_id.in_(chunk))
+            .returning(shards.c.link_id, *[shards.c[column] for column in COUNTER_COLUMNS])
+        )).all()
+        totals: Dict[uuid.UUID, List[int]] = {}
+        for row in drained:
+            sums = totals.setdefault(row.link_id, [0] * len(COUNTER_COLUMNS))
+            for i, column in enumerate(COUNTER_COLUMNS):
+                sums[i] += row._mapping[column]
+        if totals:
+            await db.execute(
+                update(links)
+                .where(links.c.id == bindparam("b_id"))
+                .values({column: links.c[column] + bindparam(f"b_{column}") for column in COUNTER_COLUMNS}),
+                [
+                    dict({f"b_{column}": sums[i] for i, column in enumerate(COUNTER_COLUMNS)}, b_id=link_id)
+                    for link_id, sums in sorted(totals.items(), key=lambda item: str(item[0]))
+                ]
+            )
+        await db.commit()
+        compacted += len(totals)
+        if len(totals) < chunk_size:
+            break
+    if compacted:
+        links_compacted.inc(compacted)
+    return compacted
@@ -0,0 +1,103 @@
+"""
+Short-TTL cache of authenticated principals (participants and admins).
+
+get_current_user resolves the caller on every authenticated request. With this
+cache most requests need no auth queries at all: the resolved principal's column
+values are kept for a few seconds and a fresh, session-less instance is built from
+them on each hit, so concurrent requests never share ORM state.
+
+Entries are invalidated as soon as a user's status or an admin's role changes
+through the ORM (flushes and ORM-enabled UPDATE statements). Changes made on other
+replicas or through raw Core statements are bounded by the TTL.
+"""
+from typing import Optional, Union
+from uuid import UUID
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core import metrics
+from app.core.security import PRINCIPAL_ADMIN, PRINCIPAL_PARTICIPANT
+from app.core.ttl_cache import TTLCache
+from app.models.admin_user import AdminUser
+from app.models.user import User
+
+principal_cache_hits = metrics.counter("principal_cache_hits_total", "Principals resolved from the cache")
+principal_cache_misses = metrics.counter("principal_cache_misses_total", "Principals loaded from the database")
+
+# Principal type claim value -> model
+PRINCIPAL_MODELS = {
+    PRINCIPAL_ADMIN: AdminUser,
+    PRINCIPAL_PARTICIPANT: User,
+}
+# Attributes whose change must immediately invalidate a cached principal
+_INVALIDATING_ATTRIBUTES = {
+    User: ("status",),
+    AdminUser: ("role",),
+}
+
+_cache = TTLCache(
+    max_size=settings.principal_cache_max_size,
+    ttl=settings.principal_cache_ttl_seconds,
+)
+
+
+def _snapshot(principal: Union[User, AdminUser]) -> dict:
+    state = inspect(principal)
+    return {attr.key: state.dict.get(attr.key) for attr in state.mapper.column_attrs}
+
+
+def get_principal(principal_type: str, user_id: UUID) -> Optional[Union[User, AdminUser]]:
+    """Returns a detached copy of a cached principal, or None on a miss."""
+    model = PRINCIPAL_MODELS.get(principal_type)
+    if model is None:
+        return None
+    values = _cache.get((principal_type, user_id))
+    if values is None:
+        principal_cache_misses.inc(type=principal_type)
+        return None
+    principal_cache_hits.inc(type=principal_type)
+    return model(**values)
+
+
+def cache_principal(principal_type: str, principal: Union[User, AdminUser]):
+    """Stores a freshly loaded principal."""
+    _cache.set((principal_type, principal.id), _snapshot(principal))
+
+
+def invalidate_principal(user_id: UUID):
+    """Drops any cached principal with this id."""
+    for principal_type in PRINCIPAL_MODELS:
+        _cache.pop((principal_type, user_id))
+
+
+def clear_principal_cache():
+    _cache.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(AdminUser, "after_update")
+def _invalidate_on_update(mapper, connection, target):
+    """Invalidates a principal when an ORM flush changes its status or role."""
+    state = inspect(target)
+    for key in _INVALIDATING_ATTRIBUTES.get(type(target), ()):
+        if state.attrs[key].history.has_changes():
+            invalidate_principal(target.id)
+            return
+
+
+@event.listens_for(User, "after_delete")
+@event.listens_for(AdminUser, "after_delete")
+def _invalidate_on_delete(mapper, connection, target):
+    invalidate_principal(target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_update(orm_execute_state):
+    """Clears the cache when an ORM-enabled UPDATE/DELETE targets users or admins."""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in _INVALIDATING_ATTRIBUTES:
+        clear_principal_cache()
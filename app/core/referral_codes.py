@@ -0,0 +1,152 @@
+"""
+Collision-free referral code allocation.
+
+Every referral code is derived from a unique sequence value instead of being drawn
+at random and probed for uniqueness. The 8-character code space over the 32-letter
+REFERRAL_CODE_ALPHABET holds exactly 2**40 codes, so a keyed Feistel permutation
+over 40-bit integers maps each sequence value to a distinct code that does not look
+sequential. Distinct inputs always give distinct codes, by construction.
+
+Sequence values come from the referral_code_sequence table in blocks (hi/lo
+allocation): a process reserves REFERRAL_CODE_BLOCK_SIZE values with a single
+UPDATE ... RETURNING and then hands them out from memory, so registrations need no
+uniqueness probes and only one short statement per block. Bulk onboarding can
+reserve an exact batch up front with allocate_batch().
+"""
+import asyncio
+import hashlib
+from typing import List
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.core.security import REFERRAL_CODE_ALPHABET
+from app.models.database_utils import dialect_insert
+from app.models.referral_code_sequence import ReferralCodeSequence
+
+CODE_LENGTH = 8
+_BITS_PER_CHAR = 5  # len(REFERRAL_CODE_ALPHABET) == 32
+CODE_SPACE_BITS = CODE_LENGTH * _BITS_PER_CHAR
+CODE_SPACE_SIZE = 1 << CODE_SPACE_BITS
+_HALF_BITS = CODE_SPACE_BITS // 2
+_HALF_MASK = (1 << _HALF_BITS) - 1
+_ROUNDS = 4
+SEQUENCE_NAME = "referral_links"
+
+
+class CodePermutation:
+    """Keyed bijection between sequence values and 8-character referral codes."""
+
+    def __init__(self, key: str):
+        if len(REFERRAL_CODE_ALPHABET) != 1 << _BITS_PER_CHAR:
+            raise ValueError("Referral code alphabet must have exactly 32 characters")
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        self._round_keys = tuple(
+            int.from_bytes(digest[i * 4:(i + 1) * 4], "big") for i in range(_ROUNDS)
+        )
+        # Two characters per 10-bit chunk keeps encoding cheap for large batches
+        self._pairs = [a + b for b in REFERRAL_CODE_ALPHABET for a in REFERRAL_CODE_ALPHABET]
+        self._char_index = {c: i for i, c in enumerate(REFERRAL_CODE_ALPHABET)}
+
+    @staticmethod
+    def _round(half: int, round_key: int) -> int:
+        x = ((half ^ round_key) * 0x9E3779B1) & 0xFFFFFFFF
+        return (x ^ (x >> 15)) & _HALF_MASK
+
+    def permute(self, value: int) -> int:
+        """Maps a value in [0, 2**40) to a distinct value in the same range."""
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_key in self._round_keys:
+            left, right = right, left ^ self._round(right, round_key)
+        return (left << _HALF_BITS) | right
+
+    def invert(self, value: int) -> int:
+        """Inverse of permute()."""
+        left, right = value >> _HALF_BITS, value & _HALF_MASK
+        for round_key in reversed(self._round_keys):
+            left, right = right ^ self._round(left, round_key), left
+        return (left << _HALF_BITS) | right
+
+    def encode(self, value: int) -> str:
+        """Returns the referral code for a sequence value."""
+        if not 0 <= value < CODE_SPACE_SIZE:
+            raise ValueError("Referral code space exhausted")
+        n = self.permute(value)
+        pairs = self._pairs
+        return pairs[n & 1023] + pairs[(n >> 10) & 1023] + pairs[(n >> 20) & 1023] + pairs[n >> 30]
+
+    def decode(self, code: str) -> int:
+        """Returns the sequence value a code was generated from."""
+        if len(code) != CODE_LENGTH:
+            raise ValueError("Invalid referral code length")
+        n = 0
+        for position, char in enumerate(code):
+            n |= self._char_index[char] << (position * _BITS_PER_CHAR)
+        return self.invert(n)
+
+
+async def reserve_sequence_block(engine: AsyncEngine, count: int) -> int:
+    """
+    Atomically reserves count consecutive sequence values and returns the first.
+    Runs in its own short transaction so the counter row is never locked for the
+    duration of a caller's transaction.
+    """
+    table = ReferralCodeSequence.__table__
+    reserve = (
+        update(table)
+        .where(table.c.name == SEQUENCE_NAME)
+        .values(next_value=table.c.next_value + count)
+        .returning(table.c.next_value)
+    )
+    async with engine.begin() as conn:
+        next_value = (await conn.execute(reserve)).scalar_one_or_none()
+        if next_value is None:
+            # First allocation against this database: create the counter row
+            await conn.execute(
+                dialect_insert(conn.dialect.name, table)
+                .values(name=SEQUENCE_NAME, next_value=0)
+                .on_conflict_do_nothing(index_elements=[table.c.name])
+            )
+            next_value = (await conn.execute(reserve)).scalar_one()
+    return next_value - count
+
+
+class ReferralCodeAllocator:
+    """Hands out distinct referral codes from per-process blocks of sequence values."""
+
+    def __init__(self, key: str, block_size: int):
+        self.permutation = CodePermutation(key)
+        self.block_size = max(1, block_size)
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def allocate(self, engine: AsyncEngine) -> str:
+        """Returns one unused code, reserving a new block only when the current one runs out."""
+        async with self._lock:
+            if self._next >= self._end:
+                self._next = await reserve_sequence_block(engine, self.block_size)
+                self._end = self._next + self.block_size
+            value = self._next
+            self._next += 1
+        return self.permutation.encode(value)
+
+    async def allocate_batch(self, engine: AsyncEngine, count: int) -> List[str]:
+        """Reserves exactly count codes with one statement, e.g. for bulk onboarding."""
+        if count <= 0:
+            return []
+        start = await reserve_sequence_block(engine, count)
+        return [self.permutation.encode(value) for value in range(start, start + count)]
+
+    def reset(self):
+        """Forgets the current block (unused values are simply skipped)."""
+        self._next = 0
+        self._end = 0
+
+
+# Instantiate the allocator (process-wide, like EmailService)
+referral_code_allocator = ReferralCodeAllocator(
+    key=settings.referral_code_key,
+    block_size=settings.referral_code_block_size,
+)
@@ -0,0 +1,148 @@
+"""
+In-memory filter of known referred_user_ids.
+
+Most payments the Main SaaS platform reports belong to users who were never
+referred. Conversions whose referred_user_id is definitely not in this Bloom filter
+are rejected with 404 without touching the database; only possible matches (every
+referred user, plus false positives) go on to the conversion statement.
+
+The filter is built at startup with a streaming query over referrals, gets every
+signup recorded by this process immediately, and picks up signups recorded by
+other replicas with a periodic incremental query on signed_up_at, so a signup
+handled elsewhere is visible here within referred_user_filter_refresh_seconds.
+Until the first build completes every lookup is treated as a possible match.
+
+The observed false-positive rate is exported as
+referred_user_filter_false_positives_total / referred_user_filter_checks_total.
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.core.bloom import BloomFilter
+from app.models.referral import Referral
+
+# Signups committed slightly out of signed_up_at order are still picked up
+REFRESH_OVERLAP = timedelta(seconds=30)
+STREAM_BATCH_SIZE = 10000
+
+filter_checks = metrics.counter("referred_user_filter_checks_total", "Referred user lookups answered by the filter")
+filter_false_positives = metrics.counter("referred_user_filter_false_positives_total", "Filter matches with no referral in the database")
+filter_items = metrics.gauge("referred_user_filter_items", "Referred user ids added to the filter")
+filter_bytes = metrics.gauge("referred_user_filter_bytes", "Memory used by the referred user filter")
+filter_estimated_fpr = metrics.gauge("referred_user_filter_estimated_false_positive_rate", "Estimated false-positive rate of the referred user filter")
+
+
+class ReferredUserFilter:
+    """Process-wide Bloom filter of referred_user_ids with background refresh."""
+
+    def __init__(self, size_bytes: int, expected_items: int, refresh_interval: float):
+        self.size_bytes = size_bytes
+        self.expected_items = expected_items
+        self.refresh_interval = refresh_interval
+        self._filter: Optional[BloomFilter] = None
+        self._watermark: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._session_factory: Optional[Callable[[], AsyncSession]] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def might_contain(self, referred_user_id: str) -> bool:
+        """False only if no referral can exist for referred_user_id."""
+        if self._filter is None:
+            return True
+        found = referred_user_id in self._filter
+        filter_checks.inc(result="possible" if found else "negative")
+        return found
+
+    def record_false_positive(self):
+        """Called when a possible match turned out to have no referral."""
+        if self._filter is not None:
+            filter_false_positives.inc()
+
+    def add(self, referred_user_id: str):
+        if self._filter is not None:
+            self._filter.add(referred_user_id)
+            self._update_gauges()
+
+    async def build(self, db: AsyncSession) -> int:
+        """Streams every referred_user_id into a new filter, then swaps it in."""
+        bloom = BloomFilter(self.size_bytes, self.expected_items)
+        watermark = await self._stream_into(db, bloom, None)
+        self._filter, self._watermark = bloom, watermark
+        self._update_gauges()
+        return bloom.items
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Adds referred users who signed up since the last build or refresh."""
+        if self._filter is None:
+            return await self.build(db)
+        before = self._filter.items
+        self._watermark = await self._stream_into(db, self._filter, self._watermark)
+        self._update_gauges()
+        return self._filter.items - before
+
+    async def _stream_into(self, db: AsyncSession, bloom: BloomFilter, since: Optional[datetime]) -> Optional[datetime]:
+        query = select(Referral.referred_user_id, Referral.signed_up_at).where(Referral.referred_user_id.isnot(None))
+        if since is not None:
+            query = query.where(Referral.signed_up_at >= since - REFRESH_OVERLAP)
+        watermark = since
+        result = await db.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for referred_user_id, signed_up_at in result:
+            bloom.add(referred_user_id)
+            if signed_up_at is not None and (watermark is None or signed_up_at > watermark):
+                watermark = signed_up_at
+        return watermark
+
+    def _update_gauges(self):
+        filter_items.set(self._filter.items)
+        filter_bytes.set(self._filter.size_bytes)
+        filter_estimated_fpr.set(self._filter.estimated_false_positive_rate())
+
+    def reset(self):
+        """Drops the filter; lookups fall back to the database until the next build."""
+        self._filter = None
+        self._watermark = None
+
+    async def start(self, session_factory: Callable[[], AsyncSession]):
+        """Builds the filter and starts the refresh task (called from the application lifespan)."""
+        if self._task is not None or self.size_bytes <= 0:
+            return
+        self._session_factory = session_factory
+        async with session_factory() as db:
+            await self.build(db)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                async with self._session_factory() as db:
+                    await self.refresh(db)
+            except Exception as e:
+                # Log and try again on the next tick
+                print(f"Referred user filter refresh failed: {e}")
+
+
+# Instantiate the filter (process-wide; built and refreshed by the application lifespan)
+referred_user_filter = ReferredUserFilter(
+    size_bytes=settings.referred_user_filter_bytes,
+    expected_items=settings.referred_user_filter_expected_items,
+    refresh_interval=settings.referred_user_filter_refresh_seconds,
+)
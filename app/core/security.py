@@ -6,15 +6,36 @@ import secrets
 import string
 
 from app.config import settings
+from app.core.executor import BoundedExecutor
+from app.core.token_cache import TokenCache
 
 # Algorithm for JWT
 ALGORITHM = "HS256"
+# Claim identifying which table the token's subject lives in
+PRINCIPAL_CLAIM = "ptype"
+PRINCIPAL_ADMIN = "admin"
+PRINCIPAL_PARTICIPANT = "participant"
+# Referral code alphabet: uppercase letters and digits without look-alikes (O/0, I/1)
+REFERRAL_CODE_ALPHABET = ''.join(
+    c for c in string.ascii_uppercase + string.digits if c not in "O0I1"
+)
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Dedicated pool for bcrypt so hashing never blocks the event loop
+password_hash_pool = BoundedExecutor(
+    name="password_hash",
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    kind=settings.password_hash_pool,
+)
+# Decoded payloads of recently verified tokens
+token_cache = TokenCache(max_size=settings.jwt_cache_max_size)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Creates a JWT access token."""
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, principal_type: Optional[str] = None):
+    """Creates a JWT access token, optionally tagged with the subject's principal type."""
     to_encode = data.copy()
+    if principal_type:
+        to_encode[PRINCIPAL_CLAIM] = principal_type
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -24,9 +45,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
-def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
-    """Creates a JWT refresh token with longer expiry."""
+def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None, principal_type: Optional[str] = None):
+    """Creates a JWT refresh token with longer expiry, optionally tagged with the principal type."""
     to_encode = data.copy()
+    if principal_type:
+        to_encode[PRINCIPAL_CLAIM] = principal_type
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
@@ -38,12 +61,28 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(token: str):
     """Verifies a JWT token and returns the payload."""
+    if token_cache.is_revoked(token):
+        return None
+    # Serve recently verified tokens without re-checking the signature
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         # Invalid token or signature
         return None
+    token_cache.set(token, payload)
+    return payload
+
+def revoke_token(token: str):
+    """Revokes a token in this process so it is rejected even if still cached."""
+    exp = None
+    try:
+        exp = jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        pass
+    token_cache.revoke(token, exp)
 
 def hash_password(password: str) -> str:
     """Hashes a password using bcrypt."""
@@ -53,10 +92,14 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """Hashes a password on the password hash pool without blocking the event loop."""
+    return await password_hash_pool.run(hash_password, password, op="hash")
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifies a password on the password hash pool without blocking the event loop."""
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password, op="verify")
+
 def generate_unique_code(length: int = 8) -> str:
-    """Generates a unique code for referral links."""
-    # Use uppercase letters and digits for better readability
-    alphabet = string.ascii_uppercase + string.digits
-    # Exclude similar looking characters
-    alphabet = alphabet.replace('O', '').replace('0', '').replace('I', '').replace('1', '')
-    return ''.join(secrets.choice(alphabet) for _ in range(length))
\ No newline at end of file
+    """Generates a random code for referral links (not guaranteed unique, see app.core.referral_codes)."""
+    return ''.join(secrets.choice(REFERRAL_CODE_ALPHABET) for _ in range(length))
\ No newline at end of file
@@ -0,0 +1,148 @@
+"""
+Incremental parsing of large request bodies.
+
+Bulk uploads are consumed chunk by chunk from ``request.stream()`` so memory use
+depends on the size of a single record, not on the size of the upload. Both parsers
+refuse records longer than max_record_bytes instead of buffering without bound.
+"""
+import csv
+import json
+from typing import AsyncIterator, List, TypeVar
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.exceptions import ValidationError
+
+DEFAULT_MAX_RECORD_BYTES = 64 * 1024
+
+T = TypeVar("T")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES) -> AsyncIterator[str]:
+    """Yields decoded lines (without line endings) from a byte stream."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _decode_line(line)
+        if len(buffer) > max_record_bytes:
+            raise ValidationError("Line exceeds the maximum allowed length")
+    if buffer:
+        yield _decode_line(buffer)
+
+
+def _decode_line(line: bytes) -> str:
+    try:
+        return line.rstrip(b"\r").decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValidationError("Request body is not valid UTF-8")
+
+
+async def iter_csv_column(chunks: AsyncIterator[bytes], column: str,
+                          max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES) -> AsyncIterator[str]:
+    """
+    Yields one column of a CSV upload. If the first row is a header containing
+    column it selects that column, otherwise every row's first cell is used.
+    """
+    index = None
+    async for line in iter_lines(chunks, max_record_bytes):
+        if not line.strip():
+            continue
+        row = next(csv.reader([line]))
+        if index is None:
+            header = [cell.strip().lower() for cell in row]
+            if column in header:
+                index = header.index(column)
+                continue
+            index = 0
+        if index < len(row):
+            yield row[index].strip()
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes],
+                          max_record_bytes: int = DEFAULT_MAX_RECORD_BYTES) -> AsyncIterator[object]:
+    """Yields the elements of a top-level JSON array without loading the whole document."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    started = finished = False
+    pending = b""
+    async for chunk in chunks:
+        # Decode incrementally; a multi-byte character may straddle two chunks
+        pending += chunk
+        try:
+            text = pending.decode("utf-8")
+            pending = b""
+        except UnicodeDecodeError as e:
+            if len(pending) - e.start > 3:
+                raise ValidationError("Request body is not valid UTF-8")
+            text, pending = pending[:e.start].decode("utf-8"), pending[e.start:]
+        buffer += text
+
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n\ufeff":
+                position += 1
+            if position >= len(buffer):
+                break
+            if finished:
+                raise ValidationError("Unexpected data after the JSON array")
+            if not started:
+                if buffer[position] != "[":
+                    raise ValidationError("Request body must be a JSON array")
+                started = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                finished = True
+                position += 1
+                continue
+            if buffer[position] == ",":
+                position += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Incomplete element; wait for more data
+                break
+            if end == len(buffer) and isinstance(item, (int, float)):
+                # A number at the end of the buffer may continue in the next chunk
+                break
+            yield item
+            position = end
+        buffer = buffer[position:]
+        if len(buffer) > max_record_bytes:
+            raise ValidationError("JSON array element exceeds the maximum allowed length")
+
+    if pending or buffer.strip() or not finished:
+        raise ValidationError("Request body must be a complete JSON array")
+
+
+async def batched(items: AsyncIterator[T], size: int) -> AsyncIterator[List[T]]:
+    """Groups an async iterator into lists of at most size items."""
+    batch: List[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body iterator is still reading the request body.
+
+    StreamingResponse watches for client disconnects by consuming receive(), which
+    would swallow the request body chunks the iterator is waiting for. Here the
+    iterator is the only consumer; a disconnect surfaces as ClientDisconnect from
+    request.stream() (or a failed send) instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,116 @@
+"""
+In-process cache of decoded JWT payloads.
+
+verify_token runs on every authenticated request, and without a cache python-jose
+re-parses and re-checks the HMAC of the same bearer token each time. Entries are
+keyed by a SHA-256 digest of the token (the raw token is never stored), expire at
+the token's own ``exp`` claim and are evicted least-recently-used once the cache
+reaches its size cap. Revoked tokens are remembered until they would have expired
+so they can never be served from the cache again.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core import metrics
+
+cache_hits = metrics.counter("jwt_cache_hits_total", "Decoded JWT payloads served from the cache")
+cache_misses = metrics.counter("jwt_cache_misses_total", "JWT lookups that required a full decode")
+cache_size = metrics.gauge("jwt_cache_size", "Decoded JWT payloads currently cached")
+
+
+def token_digest(token: str) -> bytes:
+    """Returns the cache key for a raw token."""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class TokenCache:
+    """Expiry-aware LRU cache of decoded token payloads."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, bytes]] = []
+        self._revoked: Dict[bytes, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _purge_expired(self, now: float):
+        """Drops entries (and revocations) whose token has expired."""
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            exp, digest = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] <= now:
+                del self._entries[digest]
+            if self._revoked.get(digest, now + 1) <= now:
+                del self._revoked[digest]
+        cache_size.set(len(self._entries))
+
+    def get(self, token: str) -> Optional[dict]:
+        """Returns the cached payload for token, or None on a miss."""
+        if self.max_size <= 0:
+            return None
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= now or digest in self._revoked:
+                if entry is not None:
+                    del self._entries[digest]
+                self.misses += 1
+                cache_misses.inc()
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+        cache_hits.inc()
+        return dict(entry[1])
+
+    def set(self, token: str, payload: dict):
+        """Caches a verified payload until its exp claim; tokens without exp are not cached."""
+        exp = payload.get("exp")
+        if self.max_size <= 0 or not isinstance(exp, (int, float)):
+            return
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            if exp <= now or digest in self._revoked:
+                return
+            self._purge_expired(now)
+            self._entries[digest] = (float(exp), dict(payload))
+            self._entries.move_to_end(digest)
+            heapq.heappush(self._expiry_heap, (float(exp), digest))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            cache_size.set(len(self._entries))
+
+    def revoke(self, token: str, exp: Optional[float] = None):
+        """Evicts token and refuses to cache it again until exp (or for a day if unknown)."""
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.pop(digest, None)
+            if exp is None:
+                exp = entry[0] if entry is not None else now + 86400
+            self._revoked[digest] = float(exp)
+            heapq.heappush(self._expiry_heap, (float(exp), digest))
+            cache_size.set(len(self._entries))
+
+    def is_revoked(self, token: str) -> bool:
+        exp = self._revoked.get(token_digest(token))
+        return exp is not None and exp > time.time()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._expiry_heap.clear()
+            self._revoked.clear()
+            self.hits = 0
+            self.misses = 0
+            cache_size.set(0)
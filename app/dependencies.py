@@ -1,10 +1,14 @@
-from typing import AsyncGenerator
-from fastapi import Depends, HTTPException, status
+import secrets
+from typing import AsyncGenerator, Optional
+from uuid import UUID
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.core.database import get_db # Import get_db from database module
-from app.core.security import verify_token # Assuming JWT verification in app.core.security
+from app.core.security import verify_token, PRINCIPAL_CLAIM # Assuming JWT verification in app.core.security
+from app.core.principal_cache import PRINCIPAL_MODELS, get_principal, cache_principal
 from app.models.admin_user import AdminUser # Import AdminUser model
 from app.models.user import User # Import User model (for checking if not admin)
 
@@ -19,15 +23,25 @@ async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depe
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = verify_token(token) # Verify and decode the JWT token
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        # You might add token validity checks here (e.g., against a token blacklist)
+        payload = verify_token(token) # Verify and decode the JWT token (cached, revocation-aware)
+        user_id = UUID(payload.get("sub"))
+        principal_type = payload.get(PRINCIPAL_CLAIM)
     except Exception: # Catch potential errors during token verification
         raise credentials_exception
 
-    # Try fetching from AdminUser first
+    # Tokens carry the principal type, so at most one targeted lookup is needed
+    model = PRINCIPAL_MODELS.get(principal_type)
+    if model is not None:
+        principal = get_principal(principal_type, user_id)
+        if principal is None:
+            principal = await db.get(model, user_id)
+            if principal is not None:
+                cache_principal(principal_type, principal)
+        if principal is not None:
+            return principal
+        raise credentials_exception
+
+    # Legacy tokens without a principal claim: try AdminUser first, then User
     admin_user = await db.get(AdminUser, user_id)
     if admin_user:
         return admin_user
@@ -54,4 +68,15 @@ async def get_current_admin_user(current_user: object = Depends(get_current_user
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Operation not permitted for non-admin users",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+async def verify_api_key(x_api_key: Optional[str] = Header(None, alias="X-API-KEY")):
+    """Dependency for server-to-server endpoints called by the Main SaaS platform."""
+    expected = settings.conversion_api_key
+    # Fail closed when no key is configured; compare in constant time
+    if not expected or not x_api_key or not secrets.compare_digest(x_api_key.encode(), expected.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing API key",
+        )
@@ -13,4 +13,22 @@ class NotFoundError(HTTPException):
 class ValidationError(HTTPException):
     """Custom exception for validation errors."""
     def __init__(self, detail: str = "Validation error"):
-        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
\ No newline at end of file
+        super().__init__(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+class ServiceUnavailableError(HTTPException):
+    """Custom exception for temporarily overloaded or unavailable resources."""
+    def __init__(self, detail: str = "Service temporarily unavailable", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised without calling a dependency while its circuit breaker is open."""
+    def __init__(self, name: str, retry_after: float = 1):
+        super().__init__(
+            detail=f"{name} is temporarily unavailable",
+            retry_after=max(1, int(retry_after + 0.999)),
+        )
+        self.name = name
@@ -1,13 +1,49 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from app.api.redirect import router as redirect_router # Import the /r/{code} redirect router
 from app.api.v1.router import api_router # Import the v1 api router
 from app.config import settings
+from app.core import metrics
+from app.core.click_buffer import click_buffer
+from app.core.database import async_session
+from app.core.referred_user_filter import referred_user_filter
+from app.core.security import password_hash_pool
+from app.services.email_service import email_service
+from app.services.tracking_service import conversion_queue
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts and stops application-wide resources."""
+    await email_service.start()
+    click_buffer.start(async_session)
+    await referred_user_filter.start(async_session)
+    if settings.conversion_queue_max_batch_size > 0:
+        conversion_queue.start(async_session)
+    yield
+    await conversion_queue.stop() # Writes the conversions still queued
+    await referred_user_filter.stop()
+    await click_buffer.stop() # Writes the clicks still buffered
+    await email_service.aclose()
+    password_hash_pool.shutdown()
 
-app = FastAPI(title=settings.project_name)
+
+app = FastAPI(title=settings.project_name, lifespan=lifespan)
 
 # Include the v1 API router
 app.include_router(api_router, prefix="/api/v1")
 
+# Short referral links live at the root
+app.include_router(redirect_router)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Jijenga Referral System"}
+
+@app.get("/metrics", include_in_schema=False, response_class=PlainTextResponse)
+def read_metrics():
+    """Exposes in-process metrics in the Prometheus text format."""
+    return metrics.registry.render()
@@ -6,6 +6,10 @@ from .referral_link import ReferralLink
 from .referral import Referral
 from .payment import Payment
 from .earning import Earning
+from .referral_code_sequence import ReferralCodeSequence
+from .email_outbox import EmailOutbox
+from .processed_transaction import ProcessedTransaction
+from .referral_link_counter_shard import ReferralLinkCounterShard
 
 # Optional: define __all__ for explicit imports
 __all__ = [
@@ -16,4 +20,8 @@ __all__ = [
     "Referral",
     "Payment",
     "Earning",
+    "ReferralCodeSequence",
+    "EmailOutbox",
+    "ProcessedTransaction",
+    "ReferralLinkCounterShard",
 ]
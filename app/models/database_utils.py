@@ -4,6 +4,7 @@ Handles differences between PostgreSQL and SQLite.
 """
 from sqlalchemy import String, DateTime, text
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.sql import func
 from sqlalchemy.types import TypeDecorator, CHAR
 import uuid
@@ -57,6 +58,17 @@ def get_uuid_default(dialect_name=None):
         return None
 
 
+def dialect_insert(dialect_name, table):
+    """
+    Get a dialect-specific INSERT construct for the given table or model.
+    PostgreSQL and SQLite both support ON CONFLICT clauses, which the generic
+    insert() does not expose.
+    """
+    if dialect_name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
 def get_datetime_default():
     """
     Get appropriate datetime default for the database dialect.
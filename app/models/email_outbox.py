@@ -0,0 +1,50 @@
+from sqlalchemy import Column, Integer, Text, Enum, DateTime
+import uuid
+import enum
+from datetime import datetime
+
+from .base import Base
+from .database_utils import GUID, get_datetime_default
+
+class EmailOutboxStatus(enum.Enum):
+    PENDING = "PENDING" # Waiting to be sent (or retried after next_attempt_at)
+    SENT = "SENT" # Accepted by the email provider
+    DEAD = "DEAD" # Permanently rejected or out of retries; needs manual attention
+
+class EmailOutbox(Base):
+    """
+    Outgoing email, written in the same transaction as the record that triggers it
+    and delivered later by the background worker (app.worker).
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = {'schema': 'referral'} # Map to the referral schema
+
+    id = Column(GUID(), primary_key=True)
+    kind = Column(Text, nullable=False) # e.g. "invitation"
+    recipient = Column(Text, nullable=False)
+    subject = Column(Text, nullable=False)
+    html = Column(Text, nullable=False)
+    status = Column(Enum(EmailOutboxStatus, name='email_outbox_status'), nullable=False, server_default=EmailOutboxStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, server_default='0')
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=get_datetime_default())
+    last_error = Column(Text, nullable=True)
+    provider_message_id = Column(Text, nullable=True) # Resend email id, once sent
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=get_datetime_default())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=get_datetime_default())
+
+    def __init__(self, **kwargs):
+        # Generate UUID if not provided (for SQLite compatibility)
+        if 'id' not in kwargs:
+            kwargs['id'] = uuid.uuid4()
+        if 'status' not in kwargs:
+            kwargs['status'] = EmailOutboxStatus.PENDING
+        if 'attempts' not in kwargs:
+            kwargs['attempts'] = 0
+        if 'created_at' not in kwargs:
+            kwargs['created_at'] = datetime.utcnow()
+        if 'updated_at' not in kwargs:
+            kwargs['updated_at'] = kwargs['created_at']
+        if 'next_attempt_at' not in kwargs:
+            kwargs['next_attempt_at'] = kwargs['created_at']
+        super().__init__(**kwargs)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, LargeBinary, Text, DateTime
+from datetime import datetime
+
+from .base import Base
+from .database_utils import get_datetime_default
+
+class ProcessedTransaction(Base):
+    """
+    Idempotency record for a server-to-server call, keyed on the caller's
+    transaction id. Holds the exact response that was returned so retries can be
+    answered byte-for-byte (see app.core.idempotency).
+    """
+    __tablename__ = 'processed_transactions'
+    __table_args__ = {'schema': 'referral'} # Map to the referral schema
+
+    transaction_id = Column(Text, primary_key=True) # e.g. ConversionPayload.transaction_id
+    request_fingerprint = Column(Text, nullable=False) # SHA-256 of the request, to detect reused ids
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=get_datetime_default())
+
+    def __init__(self, **kwargs):
+        if 'created_at' not in kwargs:
+            kwargs['created_at'] = datetime.utcnow()
+        super().__init__(**kwargs)
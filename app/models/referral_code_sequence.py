@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Text, BigInteger, DateTime
+from datetime import datetime
+
+from .base import Base
+from .database_utils import get_datetime_default
+
+class ReferralCodeSequence(Base):
+    """
+    Named counter that hands out blocks of sequence values for referral codes.
+    Each value is turned into a distinct code by app.core.referral_codes.
+    """
+    __tablename__ = 'referral_code_sequence'
+    __table_args__ = {'schema': 'referral'} # Map to the referral schema
+
+    name = Column(Text, primary_key=True)
+    next_value = Column(BigInteger, nullable=False, server_default='0') # First value not yet handed out
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=get_datetime_default())
+
+    def __init__(self, **kwargs):
+        if 'updated_at' not in kwargs:
+            kwargs['updated_at'] = datetime.utcnow()
+        super().__init__(**kwargs)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, ForeignKey
+
+from .base import Base
+from .database_utils import GUID
+
+class ReferralLinkCounterShard(Base):
+    """
+    One of settings.link_counter_shards partial counters of a referral link.
+    Increments go to a random shard instead of the link's row; a link's exact
+    totals are its denormalized columns plus the sum of its shards, and the
+    compaction job folds shards back into the columns (app.core.link_counters).
+    """
+    __tablename__ = 'referral_link_counter_shards'
+    __table_args__ = {'schema': 'referral'} # Map to the referral schema
+
+    link_id = Column(GUID(), ForeignKey('referral.referral_links.id', ondelete='CASCADE'), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    click_count = Column(Integer, nullable=False, server_default='0')
+    conversion_count = Column(Integer, nullable=False, server_default='0')
@@ -53,6 +53,18 @@ class ReferralResponse(ReferralBase):
     class Config:
         from_attributes = True
 
+# --- Signup tracking (Main SaaS platform -> POST /api/v1/signups) ---
+
+# Sent when a visitor who followed a referral link creates an account
+class SignupPayload(BaseModel):
+    referral_id: UUID = Field(..., description="The referral_id the /r/{code} redirect added to the signup URL.")
+    referral_code: str = Field(..., description="The ref code from the signup URL.")
+    referred_user_id: str = Field(..., min_length=1, description="The new user's unique ID in the Main SaaS DB.")
+
+class SignupResponse(BaseModel):
+    status: str = "success"
+    message: str = "Signup recorded successfully."
+
 # --- Specific API Response Schema (from TDD 2.6) ---
 
 class ParticipantStatsResponse(BaseModel):
@@ -1,35 +1,46 @@
 import secrets
+import uuid
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
-from sqlalchemy import update
+from sqlalchemy import update, insert, literal
+from typing import List
 from uuid import UUID
+from pydantic import EmailStr, TypeAdapter, ValidationError as PydanticValidationError
 
 from app.models.invitation import Invitation, InvitationStatus
-from app.models.user import User
+from app.models.user import User, UserStatus
 from app.models.referral_link import ReferralLink
 from app.schemas.invitation import InvitationCreate
 from app.schemas.user import UserCreate
 from app.schemas.auth import JWTTokens
-from app.services.email_service import email_service
-from app.core.security import hash_password, create_access_token, create_refresh_token, generate_unique_code
+from app.models.email_outbox import EmailOutbox
+from app.services.email_outbox_service import EmailOutboxService, invitation_outbox_row
+from app.core.security import hash_password_async, create_access_token, create_refresh_token, PRINCIPAL_PARTICIPANT
+from app.core.referral_codes import referral_code_allocator
 from app.exceptions import ConflictError, NotFoundError, ValidationError
 
+_email_adapter = TypeAdapter(EmailStr)
+
+
 class AuthService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def create_invitation(self, email: str):
         """
-        Creates a new invitation record and sends an invitation email.
+        Creates a new invitation record and queues its invitation email.
         Raises ConflictError if an active invitation already exists for the email.
         """
-        # Check if an active invitation already exists
+        # Check if an active invitation already exists. Overdue invitations the sweeper
+        # hasn't expired yet don't count; the partial index on pending emails covers this.
         existing_invitation = await self.db.execute(
-            select(Invitation).where(
+            select(Invitation.email).where(
                 Invitation.email == email,
-                Invitation.status == InvitationStatus.PENDING
-            )
+                Invitation.status == InvitationStatus.PENDING,
+                Invitation.expires_at > datetime.utcnow()
+            ).limit(1)
         )
         if existing_invitation.scalar_one_or_none():
             raise ConflictError(f"An active invitation already exists for {email}")
@@ -45,24 +56,85 @@ class AuthService:
         db_invitation = Invitation(**invitation_create.model_dump())
 
         self.db.add(db_invitation)
+        # Queue the invitation email in the same transaction; the outbox worker sends it
+        EmailOutboxService(self.db).enqueue_invitation(email, token)
         await self.db.commit()
         await self.db.refresh(db_invitation)
 
-        # Send the invitation email asynchronously (fire and forget or handle separately)
-        # For simplicity in this example, we'll call it directly.
-        try:
-            await email_service.send_invitation_email(email, token)
-        except Exception as e:
-            # Log the email sending failure, but don't necessarily fail the invitation creation
-            print(f"Failed to send invitation email to {email}: {e}")
-            # Depending on requirements, you might want to mark the invitation as 'email_failed'
-            # or have a separate process to retry sending emails.
-
         return db_invitation
     
+    async def create_invitations_bulk(self, emails: List[str]) -> List[dict]:
+        """
+        Creates invitations for a batch of emails with one duplicate-check query and
+        one multi-row INSERT per table, committing once. The invitation emails are
+        written to the outbox in the same transaction.
+
+        Returns one result per input email, in order, with a status of "created",
+        "invalid", "duplicate" (repeated within the batch) or "already_invited"
+        (an active invitation already exists). Created results carry the new
+        invitation's id and token.
+        """
+        results = []
+        candidates = {}
+        for raw_email in emails:
+            email = raw_email.strip() if isinstance(raw_email, str) else raw_email
+            try:
+                email = _email_adapter.validate_python(email)
+            except PydanticValidationError:
+                results.append({"email": raw_email, "status": "invalid"})
+                continue
+            if email in candidates:
+                results.append({"email": email, "status": "duplicate"})
+                continue
+            result = {"email": email}
+            candidates[email] = result
+            results.append(result)
+
+        if not candidates:
+            return results
+
+        # One set-based check for active invitations
+        now = datetime.utcnow()
+        existing = await self.db.execute(
+            select(Invitation.email).distinct().where(
+                Invitation.email.in_(list(candidates)),
+                Invitation.status == InvitationStatus.PENDING,
+                Invitation.expires_at > now
+            )
+        )
+        for email in existing.scalars():
+            candidates.pop(email)["status"] = "already_invited"
+
+        expires_at = now + timedelta(days=7)
+        rows = []
+        emails = []
+        for email, result in candidates.items():
+            row = dict(
+                id=uuid.uuid4(),
+                email=email,
+                token=secrets.token_urlsafe(32),
+                status=InvitationStatus.PENDING,
+                expires_at=expires_at,
+                created_at=now
+            )
+            rows.append(row)
+            emails.append(invitation_outbox_row(email, row["token"], now))
+            result.update(status="created", id=row["id"], token=row["token"])
+
+        if rows:
+            await self.db.execute(insert(Invitation.__table__).values(rows))
+            await self.db.execute(insert(EmailOutbox.__table__).values(emails))
+            await self.db.commit()
+
+        return results
+
     async def register_participant(self, invitation_token: str, user_data: UserCreate):
         """
         Registers a new participant using an invitation token.
+
+        The invitation is consumed with a conditional UPDATE and the user and referral
+        link are inserted in the same transaction, without any preliminary SELECTs:
+        on PostgreSQL as a single statement, elsewhere as one pipelined transaction.
         
         Args:
             invitation_token: The token from the invitation email
@@ -73,83 +145,157 @@ class AuthService:
             
         Raises:
             NotFoundError: If the invitation token is invalid, expired, or already used
-            ConflictError: If the phone number is already registered
+            ConflictError: If the phone number or email is already registered
             ValidationError: If the data fails validation
         """
-        # Find and validate the invitation
-        invitation_result = await self.db.execute(
-            select(Invitation).where(
-                Invitation.token == invitation_token,
-                Invitation.status == InvitationStatus.PENDING,
-                Invitation.expires_at > datetime.utcnow()
-            )
-        )
-        invitation = invitation_result.scalar_one_or_none()
-        
-        if not invitation:
-            raise NotFoundError("Invalid or expired invitation token")
-        
-        # Check if phone number is already registered
-        existing_user_result = await self.db.execute(
-            select(User).where(User.phone_number == user_data.phone_number)
-        )
-        if existing_user_result.scalar_one_or_none():
-            raise ConflictError("Phone number is already registered")
-        
-        # Start a transaction for creating user and referral link
-        # Hash the password
-        password_hash = hash_password(user_data.password)
-        
-        # Create the user record
-        new_user = User(
+        # Allocate the referral code before any writes; codes are unique by
+        # construction, so no uniqueness probe queries are needed
+        unique_code = await referral_code_allocator.allocate(self.db.bind)
+
+        # Hash the password on the worker pool so bcrypt doesn't stall the event loop
+        password_hash = await hash_password_async(user_data.password)
+
+        registration = dict(
+            invitation_token=invitation_token,
+            user_id=uuid.uuid4(),
+            link_id=uuid.uuid4(),
             full_name=user_data.full_name,
-            email=invitation.email,  # Use the email from the invitation
             password_hash=password_hash,
-            phone_number=user_data.phone_number
+            phone_number=user_data.phone_number,
+            unique_code=unique_code,
+            now=datetime.utcnow(),
         )
-        
-        self.db.add(new_user)
-        await self.db.flush()  # Flush to get the user ID
-        
-        # Generate a unique referral code
-        unique_code = generate_unique_code()
-        
-        # Check if code already exists (unlikely but possible)
-        while True:
-            existing_code_result = await self.db.execute(
-                select(ReferralLink).where(ReferralLink.unique_code == unique_code)
-            )
-            if not existing_code_result.scalar_one_or_none():
-                break
-            unique_code = generate_unique_code()
-        
-        # Create the referral link
-        new_referral_link = ReferralLink(
-            user_id=new_user.id,
-            unique_code=unique_code
-        )
-        
-        self.db.add(new_referral_link)
-        
-        # Update invitation status to ACCEPTED
-        await self.db.execute(
-            update(Invitation)
-            .where(Invitation.id == invitation.id)
-            .values(status=InvitationStatus.ACCEPTED)
-        )
-        
-        # Commit the transaction
+
+        try:
+            if self.db.bind.dialect.name == "postgresql":
+                row = (await self.db.execute(build_registration_statement(**registration))).first()
+                user_id = row[0] if row else None
+            else:
+                user_id = await self._register_pipelined(**registration)
+        except IntegrityError as e:
+            await self.db.rollback()
+            raise conflict_from_integrity_error(e)
+
+        if user_id is None:
+            # Nothing was written: the invitation was not PENDING or had expired
+            await self.db.rollback()
+            raise NotFoundError("Invalid or expired invitation token")
+
         await self.db.commit()
-        await self.db.refresh(new_user)
-        
+
         # Generate JWT tokens
-        access_token = create_access_token(data={"sub": str(new_user.id)})
-        refresh_token = create_refresh_token(data={"sub": str(new_user.id)})
+        access_token = create_access_token(data={"sub": str(user_id)}, principal_type=PRINCIPAL_PARTICIPANT)
+        refresh_token = create_refresh_token(data={"sub": str(user_id)}, principal_type=PRINCIPAL_PARTICIPANT)
         
         return JWTTokens(
             access_token=access_token,
             refresh_token=refresh_token
         )
 
+    async def _register_pipelined(self, invitation_token, user_id, link_id, full_name,
+                                  password_hash, phone_number, unique_code, now):
+        """Registration as three write statements in one transaction (dialects without DML CTEs)."""
+        invitations = Invitation.__table__
+        email = (await self.db.execute(
+            update(invitations)
+            .where(
+                invitations.c.token == invitation_token,
+                invitations.c.status == InvitationStatus.PENDING,
+                invitations.c.expires_at > now
+            )
+            .values(status=InvitationStatus.ACCEPTED)
+            .returning(invitations.c.email)
+        )).scalar_one_or_none()
+        if email is None:
+            return None
+
+        await self.db.execute(insert(User.__table__).values(
+            id=user_id,
+            full_name=full_name,
+            email=email,  # Use the email from the invitation
+            password_hash=password_hash,
+            phone_number=phone_number,
+            status=UserStatus.ACTIVE,
+            created_at=now,
+            updated_at=now
+        ))
+        await self.db.execute(insert(ReferralLink.__table__).values(
+            id=link_id,
+            user_id=user_id,
+            unique_code=unique_code,
+            created_at=now,
+            updated_at=now
+        ))
+        return user_id
+
+
+def build_registration_statement(invitation_token, user_id, link_id, full_name,
+                                 password_hash, phone_number, unique_code, now):
+    """
+    Builds the single-statement registration for PostgreSQL: a chain of
+    data-modifying CTEs that consumes the invitation, inserts the user with the
+    invitation's email and inserts the referral link. Returns one (user_id, link_id)
+    row, or no rows if the invitation was not consumable.
+    """
+    invitations = Invitation.__table__
+    users = User.__table__
+    links = ReferralLink.__table__
+
+    consumed = (
+        update(invitations)
+        .where(
+            invitations.c.token == invitation_token,
+            invitations.c.status == InvitationStatus.PENDING,
+            invitations.c.expires_at > now
+        )
+        .values(status=InvitationStatus.ACCEPTED)
+        .returning(invitations.c.email)
+        .cte("consumed_invitation")
+    )
+    new_user = (
+        insert(users)
+        .from_select(
+            ["id", "full_name", "email", "password_hash", "phone_number", "status", "created_at", "updated_at"],
+            select(
+                literal(user_id, users.c.id.type),
+                literal(full_name, users.c.full_name.type),
+                consumed.c.email,
+                literal(password_hash, users.c.password_hash.type),
+                literal(phone_number, users.c.phone_number.type),
+                literal(UserStatus.ACTIVE, users.c.status.type),
+                literal(now, users.c.created_at.type),
+                literal(now, users.c.updated_at.type),
+            )
+        )
+        .returning(users.c.id)
+        .cte("new_user")
+    )
+    new_link = (
+        insert(links)
+        .from_select(
+            ["id", "user_id", "unique_code", "created_at", "updated_at"],
+            select(
+                literal(link_id, links.c.id.type),
+                new_user.c.id,
+                literal(unique_code, links.c.unique_code.type),
+                literal(now, links.c.created_at.type),
+                literal(now, links.c.updated_at.type),
+            )
+        )
+        .returning(links.c.user_id, links.c.id)
+        .cte("new_link")
+    )
+    return select(new_link.c.user_id, new_link.c.id)
+
+
+def conflict_from_integrity_error(error: IntegrityError) -> ConflictError:
+    """Maps a unique-constraint violation during registration to a ConflictError."""
+    message = str(error.orig)
+    if "phone_number" in message:
+        return ConflictError("Phone number is already registered")
+    if "email" in message:
+        return ConflictError("Email is already registered")
+    return ConflictError("Registration conflicts with an existing record")
+
 # Note: AuthService instances should be created per request to manage the DB session.
 # This class is not instantiated globally like EmailService.
\ No newline at end of file
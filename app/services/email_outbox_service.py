@@ -0,0 +1,229 @@
+"""
+Transactional email outbox.
+
+Request handlers never talk to the email provider. They add an EmailOutbox row in
+the same transaction as the record the email is about (so an email exists if and
+only if its invitation was committed), and the arq worker in app.worker drains the
+outbox in batches with EmailOutboxService.drain().
+
+Delivery is at-least-once. Rows are claimed with a lease (next_attempt_at is pushed
+forward before sending) so a crashed worker's batch is retried, and every request
+carries an idempotency key so Resend can drop duplicates of a request whose
+response was lost.
+"""
+import hashlib
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import httpx
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.exceptions import CircuitOpenError
+from app.models.email_outbox import EmailOutbox, EmailOutboxStatus
+from app.services.email_service import EmailService, email_service
+
+# Resend accepts at most 100 messages per batch request
+RESEND_MAX_BATCH = 100
+# Failures that may succeed if the same request is tried again later
+DELIVERY_ERRORS = (httpx.HTTPStatusError, httpx.RequestError, CircuitOpenError)
+
+outbox_delivered = metrics.counter("email_outbox_delivered_total", "Outbox emails by delivery outcome")
+
+
+def invitation_outbox_row(email: str, token: str, now: datetime, sender: EmailService = email_service) -> dict:
+    """Column values for an invitation email, for multi-row INSERTs."""
+    message = sender.build_invitation_email(email, token)
+    return dict(
+        id=uuid.uuid4(),
+        kind="invitation",
+        recipient=email,
+        subject=message["subject"],
+        html=message["html"],
+        status=EmailOutboxStatus.PENDING,
+        attempts=0,
+        next_attempt_at=now,
+        created_at=now,
+        updated_at=now
+    )
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Exponential backoff with full jitter for the given number of failed attempts."""
+    ceiling = min(
+        settings.email_outbox_backoff_max_seconds,
+        settings.email_outbox_backoff_base_seconds * (2 ** max(attempts - 1, 0))
+    )
+    return timedelta(seconds=random.uniform(ceiling / 2, ceiling))
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Client errors other than timeouts and rate limiting will not succeed on retry."""
+    return (
+        isinstance(error, httpx.HTTPStatusError)
+        and 400 <= error.response.status_code < 500
+        and error.response.status_code not in (408, 409, 429)
+    )
+
+
+def batch_idempotency_key(ids: List[str]) -> str:
+    """Stable idempotency key for a batch of outbox ids."""
+    return "email-outbox/" + hashlib.sha256(",".join(sorted(ids)).encode("utf-8")).hexdigest()
+
+
+class EmailOutboxService:
+    def __init__(self, db: AsyncSession, sender: Optional[EmailService] = None):
+        self.db = db
+        self.sender = sender or email_service
+
+    def enqueue_invitation(self, email: str, token: str) -> EmailOutbox:
+        """
+        Adds an invitation email to the session. Nothing is sent until the caller
+        commits and the worker picks the row up.
+        """
+        row = EmailOutbox(**invitation_outbox_row(email, token, datetime.utcnow(), self.sender))
+        self.db.add(row)
+        return row
+
+    async def drain(self, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> dict:
+        """
+        Sends due outbox emails batch by batch until none are left (or max_batches
+        have been sent) and returns counts by outcome.
+        """
+        batch_size = min(batch_size or settings.email_outbox_batch_size, RESEND_MAX_BATCH)
+        max_batches = max_batches or settings.email_outbox_max_batches
+        totals = {"sent": 0, "retry": 0, "dead": 0}
+        if not self.sender.api_key:
+            print("Resend API key not configured. Leaving outbox emails queued.")
+            return totals
+
+        for _ in range(max_batches):
+            if self.sender.breaker.is_open:
+                # Don't lease emails we can't send; they stay due for the next run
+                break
+            batch = await self._claim(batch_size)
+            if not batch:
+                break
+            for outcome, count in (await self._deliver(batch)).items():
+                totals[outcome] += count
+            if len(batch) < batch_size:
+                break
+        return totals
+
+    async def _claim(self, limit: int) -> List[dict]:
+        """
+        Leases up to limit due rows by pushing their next_attempt_at past the lease
+        period, so concurrent workers (and this one, if it crashes) skip them.
+        """
+        table = EmailOutbox.__table__
+        now = datetime.utcnow()
+        rows = (await self.db.execute(
+            select(table.c.id, table.c.recipient, table.c.subject, table.c.html, table.c.attempts)
+            .where(table.c.status == EmailOutboxStatus.PENDING, table.c.next_attempt_at <= now)
+            .order_by(table.c.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True) # Ignored on SQLite
+        )).mappings().all()
+        if rows:
+            await self.db.execute(
+                update(table)
+                .where(table.c.id.in_([row["id"] for row in rows]))
+                .values(next_attempt_at=now + timedelta(seconds=settings.email_outbox_lease_seconds))
+            )
+        await self.db.commit()
+        return [dict(row) for row in rows]
+
+    async def _deliver(self, batch: List[dict]) -> dict:
+        """Sends a claimed batch and records each row's outcome."""
+        messages = [
+            {"from": self.sender.sender, "to": [row["recipient"]], "subject": row["subject"], "html": row["html"]}
+            for row in batch
+        ]
+        try:
+            message_ids = await self.sender.send_batch(
+                messages, idempotency_key=batch_idempotency_key([str(row["id"]) for row in batch])
+            )
+            outcomes = [(row, message_id, None) for row, message_id in zip(batch, message_ids)]
+        except DELIVERY_ERRORS as e:
+            if len(batch) > 1 and is_permanent_failure(e):
+                # The batch was rejected as a whole; send one by one to isolate the bad messages
+                outcomes = []
+                for row, message in zip(batch, messages):
+                    try:
+                        result = await self.sender.send_email(message, idempotency_key=f"email-outbox/{row['id']}")
+                        outcomes.append((row, result.get("id"), None))
+                    except DELIVERY_ERRORS as single_error:
+                        outcomes.append((row, None, single_error))
+            else:
+                outcomes = [(row, None, e) for row in batch]
+
+        return await self._record(outcomes)
+
+    async def _record(self, outcomes: List[tuple]) -> dict:
+        table = EmailOutbox.__table__
+        now = datetime.utcnow()
+        sent, failed = [], []
+        counts = {"sent": 0, "retry": 0, "dead": 0}
+        for row, message_id, error in outcomes:
+            attempts = row["attempts"] + 1
+            if error is None:
+                sent.append({"b_id": row["id"], "b_message_id": message_id, "b_attempts": attempts})
+                counts["sent"] += 1
+                continue
+            dead = is_permanent_failure(error) or attempts >= settings.email_outbox_max_attempts
+            failed.append({
+                "b_id": row["id"],
+                "b_attempts": attempts,
+                "b_status": EmailOutboxStatus.DEAD if dead else EmailOutboxStatus.PENDING,
+                "b_next_attempt_at": now if dead else now + retry_delay(attempts),
+                "b_last_error": _describe(error),
+            })
+            counts["dead" if dead else "retry"] += 1
+
+        # One executemany per outcome instead of a statement per row
+        if sent:
+            await self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    status=EmailOutboxStatus.SENT,
+                    attempts=bindparam("b_attempts"),
+                    provider_message_id=bindparam("b_message_id"),
+                    sent_at=now,
+                    last_error=None,
+                    updated_at=now
+                ),
+                sent
+            )
+        if failed:
+            await self.db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    status=bindparam("b_status"),
+                    attempts=bindparam("b_attempts"),
+                    next_attempt_at=bindparam("b_next_attempt_at"),
+                    last_error=bindparam("b_last_error"),
+                    updated_at=now
+                ),
+                failed
+            )
+        await self.db.commit()
+
+        for outcome, count in counts.items():
+            if count:
+                outbox_delivered.inc(count, outcome=outcome)
+        return counts
+
+
+def _describe(error: Exception) -> str:
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"HTTP {error.response.status_code}: {error.response.text[:500]}"
+    if isinstance(error, CircuitOpenError):
+        return f"CircuitOpenError: {error.detail}"
+    return f"{type(error).__name__}: {error}"
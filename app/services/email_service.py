@@ -1,26 +1,72 @@
+import asyncio
+import random
+import time
+from typing import List, Optional
+
 import httpx
 from app.config import settings
+from app.core import metrics
+from app.core.circuit_breaker import CircuitBreaker
+
+request_seconds = metrics.histogram("email_provider_request_seconds", "Latency of email provider HTTP calls")
+retries_total = metrics.counter("email_provider_retries_total", "Email provider calls retried after a 5xx, 429 or transport error")
 
 class EmailService:
-    def __init__(self):
-        self.api_key = settings.resend_api_key # Use lowercase attribute name
-        self.base_url = "https://api.resend.com"
-        self.client = httpx.AsyncClient(base_url=self.base_url)
+    """
+    Resend API client. The pooled HTTP client is created by start() (called from the
+    FastAPI lifespan and the worker's startup) or on first use, and closed by aclose().
+    Calls are bounded by a deadline, retried with jitter on 5xx/429/transport errors
+    and fail fast while the circuit breaker is open.
+    """
+    def __init__(self, api_key: Optional[str] = None, client: Optional[httpx.AsyncClient] = None,
+                 base_url: Optional[str] = None, breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key if api_key is not None else settings.resend_api_key # Use lowercase attribute name
+        self.base_url = base_url or settings.resend_base_url
+        self.client = client
+        self.breaker = breaker or CircuitBreaker(
+            "resend",
+            failure_threshold=settings.email_breaker_failure_threshold,
+            reset_timeout=settings.email_breaker_reset_seconds,
+        )
         self.sender_email = "onboarding@resend.dev" # Replace with a verified sender domain if available
 
-    async def send_invitation_email(self, to_email: str, token: str):
+    @property
+    def sender(self) -> str:
+        return f"{settings.project_name} <{self.sender_email}>" # Use lowercase attribute name
+
+    def build_client(self) -> httpx.AsyncClient:
+        """Keep-alive pooled HTTP/2 client for the Resend API."""
+        return httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=settings.email_http2,
+            limits=httpx.Limits(
+                max_connections=settings.email_max_connections,
+                max_keepalive_connections=settings.email_max_keepalive_connections,
+                keepalive_expiry=settings.email_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(
+                settings.email_request_deadline_seconds,
+                connect=settings.email_connect_timeout_seconds,
+            ),
+        )
+
+    async def start(self):
+        if self.client is None:
+            self.client = self.build_client()
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def build_invitation_email(self, to_email: str, token: str) -> dict:
         """
-        Sends a referral program invitation email using Resend.
+        Renders the referral program invitation email as a Resend message.
         """
-        if not self.api_key:
-            print("Resend API key not configured. Skipping email sending.")
-            # In a real application, you might want to log this or raise a specific error
-            return
-
         registration_url = f"{settings.referral_base_url}/register?token={token}" # Use lowercase attribute name
 
-        email_data = {
-            "from": f"{settings.project_name} <{self.sender_email}>", # Use lowercase attribute name
+        return {
+            "from": self.sender,
             "to": [to_email],
             "subject": f"You're Invited to the {settings.project_name} Referral Program!", # Use lowercase attribute name
             "html": f"""
@@ -34,15 +80,19 @@ class EmailService:
             """
         }
 
+    async def send_invitation_email(self, to_email: str, token: str):
+        """
+        Sends a referral program invitation email using Resend.
+        """
+        if not self.api_key:
+            print("Resend API key not configured. Skipping email sending.")
+            # In a real application, you might want to log this or raise a specific error
+            return
+
         try:
-            response = await self.client.post(
-                "/emails",
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                json=email_data
-            )
-            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+            result = await self.send_email(self.build_invitation_email(to_email, token))
             print(f"Invitation email sent successfully to {to_email}")
-            return response.json()
+            return result
         except httpx.HTTPStatusError as e:
             print(f"HTTP error sending email: {e}")
             # Log the error details (e.g., response.text) in a real application
@@ -51,5 +101,94 @@ class EmailService:
             print(f"Request error sending email: {e}")
             raise # Re-raise the exception after logging
 
-# Instantiate the service
-email_service = EmailService()
\ No newline at end of file
+    async def send_email(self, message: dict, idempotency_key: Optional[str] = None,
+                         deadline: Optional[float] = None) -> dict:
+        """
+        Sends a single message with Resend's /emails endpoint and returns the response
+        body ({"id": ...}). Raises httpx.HTTPStatusError, httpx.RequestError (including
+        httpx.TimeoutException when the deadline passes) or CircuitOpenError.
+        """
+        response = await self._post(
+            "/emails", message, idempotency_key, deadline or settings.email_request_deadline_seconds
+        )
+        return response.json()
+
+    async def send_batch(self, messages: List[dict], idempotency_key: Optional[str] = None,
+                         deadline: Optional[float] = None) -> List[str]:
+        """
+        Sends up to 100 messages in one request with Resend's /emails/batch endpoint and
+        returns their email ids in order. Resend validates the batch as a whole, so one
+        invalid message rejects all of them.
+        """
+        response = await self._post(
+            "/emails/batch", messages, idempotency_key, deadline or settings.email_batch_deadline_seconds
+        )
+        return [item["id"] for item in response.json()["data"]]
+
+    async def _post(self, path: str, body, idempotency_key: Optional[str], deadline: float) -> httpx.Response:
+        """
+        POSTs body to path within deadline seconds, retrying transport errors, 5xx and
+        429 responses with jittered exponential backoff while time remains. Requests
+        carry the same idempotency key on every attempt, so retries are safe.
+        """
+        await self.start()
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + deadline
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            remaining = deadline_at - loop.time()
+            started = time.perf_counter()
+            response = error = None
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                response = await asyncio.wait_for(
+                    self.client.post(path, headers=self._headers(idempotency_key), json=body, timeout=remaining),
+                    remaining,
+                )
+                outcome = f"{response.status_code // 100}xx"
+            except asyncio.TimeoutError:
+                error = httpx.TimeoutException(f"POST {path} exceeded its {deadline}s deadline")
+                outcome = "timeout"
+            except httpx.TransportError as e:
+                error = e
+                outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "error"
+            request_seconds.observe(time.perf_counter() - started, endpoint=path, outcome=outcome)
+
+            if response is not None and response.status_code < 500 and response.status_code != 429:
+                # 4xx means the provider is up and rejected this request
+                self.breaker.record_success()
+                response.raise_for_status() # Raise an exception for bad status codes (4xx)
+                return response
+            if response is None or response.status_code >= 500:
+                self.breaker.record_failure()
+
+            attempt += 1
+            delay = self._retry_delay(attempt, response)
+            if attempt > settings.email_max_retries or loop.time() + delay >= deadline_at or self.breaker.is_open:
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+            retries_total.inc(endpoint=path)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.headers.get("retry-after", ""))
+            except ValueError:
+                pass
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, settings.email_retry_backoff_seconds * (2 ** (attempt - 1)))
+
+    def _headers(self, idempotency_key: Optional[str]) -> dict:
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        if idempotency_key:
+            # Lets Resend drop a resend of a request whose response was lost
+            headers["Idempotency-Key"] = idempotency_key
+        return headers
+
+# Instantiate the service (its HTTP client is opened by the application lifespan)
+email_service = EmailService()
@@ -0,0 +1,81 @@
+"""
+Expiry sweeper for invitations.
+
+Invitations past expires_at are moved from PENDING to EXPIRED by a periodic job
+(see app.worker). Work is done in short, bounded chunks: each chunk is a single
+UPDATE of at most chunk_size rows, committed on its own, and the next chunk starts
+after the last (expires_at, id) key of the previous one, so no statement holds
+locks on more than one chunk and no rows are scanned twice.
+
+Running the sweeper on several replicas at once is safe: rows are locked with
+SKIP LOCKED (PostgreSQL), so concurrent sweepers and in-flight registrations never
+wait on each other, and the UPDATE only touches rows that are still PENDING, so a
+row can be expired at most once.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import literal, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.models.invitation import Invitation, InvitationStatus
+
+invitations_expired = metrics.counter("invitations_expired_total", "Invitations moved to EXPIRED by the sweeper")
+
+
+def build_expire_chunk_statement(now: datetime, chunk_size: int, after: Optional[tuple] = None):
+    """
+    UPDATE that expires the next chunk of overdue PENDING invitations in
+    (expires_at, id) order, returning the keys of the rows it changed.
+    """
+    table = Invitation.__table__
+    overdue = [table.c.status == InvitationStatus.PENDING, table.c.expires_at <= now]
+    if after is not None:
+        overdue.append(tuple_(table.c.expires_at, table.c.id) > tuple_(
+            literal(after[0], table.c.expires_at.type), literal(after[1], table.c.id.type)
+        ))
+    chunk = (
+        select(table.c.id)
+        .where(*overdue)
+        .order_by(table.c.expires_at, table.c.id)
+        .limit(chunk_size)
+        .with_for_update(skip_locked=True) # Ignored on SQLite
+        .scalar_subquery()
+    )
+    return (
+        update(table)
+        .where(table.c.id.in_(chunk), table.c.status == InvitationStatus.PENDING)
+        .values(status=InvitationStatus.EXPIRED)
+        .returning(table.c.expires_at, table.c.id)
+    )
+
+
+class InvitationSweeper:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def expire_overdue(self, chunk_size: Optional[int] = None, max_chunks: Optional[int] = None) -> int:
+        """
+        Expires overdue invitations chunk by chunk and returns how many were expired.
+        Stops after max_chunks; anything left is picked up by the next run.
+        """
+        chunk_size = chunk_size or settings.invitation_sweep_chunk_size
+        max_chunks = max_chunks or settings.invitation_sweep_max_chunks
+        now = datetime.utcnow()
+        after = None
+        expired = 0
+        for _ in range(max_chunks):
+            keys = (await self.db.execute(build_expire_chunk_statement(now, chunk_size, after))).all()
+            await self.db.commit()
+            if not keys:
+                break
+            expired += len(keys)
+            after = tuple(max(keys))
+            if len(keys) < chunk_size:
+                break
+        if expired:
+            invitations_expired.inc(expired)
+        return expired
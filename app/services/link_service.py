@@ -0,0 +1,87 @@
+"""
+Referral link resolution for the /r/{code} redirect.
+
+Codes are resolved through a process-local TTL cache, so clicks on a link only
+read referral_links once per referral_link_cache_ttl_seconds per process. Unknown
+and inactive codes are cached too (for a shorter time), so scans for random codes
+don't reach the database either. Deactivating a link takes effect within the TTL.
+"""
+import uuid
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import metrics
+from app.core.link_counters import link_totals
+from app.core.ttl_cache import TTLCache
+from app.exceptions import NotFoundError
+from app.models.referral_link import LinkStatus, ReferralLink
+
+# Seconds an unknown or inactive code is remembered
+NEGATIVE_TTL_SECONDS = 5.0
+_UNKNOWN = "unknown"
+
+link_cache_misses = metrics.counter("referral_link_cache_misses_total", "Referral codes resolved from the database")
+
+_cache = TTLCache(
+    max_size=settings.referral_link_cache_max_size,
+    ttl=settings.referral_link_cache_ttl_seconds,
+)
+
+
+def invalidate_link(unique_code: str):
+    _cache.pop(unique_code)
+
+
+def clear_link_cache():
+    _cache.clear()
+
+
+class LinkService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def resolve_code(self, unique_code: str) -> Optional[uuid.UUID]:
+        """Returns the id of the ACTIVE link with this code, or None."""
+        cached = _cache.get(unique_code)
+        if cached is not None:
+            return None if cached == _UNKNOWN else cached
+
+        link_cache_misses.inc()
+        link_id = (await self.db.execute(
+            select(ReferralLink.id).where(
+                ReferralLink.unique_code == unique_code,
+                ReferralLink.status == LinkStatus.ACTIVE
+            )
+        )).scalar_one_or_none()
+        if link_id is None:
+            _cache.set(unique_code, _UNKNOWN, ttl=NEGATIVE_TTL_SECONDS)
+        else:
+            _cache.set(unique_code, link_id)
+        return link_id
+
+    async def get_link(self, unique_code: str) -> dict:
+        """
+        Returns a link's fields with its exact click and conversion totals (including
+        counter shards not yet compacted).
+
+        Raises:
+            NotFoundError: If no link has this code
+        """
+        link = (await self.db.execute(
+            select(ReferralLink).where(ReferralLink.unique_code == unique_code)
+        )).scalar_one_or_none()
+        if link is None:
+            raise NotFoundError(f"Referral link {unique_code} not found")
+        totals = (await link_totals(self.db, [link.id]))[link.id]
+        return dict(
+            id=link.id,
+            user_id=link.user_id,
+            unique_code=link.unique_code,
+            status=link.status.value,
+            created_at=link.created_at,
+            updated_at=link.updated_at,
+            **totals
+        )
@@ -0,0 +1,496 @@
+"""
+Conversion tracking (TDD 2.1 / 5.1).
+
+A conversion increments the referral's earnings_paid_count, marks it CONVERTED,
+bumps the link's conversion_count (or one of its counter shards, see
+app.core.link_counters) and schedules an Earning. The eligibility check
+(earnings_paid_count < MAX_EARNINGS_PER_REFERRAL) is part of the UPDATE itself, so
+there is no read-then-write window: concurrent deliveries for the same referral are
+serialised by the row lock and the check is re-evaluated against the latest row,
+so a referral can never earn more than six times.
+
+Every conversion is keyed on its transaction_id (app.core.idempotency): the
+processed_transactions row is claimed in the same transaction as the writes, so a
+retried delivery changes nothing and gets the original response back.
+
+Conversions for users who were never referred are rejected by the in-memory
+referred user filter (app.core.referred_user_filter) before any query is sent.
+
+On PostgreSQL all writes are one statement of chained data-modifying CTEs. Other
+dialects run the same claim, conditional UPDATEs and INSERT in one short transaction.
+While the application is running, single conversions are instead group-committed
+through conversion_queue (app.core.group_commit): concurrent requests are written
+together by the batch path, one transaction per micro-batch.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam, exists, func, insert, literal, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core import idempotency, link_counters
+from app.core.group_commit import GroupCommitQueue
+from app.core.referred_user_filter import referred_user_filter
+from app.core.idempotency import StoredResponse
+from app.exceptions import ConflictError, NotFoundError
+from app.models.earning import Earning, EarningStatus
+from app.models.referral import Referral, ReferralStatus
+from app.models.referral_link import ReferralLink
+from app.models.referral_link_counter_shard import ReferralLinkCounterShard
+from app.models.database_utils import dialect_insert
+from app.schemas.conversion import ConversionPayload, ConversionResponse
+from app.schemas.referral import SignupPayload
+
+# Each referral earns once per monthly payment for its first six months
+MAX_EARNINGS_PER_REFERRAL = 6
+# Per-record outcomes of a batch (app.api.v1.conversions batch endpoint)
+BATCH_RESULT_STATUSES = ("processed", "duplicate", "not_found", "cycle_complete", "conflict", "invalid")
+# Response body stored with (and replayed for) every processed conversion
+CONVERSION_RESPONSE_BODY = ConversionResponse().model_dump_json().encode("utf-8")
+
+
+def conversion_fingerprint(payload: ConversionPayload) -> str:
+    """Identifies the conversion a transaction_id was first used for."""
+    return idempotency.request_fingerprint(
+        payload.transaction_id,
+        payload.referred_user_id,
+        str(payload.payment_amount.quantize(Decimal("0.01")))
+    )
+
+
+def _referral_update(referred_user_id: str, now: datetime):
+    """Conditional UPDATE of the (single) eligible referral for a referred user."""
+    referrals = Referral.__table__
+    target = (
+        select(referrals.c.id)
+        .where(referrals.c.referred_user_id == referred_user_id)
+        .order_by(referrals.c.created_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    return (
+        update(referrals)
+        .where(
+            referrals.c.id == target,
+            referrals.c.earnings_paid_count < MAX_EARNINGS_PER_REFERRAL
+        )
+        .values(
+            earnings_paid_count=referrals.c.earnings_paid_count + 1,
+            status=ReferralStatus.CONVERTED,
+            converted_at=func.coalesce(referrals.c.converted_at, now),
+            updated_at=now
+        )
+    )
+
+
+def _earning_values(earning_id: uuid.UUID, now: datetime) -> dict:
+    return dict(
+        id=earning_id,
+        amount=settings.earning_amount,
+        status=EarningStatus.SCHEDULED, # Always explicit: the enum's value is misspelt
+        due_date=now.date() + timedelta(days=settings.earning_due_days),
+        created_at=now,
+        updated_at=now
+    )
+
+
+def build_conversion_statement(referred_user_id: str, earning_id: uuid.UUID, now: datetime,
+                               claim=None):
+    """
+    Single-statement conversion for PostgreSQL. Returns one row: whether the
+    transaction id was claimed and the new earning's id (NULL if the transaction
+    was already processed or there is no eligible referral).
+    """
+    referrals = Referral.__table__
+    links = ReferralLink.__table__
+    earnings = Earning.__table__
+
+    referral_update = _referral_update(referred_user_id, now)
+    claimed = None
+    if claim is not None:
+        # A duplicate transaction claims nothing, so nothing downstream changes
+        claimed = claim.cte("claimed_transaction")
+        referral_update = referral_update.where(exists(select(claimed.c.transaction_id)))
+    converted = (
+        referral_update
+        .returning(referrals.c.id, referrals.c.referral_link_id)
+        .cte("converted_referral")
+    )
+    if link_counters.sharding_enabled():
+        # Count on a random shard; the referrer is read without locking the link row
+        shards = ReferralLinkCounterShard.__table__
+        counted = (
+            link_counters.shard_upsert(
+                "postgresql", link_counters.shard_increment_select(converted.c.referral_link_id, "conversion_count")
+            )
+            .returning(shards.c.link_id)
+            .cte("counted_link")
+        )
+        link = (
+            select(links.c.user_id, converted.c.id.label("referral_id"))
+            .select_from(
+                converted
+                .join(links, links.c.id == converted.c.referral_link_id)
+                .join(counted, counted.c.link_id == converted.c.referral_link_id)
+            )
+            .cte("counted_link_owner")
+        )
+    else:
+        link = (
+            update(links)
+            .where(links.c.id == converted.c.referral_link_id)
+            .values(conversion_count=links.c.conversion_count + 1, updated_at=now)
+            .returning(links.c.user_id, converted.c.id.label("referral_id"))
+            .cte("counted_link")
+        )
+    values = _earning_values(earning_id, now)
+    earning = (
+        insert(earnings)
+        .from_select(
+            ["id", "referral_id", "user_id", "amount", "status", "due_date", "created_at", "updated_at"],
+            select(
+                literal(values["id"], earnings.c.id.type),
+                link.c.referral_id,
+                link.c.user_id,
+                literal(values["amount"], earnings.c.amount.type),
+                literal(values["status"], earnings.c.status.type),
+                literal(values["due_date"], earnings.c.due_date.type),
+                literal(now, earnings.c.created_at.type),
+                literal(now, earnings.c.updated_at.type),
+            )
+        )
+        .returning(earnings.c.id)
+        .cte("scheduled_earning")
+    )
+    scheduled = select(earning.c.id).scalar_subquery()
+    if claimed is None:
+        return select(literal(True).label("claimed"), scheduled.label("earning_id"))
+    return select(
+        exists(select(claimed.c.transaction_id)).label("claimed"),
+        scheduled.label("earning_id")
+    )
+
+
+class TrackingService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def process_conversion(self, payload: ConversionPayload) -> StoredResponse:
+        """
+        Records a paid conversion and schedules its earning, once per transaction_id.
+        Returns the response to send; for a retried transaction this is the stored
+        original (replayed=True) and nothing is written.
+
+        Raises:
+            NotFoundError: If no referral exists for payload.referred_user_id
+            ConflictError: If the referral has completed its earning cycle, or the
+                transaction_id was already used for a different conversion
+            ServiceUnavailableError: If the conversion queue is full
+        """
+        transaction_id = payload.transaction_id
+        fingerprint = conversion_fingerprint(payload)
+        stored = idempotency.cached_response(transaction_id)
+        if stored is not None:
+            return self._replay(stored, fingerprint, "cache")
+        if not referred_user_filter.might_contain(payload.referred_user_id):
+            raise NotFoundError(f"No referral found for referred user {payload.referred_user_id}")
+        if conversion_queue.running:
+            return await conversion_queue.submit(payload)
+
+        response = StoredResponse(200, CONVERSION_RESPONSE_BODY, fingerprint)
+        now = datetime.utcnow()
+        earning_id = uuid.uuid4()
+        dialect_name = self.db.bind.dialect.name
+        claim = idempotency.claim_statement(dialect_name, transaction_id, response, now)
+        if dialect_name == "postgresql":
+            result = (await self.db.execute(
+                build_conversion_statement(payload.referred_user_id, earning_id, now, claim)
+            )).one()
+            claimed, scheduled = bool(result.claimed), result.earning_id is not None
+        else:
+            claimed, scheduled = await self._convert_pipelined(payload.referred_user_id, earning_id, now, claim)
+
+        if not claimed:
+            # Processed by an earlier (or concurrent, now committed) delivery
+            await self.db.rollback()
+            stored = await idempotency.load_response(self.db, transaction_id)
+            if stored is None:
+                raise ConflictError(f"Transaction {transaction_id} is being processed; retry later")
+            return self._replay(stored, fingerprint, "database")
+        if not scheduled:
+            await self.db.rollback()
+            await self._raise_ineligible(payload.referred_user_id)
+
+        await self.db.commit()
+        idempotency.remember_response(transaction_id, response)
+        return response
+
+    @staticmethod
+    def _replay(stored: StoredResponse, fingerprint: str, source: str) -> StoredResponse:
+        replayed = idempotency.replay(stored, fingerprint, source)
+        if replayed is None:
+            raise ConflictError("transaction_id was already used for a different conversion")
+        return replayed
+
+    async def _convert_pipelined(self, referred_user_id: str, earning_id: uuid.UUID, now: datetime,
+                                 claim) -> Tuple[bool, bool]:
+        """
+        The conversion as a claim and three writes in one transaction (dialects
+        without DML CTEs). Returns (claimed, scheduled).
+        """
+        referrals = Referral.__table__
+        links = ReferralLink.__table__
+        if (await self.db.execute(claim)).first() is None:
+            return False, False
+        converted = (await self.db.execute(
+            _referral_update(referred_user_id, now).returning(referrals.c.id, referrals.c.referral_link_id)
+        )).first()
+        if converted is None:
+            return True, False
+
+        if link_counters.sharding_enabled():
+            user_id = (await self.db.execute(
+                select(links.c.user_id).where(links.c.id == converted.referral_link_id)
+            )).scalar_one()
+            await link_counters.add_to_links(self.db, "conversion_count", {converted.referral_link_id: 1}, now)
+        else:
+            user_id = (await self.db.execute(
+                update(links)
+                .where(links.c.id == converted.referral_link_id)
+                .values(conversion_count=links.c.conversion_count + 1, updated_at=now)
+                .returning(links.c.user_id)
+            )).scalar_one()
+        await self.db.execute(
+            insert(Earning.__table__).values(
+                referral_id=converted.id, user_id=user_id, **_earning_values(earning_id, now)
+            )
+        )
+        return True, True
+
+    async def process_conversions_batch(self, payloads: List[ConversionPayload]) -> List[str]:
+        """
+        Applies a chunk of conversions in one transaction with a fixed number of
+        set-based statements and returns each record's outcome (see
+        BATCH_RESULT_STATUSES), in order.
+
+        Records are claimed in processed_transactions first, so retried and
+        repeated transaction ids are reported as duplicates and applied once. The
+        claim also takes SQLite's write lock, and the referral rows are read
+        FOR UPDATE, so eligibility is decided against rows no one else can change
+        before this transaction commits. Several payments for one referral in the
+        same chunk are applied in order until its six-earning cycle is complete.
+        Claims of records that were not applied are released, like a failed
+        single conversion, so they can be delivered again later.
+        """
+        statuses: List[str] = [""] * len(payloads)
+        fingerprints = [conversion_fingerprint(payload) for payload in payloads]
+        first_index: Dict[str, int] = {}
+        pending: Dict[str, StoredResponse] = {}
+        for index, payload in enumerate(payloads):
+            transaction_id = payload.transaction_id
+            if transaction_id in first_index:
+                continue # Resolved against its first occurrence below
+            first_index[transaction_id] = index
+            stored = idempotency.cached_response(transaction_id)
+            if stored is not None:
+                statuses[index] = self._batch_replay(stored, fingerprints[index], "cache")
+            elif not referred_user_filter.might_contain(payload.referred_user_id):
+                statuses[index] = "not_found"
+            else:
+                pending[transaction_id] = StoredResponse(200, CONVERSION_RESPONSE_BODY, fingerprints[index])
+
+        if pending:
+            await self._apply_batch(payloads, first_index, pending, statuses)
+
+        for index, payload in enumerate(payloads):
+            first = first_index[payload.transaction_id]
+            if index != first:
+                statuses[index] = "duplicate" if fingerprints[index] == fingerprints[first] else "conflict"
+        return statuses
+
+    async def _apply_batch(self, payloads: List[ConversionPayload], first_index: Dict[str, int],
+                           pending: Dict[str, StoredResponse], statuses: List[str]):
+        referrals = Referral.__table__
+        links = ReferralLink.__table__
+        now = datetime.utcnow()
+        dialect_name = self.db.bind.dialect.name
+        claimed = set((await self.db.execute(
+            idempotency.claim_many_statement(dialect_name, pending, now)
+        )).scalars().all())
+
+        unclaimed = [transaction_id for transaction_id in pending if transaction_id not in claimed]
+        if unclaimed:
+            stored = await idempotency.load_responses(self.db, unclaimed)
+            for transaction_id in unclaimed:
+                index = first_index[transaction_id]
+                if transaction_id in stored:
+                    statuses[index] = self._batch_replay(stored[transaction_id], pending[transaction_id].fingerprint, "database")
+                else:
+                    statuses[index] = "conflict" # Released or pruned concurrently; the caller should retry it
+        if not claimed:
+            await self.db.commit()
+            return
+
+        # Each referred user's earliest referral, locked for the rest of the transaction
+        referred_user_ids = {payloads[first_index[transaction_id]].referred_user_id for transaction_id in claimed}
+        rows = (await self.db.execute(
+            select(referrals.c.id, referrals.c.referred_user_id, referrals.c.referral_link_id,
+                   referrals.c.earnings_paid_count, links.c.user_id)
+            .join(links, links.c.id == referrals.c.referral_link_id)
+            .where(referrals.c.referred_user_id.in_(referred_user_ids))
+            .order_by(referrals.c.created_at)
+            .with_for_update(of=referrals) # Ignored on SQLite
+        )).all()
+        targets = {}
+        for row in rows:
+            targets.setdefault(row.referred_user_id, row)
+
+        paid_counts = {row.id: row.earnings_paid_count for row in targets.values()}
+        earnings, released = [], []
+        for transaction_id in sorted(claimed, key=first_index.get):
+            index = first_index[transaction_id]
+            target = targets.get(payloads[index].referred_user_id)
+            if target is None:
+                referred_user_filter.record_false_positive()
+                statuses[index] = "not_found"
+            elif paid_counts[target.id] >= MAX_EARNINGS_PER_REFERRAL:
+                statuses[index] = "cycle_complete"
+            else:
+                paid_counts[target.id] += 1
+                earnings.append(dict(referral_id=target.id, user_id=target.user_id, **_earning_values(uuid.uuid4(), now)))
+                statuses[index] = "processed"
+                continue
+            released.append(transaction_id)
+
+        converted = {}
+        for row in targets.values():
+            added = paid_counts[row.id] - row.earnings_paid_count
+            if added:
+                converted[row.id] = added
+        if converted:
+            await self.db.execute(
+                update(referrals)
+                .where(referrals.c.id == bindparam("b_id"))
+                .values(
+                    earnings_paid_count=referrals.c.earnings_paid_count + bindparam("b_count"),
+                    status=ReferralStatus.CONVERTED,
+                    converted_at=func.coalesce(referrals.c.converted_at, now),
+                    updated_at=now
+                ),
+                [{"b_id": referral_id, "b_count": count} for referral_id, count in converted.items()]
+            )
+            link_counts = Counter()
+            for row in targets.values():
+                if row.id in converted:
+                    link_counts[row.referral_link_id] += converted[row.id]
+            await link_counters.add_to_links(self.db, "conversion_count", link_counts, now)
+            await self.db.execute(insert(Earning.__table__), earnings)
+        if released:
+            await self.db.execute(idempotency.release_statement(released))
+        await self.db.commit()
+
+        for transaction_id in claimed:
+            if statuses[first_index[transaction_id]] == "processed":
+                idempotency.remember_response(transaction_id, pending[transaction_id])
+
+    @staticmethod
+    def _batch_replay(stored: StoredResponse, fingerprint: str, source: str) -> str:
+        return "duplicate" if idempotency.replay(stored, fingerprint, source) is not None else "conflict"
+
+    async def record_signup(self, payload: SignupPayload, link_id: uuid.UUID) -> bool:
+        """
+        Attaches the Main SaaS user to the PENDING referral created by their click and
+        marks it SIGNED_UP. If the click has not been flushed yet (app.core.click_buffer)
+        the referral is created here, and the flush later skips it. Returns False if
+        the same signup had already been recorded.
+
+        Raises:
+            ConflictError: If the referral already belongs to another user or link
+        """
+        referrals = Referral.__table__
+        now = datetime.utcnow()
+        statement = dialect_insert(self.db.bind.dialect.name, referrals).values(
+            id=payload.referral_id,
+            referral_link_id=link_id,
+            referred_user_id=payload.referred_user_id,
+            status=ReferralStatus.SIGNED_UP,
+            earnings_paid_count=0,
+            signed_up_at=now,
+            created_at=now,
+            updated_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[referrals.c.id],
+            set_=dict(
+                referred_user_id=statement.excluded.referred_user_id,
+                status=ReferralStatus.SIGNED_UP,
+                signed_up_at=now,
+                updated_at=now
+            ),
+            where=(referrals.c.status == ReferralStatus.PENDING)
+            & (referrals.c.referral_link_id == statement.excluded.referral_link_id)
+        ).returning(referrals.c.id)
+        recorded = (await self.db.execute(statement)).first() is not None
+        if not recorded:
+            existing = (await self.db.execute(
+                select(referrals.c.referred_user_id, referrals.c.referral_link_id)
+                .where(referrals.c.id == payload.referral_id)
+            )).first()
+            await self.db.rollback()
+            if existing is None or existing.referred_user_id != payload.referred_user_id or existing.referral_link_id != link_id:
+                raise ConflictError("Referral has already been used by another signup")
+            return False
+
+        await self.db.commit()
+        referred_user_filter.add(payload.referred_user_id)
+        return True
+
+    async def _raise_ineligible(self, referred_user_id: str):
+        """Failure path only: tells a missing referral apart from a completed cycle."""
+        exists = (await self.db.execute(
+            select(Referral.id).where(Referral.referred_user_id == referred_user_id).limit(1)
+        )).scalar_one_or_none()
+        await self.db.rollback()
+        if exists is None:
+            referred_user_filter.record_false_positive()
+            raise NotFoundError(f"No referral found for referred user {referred_user_id}")
+        raise ConflictError("Referral has already completed its 6-month earning cycle")
+
+
+async def apply_queued_conversions(db: AsyncSession, payloads: List[ConversionPayload]) -> list:
+    """
+    Writes a micro-batch of single conversions with the batch path and turns each
+    record's status into the response (or error) process_conversion would have given.
+    """
+    statuses = await TrackingService(db).process_conversions_batch(payloads)
+    results = []
+    for payload, result_status in zip(payloads, statuses):
+        if result_status in ("processed", "duplicate"):
+            # Only successful conversions are ever stored, so a replay is the same body
+            results.append(StoredResponse(
+                200, CONVERSION_RESPONSE_BODY, conversion_fingerprint(payload), replayed=result_status == "duplicate"
+            ))
+        elif result_status == "not_found":
+            results.append(NotFoundError(f"No referral found for referred user {payload.referred_user_id}"))
+        elif result_status == "cycle_complete":
+            results.append(ConflictError("Referral has already completed its 6-month earning cycle"))
+        else:
+            results.append(ConflictError(
+                f"Transaction {payload.transaction_id} was already used for a different conversion or is being processed"
+            ))
+    return results
+
+
+# Instantiate the queue (process-wide; started and drained by the application lifespan)
+conversion_queue = GroupCommitQueue(
+    "conversions",
+    apply_queued_conversions,
+    max_batch_size=settings.conversion_queue_max_batch_size,
+    max_wait=settings.conversion_queue_window_seconds,
+    max_pending=settings.conversion_queue_max_pending,
+)
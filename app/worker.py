@@ -0,0 +1,74 @@
+"""
+arq worker for background jobs.
+
+Run with:
+    arq app.worker.WorkerSettings
+
+The email outbox is drained on a short cron interval (and once at startup), so
+request handlers never wait on the email provider and never need to reach Redis.
+Overdue invitations are expired once a minute, referral link counter shards are
+compacted once a minute, and conversion idempotency records past their retention
+period are pruned nightly.
+"""
+from arq import cron
+from arq.connections import RedisSettings
+
+from app.config import settings
+from app.core.database import async_session, engine
+from app.core.idempotency import prune_processed_transactions
+from app.core.link_counters import compact_link_counters
+from app.services.email_outbox_service import EmailOutboxService
+from app.services.email_service import email_service
+from app.services.invitation_sweeper import InvitationSweeper
+
+
+async def drain_email_outbox(ctx) -> dict:
+    """Sends every due email in the outbox."""
+    async with async_session() as db:
+        return await EmailOutboxService(db).drain()
+
+
+async def expire_invitations(ctx) -> int:
+    """Moves overdue PENDING invitations to EXPIRED."""
+    async with async_session() as db:
+        return await InvitationSweeper(db).expire_overdue()
+
+
+async def compact_link_counter_shards(ctx) -> int:
+    """Folds referral link counter shards into referral_links."""
+    async with async_session() as db:
+        return await compact_link_counters(db)
+
+
+async def prune_idempotency_records(ctx) -> int:
+    """Deletes processed_transactions rows older than the retention period."""
+    async with async_session() as db:
+        return await prune_processed_transactions(db)
+
+
+async def startup(ctx):
+    await email_service.start()
+
+
+async def shutdown(ctx):
+    await email_service.aclose()
+    await engine.dispose()
+
+
+class WorkerSettings:
+    functions = [drain_email_outbox, expire_invitations, compact_link_counter_shards, prune_idempotency_records]
+    cron_jobs = [
+        cron(
+            drain_email_outbox,
+            second=set(range(0, 60, settings.email_outbox_poll_seconds)),
+            run_at_startup=True,
+            unique=True, # Never run two drains at once
+        ),
+        # Every minute; safe to run alongside sweepers on other replicas
+        cron(expire_invitations, second=30, run_at_startup=True, unique=True),
+        cron(compact_link_counter_shards, second=45, unique=True),
+        cron(prune_idempotency_records, hour=3, minute=15, unique=True),
+    ]
+    on_startup = startup
+    on_shutdown = shutdown
+    redis_settings = RedisSettings.from_dsn(settings.redis_url)
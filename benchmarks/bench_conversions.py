@@ -0,0 +1,175 @@
+"""
+Conversion ingestion load benchmark.
+
+Drives POST /api/v1/conversions through the ASGI app with a fixed number of
+concurrent clients for a fixed duration and reports sustained requests per second,
+latency percentiles and statements per conversion. Referrals are seeded up front and
+each request converts a random one, so some requests hit referrals that have
+completed their six-earning cycle (409) just as duplicate deliveries would.
+
+With --batch-size N the same load is then replayed through POST
+/api/v1/conversions/batch as NDJSON bodies of N records, and records per second are
+reported for both endpoints.
+
+Usage:
+    python -m benchmarks.bench_conversions [--referrals 1000] [--concurrency 16] [--seconds 10]
+                                           [--batch-size 500]
+                                           [--database-url sqlite+aiosqlite:///./bench.db]
+
+SQLite serialises writers, so run it against a PostgreSQL URL to measure the
+single-statement path under real concurrency.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+import json
+from collections import Counter
+from functools import partial
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.core.database import Base, get_db
+from app.main import app
+from app.models.referral import Referral, ReferralStatus
+from app.models.referral_link import ReferralLink
+from app.models.user import User
+
+API_KEY = "bench-conversion-key"
+
+
+async def seed(session_factory, referrals: int):
+    """One referrer per 10 referrals, inserted with multi-row INSERTs."""
+    users, links, rows = [], [], []
+    for i in range(referrals):
+        if i % 10 == 0:
+            user_id, link_id = uuid.uuid4(), uuid.uuid4()
+            users.append(dict(
+                id=user_id, full_name="Bench Referrer", email=f"referrer-{i}@example.com",
+                password_hash="hash", phone_number=f"+2547{i:08d}"
+            ))
+            links.append(dict(id=link_id, user_id=user_id, unique_code=f"B{i:07d}"))
+        rows.append(dict(
+            id=uuid.uuid4(), referral_link_id=link_id, referred_user_id=f"saas-{i}",
+            status=ReferralStatus.SIGNED_UP
+        ))
+    async with session_factory() as db:
+        await db.execute(insert(User.__table__), users)
+        await db.execute(insert(ReferralLink.__table__), links)
+        await db.execute(insert(Referral.__table__), rows)
+        await db.commit()
+
+
+def conversion(referrals: int) -> dict:
+    return {
+        "referred_user_id": f"saas-{random.randrange(referrals)}",
+        "payment_amount": "19.99",
+        "transaction_id": f"txn_{uuid.uuid4().hex}",
+    }
+
+
+async def worker(client: AsyncClient, referrals: int, stop_at: float, latencies: list, statuses: Counter):
+    while time.perf_counter() < stop_at:
+        body = conversion(referrals)
+        started = time.perf_counter()
+        response = await client.post("/api/v1/conversions", json=body, headers={"X-API-KEY": API_KEY})
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] += 1
+
+
+async def batch_worker(client: AsyncClient, referrals: int, batch_size: int, stop_at: float,
+                       latencies: list, statuses: Counter):
+    while time.perf_counter() < stop_at:
+        body = "".join(json.dumps(conversion(referrals)) + "\n" for _ in range(batch_size))
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/v1/conversions/batch", content=body,
+            headers={"X-API-KEY": API_KEY, "Content-Type": "application/x-ndjson"}
+        )
+        latencies.append(time.perf_counter() - started)
+        for line in response.text.splitlines()[:-1]:
+            statuses[json.loads(line)["status"]] += 1
+
+
+async def measure(label: str, engine, workers, records_per_request: int):
+    statements = 0
+
+    def on_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_statement)
+    latencies, statuses = [], Counter()
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            started = time.perf_counter()
+            await asyncio.gather(*[
+                run(client=client, latencies=latencies, statuses=statuses) for run in workers
+            ])
+            elapsed = time.perf_counter() - started
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_statement)
+
+    records = len(latencies) * records_per_request
+    latencies.sort()
+    print(
+        f"{label:<7} requests={len(latencies)} rps={len(latencies) / elapsed:8.1f} "
+        f"records/s={records / elapsed:9.1f} "
+        f"statements/record={statements / records:4.2f} "
+        f"p50={latencies[len(latencies) // 2] * 1000:8.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:8.3f}ms "
+        f"statuses={dict(sorted(statuses.items()))}"
+    )
+
+
+async def main(referrals: int, concurrency: int, seconds: float, batch_size: int, database_url: str):
+    engine = create_async_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        for table in Base.metadata.tables.values():
+            table.schema = None
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession)
+    await seed(session_factory, referrals)
+
+    async def override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    settings.conversion_api_key = API_KEY
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        stop_at = time.perf_counter() + seconds
+        single = partial(worker, referrals=referrals, stop_at=stop_at)
+        await measure("single", engine, [single] * concurrency, 1)
+        if batch_size:
+            stop_at = time.perf_counter() + seconds
+            batch = partial(batch_worker, referrals=referrals, batch_size=batch_size, stop_at=stop_at)
+            await measure("batch", engine, [batch] * concurrency, batch_size)
+    finally:
+        app.dependency_overrides.clear()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--referrals", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--batch-size", type=int, default=0)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    args = parser.parse_args()
+    asyncio.run(main(args.referrals, args.concurrency, args.seconds, args.batch_size, args.database_url))
+    if args.database_url == "sqlite+aiosqlite:///./bench.db" and os.path.exists("./bench.db"):
+        os.remove("./bench.db")
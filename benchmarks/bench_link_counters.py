@@ -0,0 +1,108 @@
+"""
+Hot-link counter contention benchmark.
+
+Many concurrent writers increment the conversion count of one referral link, each
+increment in its own transaction, first with a single counter row (UPDATE
+referral_links) and then with sharded counters (upsert into one of --shards rows).
+Reports increments per second and latency percentiles, and checks that the exact
+total read back matches the number of increments.
+
+Usage:
+    python -m benchmarks.bench_link_counters [--writers 64] [--seconds 10] [--shards 16]
+                                             [--database-url postgresql+asyncpg://...]
+
+Row-lock contention is a PostgreSQL effect: SQLite takes one database-wide write
+lock, so on the default SQLite URL both modes serialise and perform alike.
+"""
+import argparse
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.core.database import Base
+from app.core.link_counters import add_to_links, compact_link_counters, link_totals
+from app.models.referral_link import ReferralLink
+from app.models.user import User
+
+
+async def writer(session_factory, link_id, stop_at: float, latencies: list):
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        async with session_factory() as db:
+            await add_to_links(db, "conversion_count", {link_id: 1}, datetime.utcnow())
+            await db.commit()
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(label: str, session_factory, link_id, writers: int, seconds: float):
+    async with session_factory() as db:
+        before = (await link_totals(db, [link_id]))[link_id]["conversion_count"]
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        writer(session_factory, link_id, started + seconds, latencies) for _ in range(writers)
+    ])
+    elapsed = time.perf_counter() - started
+    async with session_factory() as db:
+        after = (await link_totals(db, [link_id]))[link_id]["conversion_count"]
+
+    latencies.sort()
+    print(
+        f"{label:<12} increments={len(latencies)} per_second={len(latencies) / elapsed:9.1f} "
+        f"p50={latencies[len(latencies) // 2] * 1000:8.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:8.3f}ms "
+        f"exact={after - before == len(latencies)}"
+    )
+
+
+async def main(writers: int, seconds: float, shards: int, database_url: str):
+    engine = create_async_engine(database_url, pool_size=writers, max_overflow=0) \
+        if not database_url.startswith("sqlite") else create_async_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        for table in Base.metadata.tables.values():
+            table.schema = None
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession)
+
+    user_id, link_id = uuid.uuid4(), uuid.uuid4()
+    async with session_factory() as db:
+        await db.execute(insert(User.__table__).values(
+            id=user_id, full_name="Star Referrer", email="star@example.com", password_hash="hash",
+            phone_number="+254700000000"
+        ))
+        await db.execute(insert(ReferralLink.__table__).values(id=link_id, user_id=user_id, unique_code="STAR0000"))
+        await db.commit()
+
+    settings.link_counter_shards = 0
+    await run("single-row", session_factory, link_id, writers, seconds)
+    settings.link_counter_shards = shards
+    await run(f"{shards}-shards", session_factory, link_id, writers, seconds)
+    async with session_factory() as db:
+        started = time.perf_counter()
+        await compact_link_counters(db)
+        print(f"compaction={(time.perf_counter() - started) * 1000:.3f}ms")
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    args = parser.parse_args()
+    asyncio.run(main(args.writers, args.seconds, args.shards, args.database_url))
+    if args.database_url == "sqlite+aiosqlite:///./bench.db" and os.path.exists("./bench.db"):
+        os.remove("./bench.db")
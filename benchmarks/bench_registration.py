@@ -0,0 +1,150 @@
+"""
+Registration round-trip benchmark.
+
+Compares the original registration flow (invitation SELECT, phone SELECT, code probe
+SELECT, flushed INSERTs, invitation UPDATE, commit and refresh) with the current
+AuthService.register_participant pipeline against a local SQLite database, reporting
+statements sent, commits and latency per signup. Password hashing is patched out so
+only database work is measured.
+
+Usage:
+    python -m benchmarks.bench_registration [--signups 500] [--database-url sqlite+aiosqlite:///./bench.db]
+
+On SQLite the pipeline is three statements in one transaction; on PostgreSQL it is a
+single statement, so run it against a PostgreSQL URL to see the one-round-trip path.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import event, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.core.security import generate_unique_code
+from app.models.invitation import Invitation, InvitationStatus
+from app.models.referral_link import ReferralLink
+from app.models.user import User
+from app.schemas.user import UserCreate
+from app.services.auth_service import AuthService
+
+
+async def legacy_register(db: AsyncSession, invitation_token: str, user_data: UserCreate):
+    """The registration flow as it was before the pipeline (minus password hashing)."""
+    invitation = (await db.execute(
+        select(Invitation).where(
+            Invitation.token == invitation_token,
+            Invitation.status == InvitationStatus.PENDING,
+            Invitation.expires_at > datetime.utcnow()
+        )
+    )).scalar_one_or_none()
+    existing = (await db.execute(select(User).where(User.phone_number == user_data.phone_number))).scalar_one_or_none()
+    assert invitation is not None and existing is None
+
+    unique_code = generate_unique_code()
+    while (await db.execute(select(ReferralLink).where(ReferralLink.unique_code == unique_code))).scalar_one_or_none():
+        unique_code = generate_unique_code()
+
+    new_user = User(
+        full_name=user_data.full_name,
+        email=invitation.email,
+        password_hash="hashed_password",
+        phone_number=user_data.phone_number
+    )
+    db.add(new_user)
+    await db.flush()
+    db.add(ReferralLink(user_id=new_user.id, unique_code=unique_code))
+    await db.execute(
+        update(Invitation).where(Invitation.id == invitation.id).values(status=InvitationStatus.ACCEPTED)
+    )
+    await db.commit()
+    await db.refresh(new_user)
+
+
+async def pipelined_register(db: AsyncSession, invitation_token: str, user_data: UserCreate):
+    await AuthService(db).register_participant(invitation_token, user_data)
+
+
+async def run(flow, engine, session_factory, label: str, signups: int):
+    # Seed the invitations up front so only registration is measured
+    async with session_factory() as db:
+        for i in range(signups):
+            invitation = Invitation(
+                email=f"{label}-{i}@example.com",
+                token=f"{label}-{i}",
+                expires_at=datetime.utcnow() + timedelta(days=1)
+            )
+            invitation.status = InvitationStatus.PENDING
+            db.add(invitation)
+        await db.commit()
+
+    counts = {"statements": 0, "commits": 0}
+
+    def on_statement(*args):
+        counts["statements"] += 1
+
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_statement)
+    event.listen(engine.sync_engine, "commit", on_commit)
+    latencies = []
+    try:
+        for i in range(signups):
+            user_data = UserCreate(
+                full_name="Bench User",
+                password="password123",
+                phone_number=f"+2547{1 if flow is legacy_register else 2}{i:07d}",
+                email=f"{label}-{i}@example.com"
+            )
+            async with session_factory() as db:
+                started = time.perf_counter()
+                await flow(db, f"{label}-{i}", user_data)
+                latencies.append(time.perf_counter() - started)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", on_statement)
+        event.remove(engine.sync_engine, "commit", on_commit)
+
+    latencies.sort()
+    print(
+        f"{label:<10} statements/signup={counts['statements'] / signups:5.2f} "
+        f"commits/signup={counts['commits'] / signups:4.2f} "
+        f"mean={statistics.mean(latencies) * 1000:7.3f}ms "
+        f"p50={latencies[len(latencies) // 2] * 1000:7.3f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:7.3f}ms"
+    )
+
+
+async def main(signups: int, database_url: str):
+    engine = create_async_engine(database_url)
+    if engine.dialect.name == "sqlite":
+        for table in Base.metadata.tables.values():
+            table.schema = None
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession)
+
+    with patch("app.services.auth_service.hash_password_async", new_callable=AsyncMock, return_value="hashed_password"):
+        await run(legacy_register, engine, session_factory, "legacy", signups)
+        await run(pipelined_register, engine, session_factory, "pipelined", signups)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--signups", type=int, default=500)
+    parser.add_argument("--database-url", default="sqlite+aiosqlite:///./bench.db")
+    args = parser.parse_args()
+    asyncio.run(main(args.signups, args.database_url))
+    if args.database_url == "sqlite+aiosqlite:///./bench.db" and os.path.exists("./bench.db"):
+        os.remove("./bench.db")
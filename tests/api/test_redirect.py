@@ -0,0 +1,95 @@
+import uuid
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+from app.core.click_buffer import click_buffer
+from app.models.referral import Referral, ReferralStatus
+from app.models.referral_link import LinkStatus, ReferralLink
+from app.models.user import User
+from app.services.link_service import clear_link_cache
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def fresh_click_state():
+    click_buffer.reset()
+    clear_link_cache()
+    yield
+    click_buffer.reset()
+    clear_link_cache()
+
+
+async def seed_link(db, code="ABCD2345", status=LinkStatus.ACTIVE):
+    user = User(
+        full_name="Referrer",
+        email=f"{code.lower()}@example.com",
+        password_hash="hash",
+        phone_number=f"+2547{uuid.uuid4().int % 10**8:08d}"
+    )
+    db.add(user)
+    await db.flush()
+    link = ReferralLink(user_id=user.id, unique_code=code, status=status)
+    db.add(link)
+    await db.flush()
+    link_id = link.id
+    await db.commit()
+    return link_id
+
+
+async def test_redirect_to_landing_page_with_referral(client: AsyncClient, test_db):
+    """Test that a click redirects to the signup page carrying the code and a referral id."""
+    await seed_link(test_db)
+
+    response = await client.get("/r/ABCD2345")
+
+    assert response.status_code == 302
+    assert response.headers["cache-control"] == "no-store"
+    location = urlsplit(response.headers["location"])
+    query = parse_qs(location.query)
+    assert query["ref"] == ["ABCD2345"]
+    uuid.UUID(query["referral_id"][0])
+
+
+async def test_clicks_are_buffered_then_flushed_in_one_transaction(client: AsyncClient, test_db, query_counter):
+    """Test that clicks cost no writes per request and are flushed as one UPDATE per link."""
+    hot_link = await seed_link(test_db, "HOTLINK2")
+    cold_link = await seed_link(test_db, "COLDLNK2")
+    del query_counter[:]
+
+    responses = [await client.get("/r/HOTLINK2") for _ in range(20)] + [await client.get("/r/COLDLNK2")]
+
+    # One code lookup per link, then served from the link cache; nothing written yet
+    assert [s.split()[0].upper() for s in query_counter] == ["SELECT", "SELECT"]
+    assert click_buffer.pending == 21
+    del query_counter[:]
+
+    written = await click_buffer.flush(test_db)
+
+    assert written == 21
+    assert [s.split()[0].upper() for s in query_counter] == ["UPDATE", "INSERT"]
+    test_db.expire_all()
+    counts = dict((await test_db.execute(select(ReferralLink.id, ReferralLink.click_count))).all())
+    assert counts == {hot_link: 20, cold_link: 1}
+    referrals = (await test_db.execute(select(Referral.id, Referral.status, Referral.referral_link_id))).all()
+    assert len(referrals) == 21
+    assert {row.status for row in referrals} == {ReferralStatus.PENDING}
+    # The referral id handed to the visitor is the one written
+    redirected_ids = {parse_qs(urlsplit(r.headers["location"]).query)["referral_id"][0] for r in responses}
+    assert redirected_ids == {str(row.id) for row in referrals}
+
+
+async def test_unknown_and_inactive_codes(client: AsyncClient, test_db, query_counter):
+    """Test that unknown and inactive codes return 404, with repeats served from the cache."""
+    await seed_link(test_db, "OFFLINE2", status=LinkStatus.INACTIVE)
+    del query_counter[:]
+
+    assert (await client.get("/r/NOSUCHCD")).status_code == 404
+    assert (await client.get("/r/NOSUCHCD")).status_code == 404
+    assert (await client.get("/r/OFFLINE2")).status_code == 404
+
+    assert len(query_counter) == 2
+    assert click_buffer.pending == 0
@@ -1,3 +1,5 @@
+import json
+import httpx
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,22 +12,22 @@ from app.models.invitation import Invitation, InvitationStatus
 from app.models.admin_user import AdminUser
 from app.core.security import create_access_token
 from app.dependencies import get_current_admin_user
-from app.services.email_service import EmailService
+from app.models.email_outbox import EmailOutbox, EmailOutboxStatus
 
-# Mock the email_service instance globally for integration tests
-email_service_mock = AsyncMock(spec=EmailService)
+# Mock the Resend HTTP client so any network call made by a request is recorded
+email_client_mock = AsyncMock(spec=httpx.AsyncClient)
 
-# Temporarily patch the email_service instance used within AuthService
-original_email_service_path = 'app.services.auth_service.email_service'
+# Temporarily patch the HTTP client of the shared email_service instance
+original_email_client_path = 'app.services.email_service.email_service.client'
 pytestmark = pytest.mark.asyncio
 
 @pytest.fixture(autouse=True)
-def mock_email_service_in_auth_service():
-    """Fixture to patch the email_service instance within the AuthService module."""
-    with patch(original_email_service_path, email_service_mock):
+def mock_email_client():
+    """Fixture to patch the email_service HTTP client."""
+    with patch(original_email_client_path, email_client_mock):
         yield
     # Reset the mock after each test
-    email_service_mock.reset_mock()
+    email_client_mock.reset_mock()
 
 @pytest.fixture(autouse=True)
 def override_admin_dependency(client, async_session):
@@ -82,8 +84,13 @@ async def test_create_invitation_success(client: AsyncClient, async_session: Asy
     assert invitation.token is not None
     assert invitation.expires_at > datetime.utcnow() - timedelta(minutes=1)
 
-    # Verify email service was called
-    email_service_mock.send_invitation_email.assert_called_once_with(email, invitation.token)
+    # Verify the email was queued in the outbox rather than sent inline
+    email_client_mock.post.assert_not_called()
+    outbox = (await async_session.execute(select(EmailOutbox))).scalars().all()
+    assert len(outbox) == 1
+    assert outbox[0].recipient == email
+    assert outbox[0].status == EmailOutboxStatus.PENDING
+    assert invitation.token in outbox[0].html
 
 
 async def test_create_invitation_conflict(client: AsyncClient, async_session: AsyncSession):
@@ -116,5 +123,118 @@ async def test_create_invitation_conflict(client: AsyncClient, async_session: As
     # Should still only have the one existing invitation
     assert len(invitations_in_db.scalars().all()) == 1
 
-    # Verify email service was not called
-    email_service_mock.send_invitation_email.assert_not_called()
\ No newline at end of file
+    # Verify no email was queued or sent
+    email_client_mock.post.assert_not_called()
+    outbox = (await async_session.execute(select(EmailOutbox))).scalars().all()
+    assert outbox == []
+
+def parse_ndjson(response):
+    """Splits an NDJSON bulk import response into per-email results and the summary line."""
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+async def test_bulk_import_csv(client: AsyncClient, async_session: AsyncSession):
+    """Test a CSV import with new, repeated, invalid and already invited emails."""
+    async_session.add(Invitation(
+        email="already@example.com",
+        token="already_token",
+        status=InvitationStatus.PENDING,
+        expires_at=datetime.utcnow() + timedelta(days=1)
+    ))
+    await async_session.commit()
+
+    upload = "email,name\r\none@example.com,One\r\ntwo@example.com,Two\r\none@example.com,Again\r\nnot-an-email,Bad\r\nalready@example.com,Old\r\n"
+    response = await client.post(
+        "/api/v1/admin/invitations/bulk",
+        content=upload,
+        headers={"Content-Type": "text/csv"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results, summary = parse_ndjson(response)
+    assert [(r["email"], r["status"]) for r in results] == [
+        ("one@example.com", "created"),
+        ("two@example.com", "created"),
+        ("one@example.com", "duplicate"),
+        ("not-an-email", "invalid"),
+        ("already@example.com", "already_invited"),
+    ]
+    assert all("token" not in r for r in results)
+    assert summary["summary"] == {"created": 2, "already_invited": 1, "duplicate": 1, "invalid": 1, "total": 5}
+
+    created = (await async_session.execute(
+        select(Invitation).where(Invitation.email.in_(["one@example.com", "two@example.com"]))
+    )).scalars().all()
+    assert len(created) == 2
+    assert all(invitation.status == InvitationStatus.PENDING for invitation in created)
+
+    # One outbox email per created invitation, written with the invitations
+    email_client_mock.post.assert_not_called()
+    outbox = (await async_session.execute(select(EmailOutbox))).scalars().all()
+    assert sorted(row.recipient for row in outbox) == ["one@example.com", "two@example.com"]
+    tokens = {invitation.email: invitation.token for invitation in created}
+    assert all(tokens[row.recipient] in row.html for row in outbox)
+
+
+async def test_bulk_import_json_batches(client: AsyncClient, async_session: AsyncSession, query_counter):
+    """Test a JSON import is written with one duplicate check and one INSERT per batch."""
+    emails = [f"user{i}@example.com" for i in range(5)]
+    body = json.dumps([emails[0], {"email": emails[1]}] + emails[2:])
+
+    with patch("app.api.v1.admin.invitations.settings.invitation_import_batch_size", 2):
+        response = await client.post(
+            "/api/v1/admin/invitations/bulk",
+            content=body,
+            headers={"Content-Type": "application/json"}
+        )
+
+    assert response.status_code == 200
+    results, summary = parse_ndjson(response)
+    assert [r["email"] for r in results] == emails
+    assert summary["summary"]["created"] == 5
+
+    statements = [s.split()[0].upper() for s in query_counter if "invitations" in s or "email_outbox" in s]
+    assert statements == ["SELECT", "INSERT", "INSERT"] * 3
+
+
+async def test_bulk_import_rejects_malformed_json(client: AsyncClient, async_session: AsyncSession):
+    """Test that a malformed upload is rejected before anything is written."""
+    response = await client.post(
+        "/api/v1/admin/invitations/bulk",
+        content='{"email": "a@example.com"}',
+        headers={"Content-Type": "application/json"}
+    )
+
+    assert response.status_code == 422
+    invitations = (await async_session.execute(select(Invitation))).scalars().all()
+    assert invitations == []
+
+
+async def test_bulk_import_unsupported_media_type(client: AsyncClient):
+    """Test that uploads other than CSV or JSON are rejected."""
+    response = await client.post(
+        "/api/v1/admin/invitations/bulk",
+        content=b"\x00\x01",
+        headers={"Content-Type": "application/octet-stream"}
+    )
+
+    assert response.status_code == 415
+
+
+async def test_create_invitation_ignores_overdue_pending_invitation(client: AsyncClient, async_session: AsyncSession):
+    """Test that a PENDING invitation past its expiry doesn't block a new one."""
+    email = "stale.pending@example.com"
+    async_session.add(Invitation(
+        email=email,
+        token="stale_token",
+        status=InvitationStatus.PENDING,
+        expires_at=datetime.utcnow() - timedelta(hours=1)
+    ))
+    await async_session.commit()
+
+    response = await client.post("/api/v1/admin/invitations/", params={"email": email})
+
+    assert response.status_code == 201
+    assert response.json()["token"] != "stale_token"
@@ -0,0 +1,44 @@
+import pytest
+from datetime import datetime
+from httpx import AsyncClient
+
+from app.config import settings
+from app.core.link_counters import add_to_links
+from app.dependencies import get_current_admin_user
+from app.main import app
+from app.models.referral_link import ReferralLink
+from tests.api.v1.conversions.test_conversions import seed_referral
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def override_admin_dependency():
+    app.dependency_overrides[get_current_admin_user] = lambda: {"email": "testadmin@example.com", "role": "CTO"}
+    yield
+    app.dependency_overrides.pop(get_current_admin_user, None)
+
+
+async def test_get_referral_link_returns_exact_totals(client: AsyncClient, test_db, monkeypatch):
+    """Test that the link's counters include uncompacted shard increments."""
+    link_id, _ = await seed_referral(test_db)
+    await add_to_links(test_db, "click_count", {link_id: 4}, datetime.utcnow())
+    monkeypatch.setattr(settings, "link_counter_shards", 8)
+    await add_to_links(test_db, "click_count", {link_id: 3}, datetime.utcnow())
+    await add_to_links(test_db, "conversion_count", {link_id: 2}, datetime.utcnow())
+    await test_db.commit()
+    code = (await test_db.get(ReferralLink, link_id)).unique_code
+
+    response = await client.get(f"/api/v1/admin/referral-links/{code}")
+
+    assert response.status_code == 200
+    assert response.json()["click_count"] == 7
+    assert response.json()["conversion_count"] == 2
+    assert response.json()["status"] == "ACTIVE"
+
+
+async def test_get_unknown_referral_link(client: AsyncClient):
+    """Test that an unknown code returns 404."""
+    response = await client.get("/api/v1/admin/referral-links/NOSUCHCD")
+
+    assert response.status_code == 404
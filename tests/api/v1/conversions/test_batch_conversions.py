@@ -0,0 +1,162 @@
+import json
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core.idempotency import clear_idempotency_cache
+from app.models.earning import Earning
+from app.models.processed_transaction import ProcessedTransaction
+from app.models.referral import Referral
+from app.models.referral_link import ReferralLink
+from tests.api.v1.conversions.test_conversions import API_KEY, seed_referral
+
+pytestmark = pytest.mark.asyncio
+
+HEADERS = {"X-API-KEY": API_KEY, "Content-Type": "application/x-ndjson"}
+
+
+@pytest.fixture(autouse=True)
+def conversion_settings(monkeypatch):
+    monkeypatch.setattr(settings, "conversion_api_key", API_KEY)
+    clear_idempotency_cache()
+    yield
+    clear_idempotency_cache()
+
+
+def ndjson(*records) -> bytes:
+    return "".join(
+        (record if isinstance(record, str) else json.dumps(record)) + "\n" for record in records
+    ).encode("utf-8")
+
+
+def record(referred_user_id, transaction_id, amount="19.99"):
+    return {"referred_user_id": referred_user_id, "payment_amount": amount, "transaction_id": transaction_id}
+
+
+def parse(response):
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    return lines[:-1], lines[-1]
+
+
+async def test_batch_reports_every_outcome(client: AsyncClient, test_db):
+    """Test that each record gets its own result line and a summary closes the stream."""
+    _, referral_id = await seed_referral(test_db, "saas-user-1")
+    await seed_referral(test_db, "saas-user-done", earnings_paid_count=6)
+
+    response = await client.post("/api/v1/conversions/batch", headers=HEADERS, content=ndjson(
+        record("saas-user-1", "txn_1"),
+        record("saas-user-1", "txn_1"),
+        record("nobody", "txn_2"),
+        record("saas-user-done", "txn_3"),
+        "{not json",
+        record("saas-user-1", "txn_1", amount="99.00"),
+    ))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results, closing = parse(response)
+    assert [(r["line"], r["status"]) for r in results] == [
+        (1, "processed"), (2, "duplicate"), (3, "not_found"), (4, "cycle_complete"), (5, "invalid"), (6, "conflict"),
+    ]
+    assert closing["summary"]["total"] == 6
+    assert closing["summary"]["processed"] == 1
+    assert "error" not in closing
+    # Only the processed record keeps its claim; rejected ones can be delivered again
+    claims = (await test_db.execute(select(ProcessedTransaction.transaction_id))).scalars().all()
+    assert claims == ["txn_1"]
+    assert len((await test_db.execute(select(Earning.id).where(Earning.referral_id == referral_id))).all()) == 1
+
+
+async def test_batch_applies_repeat_payments_up_to_cycle(client: AsyncClient, test_db):
+    """Test that several payments for one referral in a chunk stop at the six-earning limit."""
+    link_id, referral_id = await seed_referral(test_db, "saas-user-1", earnings_paid_count=3)
+
+    response = await client.post("/api/v1/conversions/batch", headers=HEADERS, content=ndjson(
+        *[record("saas-user-1", f"txn_{i}") for i in range(5)]
+    ))
+
+    results, _ = parse(response)
+    assert [r["status"] for r in results] == ["processed"] * 3 + ["cycle_complete"] * 2
+    test_db.expire_all()
+    referral = (await test_db.execute(select(Referral).where(Referral.id == referral_id))).scalar_one()
+    assert referral.earnings_paid_count == 6
+    link = (await test_db.execute(select(ReferralLink).where(ReferralLink.id == link_id))).scalar_one()
+    assert link.conversion_count == 3
+
+
+async def test_batch_commits_per_chunk_with_constant_statements(client: AsyncClient, test_db, query_counter, monkeypatch):
+    """Test that each chunk is one transaction with a fixed number of statements."""
+    monkeypatch.setattr(settings, "conversion_batch_chunk_size", 10)
+    for i in range(25):
+        await seed_referral(test_db, f"saas-user-{i}")
+    del query_counter[:]
+
+    response = await client.post("/api/v1/conversions/batch", headers=HEADERS, content=ndjson(
+        *[record(f"saas-user-{i}", f"txn_{i}") for i in range(25)]
+    ))
+
+    results, closing = parse(response)
+    assert closing["summary"]["processed"] == 25
+    verbs = [s.split()[0].upper() for s in query_counter]
+    # Per chunk: claim, referral read, referral update, link update, earnings insert
+    assert verbs == ["INSERT", "SELECT", "UPDATE", "UPDATE", "INSERT"] * 3
+    assert len((await test_db.execute(select(Earning.id))).all()) == 25
+
+
+async def test_batch_replay_is_all_duplicates(client: AsyncClient, test_db):
+    """Test that replaying a whole batch changes nothing."""
+    for i in range(3):
+        await seed_referral(test_db, f"saas-user-{i}")
+    body = ndjson(*[record(f"saas-user-{i}", f"txn_{i}") for i in range(3)])
+    await client.post("/api/v1/conversions/batch", headers=HEADERS, content=body)
+    clear_idempotency_cache()
+
+    results, closing = parse(await client.post("/api/v1/conversions/batch", headers=HEADERS, content=body))
+
+    assert [r["status"] for r in results] == ["duplicate"] * 3
+    assert closing["summary"]["duplicate"] == 3
+    assert len((await test_db.execute(select(Earning.id))).all()) == 3
+
+
+async def test_batch_single_call_retry_is_duplicate(client: AsyncClient, test_db):
+    """Test that a transaction applied by a batch is replayed by the single-record endpoint."""
+    await seed_referral(test_db, "saas-user-1")
+    await client.post("/api/v1/conversions/batch", headers=HEADERS, content=ndjson(record("saas-user-1", "txn_1")))
+
+    response = await client.post(
+        "/api/v1/conversions", json=record("saas-user-1", "txn_1"), headers={"X-API-KEY": API_KEY}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["Idempotent-Replayed"] == "true"
+
+
+async def test_batch_oversized_line_reports_error(client: AsyncClient, test_db):
+    """Test that a line over the record limit ends the stream with an error after committed chunks."""
+    await seed_referral(test_db, "saas-user-1")
+    body = ndjson(record("saas-user-1", "txn_1")) + b"x" * (70 * 1024)
+
+    results, closing = parse(await client.post("/api/v1/conversions/batch", headers=HEADERS, content=body))
+
+    assert closing["error"] == "Line exceeds the maximum allowed length"
+
+
+async def test_batch_rejects_other_content_types(client: AsyncClient):
+    """Test that only NDJSON bodies are accepted."""
+    response = await client.post(
+        "/api/v1/conversions/batch", headers={"X-API-KEY": API_KEY}, json=[record("saas-user-1", "txn_1")]
+    )
+
+    assert response.status_code == 415
+
+
+async def test_batch_requires_api_key(client: AsyncClient):
+    """Test that the batch endpoint is authenticated like the single-record one."""
+    response = await client.post(
+        "/api/v1/conversions/batch", headers={"Content-Type": "application/x-ndjson"},
+        content=ndjson(record("saas-user-1", "txn_1"))
+    )
+
+    assert response.status_code == 401
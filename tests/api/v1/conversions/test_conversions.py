@@ -0,0 +1,313 @@
+import asyncio
+import uuid
+from datetime import datetime
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core.database import get_db
+from app.core.idempotency import clear_idempotency_cache
+from app.main import app
+from app.models.earning import Earning, EarningStatus
+from app.models.processed_transaction import ProcessedTransaction
+from app.models.referral import Referral, ReferralStatus
+from app.models.referral_link import ReferralLink
+from app.models.user import User
+from app.schemas.conversion import ConversionPayload
+from tests.conftest import TestingSessionLocal
+
+pytestmark = pytest.mark.asyncio
+
+API_KEY = "test-conversion-key"
+HEADERS = {"X-API-KEY": API_KEY}
+
+
+@pytest.fixture(autouse=True)
+def conversion_api_key(monkeypatch):
+    monkeypatch.setattr(settings, "conversion_api_key", API_KEY)
+
+
+@pytest.fixture(autouse=True)
+def idempotency_cache():
+    clear_idempotency_cache()
+    yield
+    clear_idempotency_cache()
+
+
+async def seed_referral(db, referred_user_id="saas-user-1", earnings_paid_count=0):
+    """Creates a referrer with a link and a signed-up referral; returns (link_id, referral_id)."""
+    user = User(
+        full_name="Referrer",
+        email=f"referrer-{uuid.uuid4().hex[:8]}@example.com",
+        password_hash="hash",
+        phone_number=f"+2547{uuid.uuid4().int % 10**8:08d}"
+    )
+    db.add(user)
+    await db.flush()
+    link = ReferralLink(user_id=user.id, unique_code=uuid.uuid4().hex[:8].upper())
+    db.add(link)
+    await db.flush()
+    referral = Referral(
+        referral_link_id=link.id,
+        referred_user_id=referred_user_id,
+        status=ReferralStatus.SIGNED_UP,
+        earnings_paid_count=earnings_paid_count,
+        signed_up_at=datetime.utcnow()
+    )
+    db.add(referral)
+    await db.flush()
+    link_id, referral_id = link.id, referral.id
+    await db.commit()
+    return link_id, referral_id
+
+
+def payload(referred_user_id="saas-user-1", transaction_id=None):
+    return {
+        "referred_user_id": referred_user_id,
+        "payment_amount": "19.99",
+        "transaction_id": transaction_id or f"txn_{uuid.uuid4().hex}",
+    }
+
+
+async def test_conversion_schedules_earning(client: AsyncClient, test_db):
+    """Test that a conversion updates the referral and link and schedules an earning."""
+    link_id, referral_id = await seed_referral(test_db)
+
+    response = await client.post("/api/v1/conversions", json=payload(), headers=HEADERS)
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "message": "Conversion processed successfully."}
+    test_db.expire_all()
+    referral = (await test_db.execute(select(Referral).where(Referral.id == referral_id))).scalar_one()
+    assert referral.status == ReferralStatus.CONVERTED
+    assert referral.earnings_paid_count == 1
+    assert referral.converted_at is not None
+    link = (await test_db.execute(select(ReferralLink).where(ReferralLink.id == link_id))).scalar_one()
+    assert link.conversion_count == 1
+    earning = (await test_db.execute(select(Earning).where(Earning.referral_id == referral_id))).scalar_one()
+    assert earning.user_id == link.user_id
+    assert earning.status == EarningStatus.SCHEDULED
+    assert earning.amount == settings.earning_amount
+
+
+async def test_conversion_is_one_short_transaction(client: AsyncClient, test_db, query_counter):
+    """Test that the happy path issues no reads: the claim, two conditional UPDATEs and an INSERT."""
+    await seed_referral(test_db)
+    del query_counter[:]
+
+    response = await client.post("/api/v1/conversions", json=payload(), headers=HEADERS)
+
+    assert response.status_code == 200
+    assert [s.split()[0].upper() for s in query_counter] == ["INSERT", "UPDATE", "UPDATE", "INSERT"]
+
+
+async def test_conversion_unknown_referred_user(client: AsyncClient, test_db):
+    """Test that a conversion for an unknown referred user returns 404."""
+    response = await client.post("/api/v1/conversions", json=payload("nobody"), headers=HEADERS)
+
+    assert response.status_code == 404
+    assert (await test_db.execute(select(Earning))).first() is None
+
+
+async def test_conversion_after_six_earnings(client: AsyncClient, test_db):
+    """Test that a referral that completed its earning cycle is rejected with 409."""
+    link_id, _ = await seed_referral(test_db, earnings_paid_count=6)
+
+    response = await client.post("/api/v1/conversions", json=payload(), headers=HEADERS)
+
+    assert response.status_code == 409
+    test_db.expire_all()
+    link = (await test_db.execute(select(ReferralLink).where(ReferralLink.id == link_id))).scalar_one()
+    assert link.conversion_count == 0
+    assert (await test_db.execute(select(Earning))).first() is None
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-API-KEY": "wrong"}])
+async def test_conversion_requires_api_key(client: AsyncClient, test_db, headers):
+    """Test that requests without the platform's API key are rejected."""
+    await seed_referral(test_db)
+
+    response = await client.post("/api/v1/conversions", json=payload(), headers=headers)
+
+    assert response.status_code == 401
+    assert (await test_db.execute(select(Earning))).first() is None
+
+
+async def test_conversion_rejected_when_key_not_configured(client: AsyncClient, monkeypatch):
+    """Test that the endpoint fails closed when no API key is configured."""
+    monkeypatch.setattr(settings, "conversion_api_key", None)
+
+    response = await client.post("/api/v1/conversions", json=payload(), headers={"X-API-KEY": ""})
+
+    assert response.status_code == 401
+
+
+async def test_concurrent_deliveries_never_exceed_cycle(client: AsyncClient, test_db):
+    """Test that concurrent deliveries for one referral schedule at most six earnings."""
+    link_id, referral_id = await seed_referral(test_db, earnings_paid_count=3)
+
+    async def session_per_request():
+        async with TestingSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = session_per_request
+    responses = await asyncio.gather(*[
+        client.post("/api/v1/conversions", json=payload(), headers=HEADERS) for _ in range(8)
+    ])
+
+    assert sorted(r.status_code for r in responses) == [200] * 3 + [409] * 5
+    test_db.expire_all()
+    referral = (await test_db.execute(select(Referral).where(Referral.id == referral_id))).scalar_one()
+    assert referral.earnings_paid_count == 6
+    link = (await test_db.execute(select(ReferralLink).where(ReferralLink.id == link_id))).scalar_one()
+    assert link.conversion_count == 3
+    earnings = (await test_db.execute(select(Earning.id).where(Earning.referral_id == referral_id))).all()
+    assert len(earnings) == 3
+
+
+async def count_earnings(db, referral_id):
+    return len((await db.execute(select(Earning.id).where(Earning.referral_id == referral_id))).all())
+
+
+async def test_retry_replays_stored_response_from_cache(client: AsyncClient, test_db, query_counter):
+    """Test that a retried transaction is answered byte-for-byte without touching the database."""
+    _, referral_id = await seed_referral(test_db)
+    body = payload(transaction_id="txn_retry")
+    first = await client.post("/api/v1/conversions", json=body, headers=HEADERS)
+    del query_counter[:]
+
+    retry = await client.post("/api/v1/conversions", json=body, headers=HEADERS)
+
+    assert retry.status_code == first.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert query_counter == []
+    assert await count_earnings(test_db, referral_id) == 1
+
+
+async def test_retry_replays_stored_response_from_database(client: AsyncClient, test_db, query_counter):
+    """Test that a retry on a cold cache (e.g. another replica) costs one read and no writes."""
+    _, referral_id = await seed_referral(test_db)
+    body = payload(transaction_id="txn_cold")
+    first = await client.post("/api/v1/conversions", json=body, headers=HEADERS)
+    clear_idempotency_cache()
+    del query_counter[:]
+
+    retry = await client.post("/api/v1/conversions", json=body, headers=HEADERS)
+
+    assert retry.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    # The claim conflicts (and writes nothing), then the stored response is read once
+    assert [s.split()[0].upper() for s in query_counter] == ["INSERT", "SELECT"]
+    assert await count_earnings(test_db, referral_id) == 1
+    record = (await test_db.execute(select(ProcessedTransaction))).scalar_one()
+    assert record.transaction_id == "txn_cold"
+    assert record.response_body == first.content
+
+
+async def test_reused_transaction_id_with_different_payload(client: AsyncClient, test_db):
+    """Test that a transaction_id reused for a different conversion is rejected, not replayed."""
+    _, referral_id = await seed_referral(test_db)
+    await seed_referral(test_db, referred_user_id="saas-user-2")
+    await client.post("/api/v1/conversions", json=payload(transaction_id="txn_reused"), headers=HEADERS)
+
+    response = await client.post(
+        "/api/v1/conversions", json=payload("saas-user-2", transaction_id="txn_reused"), headers=HEADERS
+    )
+
+    assert response.status_code == 409
+    assert len((await test_db.execute(select(Earning.id))).all()) == 1
+
+
+async def test_failed_conversion_is_not_recorded(client: AsyncClient, test_db):
+    """Test that a rejected conversion leaves no idempotency record, so a later retry can succeed."""
+    body = payload(transaction_id="txn_early")
+    assert (await client.post("/api/v1/conversions", json=body, headers=HEADERS)).status_code == 404
+    assert (await test_db.execute(select(ProcessedTransaction))).first() is None
+
+    await seed_referral(test_db)
+    response = await client.post("/api/v1/conversions", json=body, headers=HEADERS)
+
+    assert response.status_code == 200
+
+
+async def test_concurrent_duplicate_deliveries_pay_once(client: AsyncClient, test_db):
+    """Test that simultaneous deliveries of one transaction schedule a single earning."""
+    _, referral_id = await seed_referral(test_db)
+
+    async def session_per_request():
+        async with TestingSessionLocal() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = session_per_request
+    body = payload(transaction_id="txn_storm")
+    responses = await asyncio.gather(*[
+        client.post("/api/v1/conversions", json=body, headers=HEADERS) for _ in range(6)
+    ])
+
+    assert [r.status_code for r in responses] == [200] * 6
+    assert len({r.content for r in responses}) == 1
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 5
+    assert await count_earnings(test_db, referral_id) == 1
+
+
+async def test_group_committed_conversions(client: AsyncClient, test_db, monkeypatch):
+    """Test that queued conversions are written together and answered like single ones."""
+    from app.services import tracking_service
+
+    link_id, referral_id = await seed_referral(test_db, earnings_paid_count=4)
+    queue = tracking_service.GroupCommitQueue(
+        "conversions", tracking_service.apply_queued_conversions, max_batch_size=10, max_wait=0.05, max_pending=10
+    )
+    monkeypatch.setattr(tracking_service, "conversion_queue", queue)
+    queue.start(TestingSessionLocal)
+    repeated = payload()
+    try:
+        responses = await asyncio.gather(
+            client.post("/api/v1/conversions", json=repeated, headers=HEADERS),
+            client.post("/api/v1/conversions", json=repeated, headers=HEADERS),
+            *[client.post("/api/v1/conversions", json=payload(), headers=HEADERS) for _ in range(2)],
+            client.post("/api/v1/conversions", json=payload("never-referred"), headers=HEADERS),
+        )
+    finally:
+        await queue.stop()
+
+    assert [r.status_code for r in responses] == [200, 200, 200, 409, 404]
+    assert responses[1].headers.get("Idempotent-Replayed") == "true"
+    assert responses[0].json() == responses[1].json()
+    test_db.expire_all()
+    assert await count_earnings(test_db, referral_id) == 2
+
+
+async def test_full_conversion_queue_returns_503(client: AsyncClient, test_db, monkeypatch):
+    """Test that a full write queue answers 503 with Retry-After."""
+    from app.services import tracking_service
+
+    await seed_referral(test_db)
+    release = asyncio.Event()
+
+    async def slow_apply(db, payloads):
+        await release.wait()
+        return await tracking_service.apply_queued_conversions(db, payloads)
+
+    queue = tracking_service.GroupCommitQueue("conversions", slow_apply, max_batch_size=1, max_wait=0, max_pending=1)
+    monkeypatch.setattr(tracking_service, "conversion_queue", queue)
+    queue.start(TestingSessionLocal)
+    try:
+        writing = asyncio.ensure_future(queue.submit(ConversionPayload(**payload())))
+        queued = asyncio.ensure_future(queue.submit(ConversionPayload(**payload())))
+        await asyncio.sleep(0.01)
+
+        response = await client.post("/api/v1/conversions", json=payload(), headers=HEADERS)
+        release.set()
+        await asyncio.gather(writing, queued)
+    finally:
+        release.set()
+        await queue.stop()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
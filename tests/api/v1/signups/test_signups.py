@@ -0,0 +1,107 @@
+import uuid
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core.click_buffer import click_buffer
+from app.core.referred_user_filter import referred_user_filter
+from app.models.referral import Referral, ReferralStatus
+from app.services.link_service import clear_link_cache
+from tests.api.test_redirect import seed_link
+from tests.api.v1.conversions.test_conversions import API_KEY
+
+pytestmark = pytest.mark.asyncio
+
+HEADERS = {"X-API-KEY": API_KEY}
+
+
+@pytest.fixture(autouse=True)
+def tracking_state(monkeypatch):
+    monkeypatch.setattr(settings, "conversion_api_key", API_KEY)
+    click_buffer.reset()
+    clear_link_cache()
+    referred_user_filter.reset()
+    yield
+    click_buffer.reset()
+    clear_link_cache()
+    referred_user_filter.reset()
+
+
+async def click(client, code):
+    response = await client.get(f"/r/{code}")
+    return response.headers["location"].split("referral_id=")[1]
+
+
+async def referral(db, referral_id):
+    db.expire_all()
+    return (await db.execute(select(Referral).where(Referral.id == uuid.UUID(referral_id)))).scalar_one()
+
+
+async def test_signup_after_click_flush(client: AsyncClient, test_db):
+    """Test that a signup attaches the Main SaaS user to the click's referral."""
+    await seed_link(test_db, "ABCD2345")
+    referral_id = await click(client, "ABCD2345")
+    await click_buffer.flush(test_db)
+    await referred_user_filter.build(test_db)
+
+    response = await client.post("/api/v1/signups", headers=HEADERS, json={
+        "referral_id": referral_id, "referral_code": "ABCD2345", "referred_user_id": "saas-user-1"
+    })
+
+    assert response.status_code == 200
+    row = await referral(test_db, referral_id)
+    assert row.status == ReferralStatus.SIGNED_UP
+    assert row.referred_user_id == "saas-user-1"
+    assert row.signed_up_at is not None
+    assert referred_user_filter.might_contain("saas-user-1")
+
+
+async def test_signup_before_click_flush(client: AsyncClient, test_db):
+    """Test that a signup reported before its click is flushed creates the referral once."""
+    await seed_link(test_db, "ABCD2345")
+    referral_id = await click(client, "ABCD2345")
+
+    response = await client.post("/api/v1/signups", headers=HEADERS, json={
+        "referral_id": referral_id, "referral_code": "ABCD2345", "referred_user_id": "saas-user-1"
+    })
+    await click_buffer.flush(test_db)
+
+    assert response.status_code == 200
+    row = await referral(test_db, referral_id)
+    assert row.status == ReferralStatus.SIGNED_UP
+    assert len((await test_db.execute(select(Referral.id))).all()) == 1
+
+
+async def test_signup_retry_and_reuse(client: AsyncClient, test_db):
+    """Test that a repeated signup succeeds and a different user on the same referral conflicts."""
+    await seed_link(test_db, "ABCD2345")
+    referral_id = await click(client, "ABCD2345")
+    body = {"referral_id": referral_id, "referral_code": "ABCD2345", "referred_user_id": "saas-user-1"}
+    await client.post("/api/v1/signups", headers=HEADERS, json=body)
+
+    retry = await client.post("/api/v1/signups", headers=HEADERS, json=body)
+    reuse = await client.post("/api/v1/signups", headers=HEADERS, json=dict(body, referred_user_id="saas-user-2"))
+
+    assert retry.status_code == 200
+    assert reuse.status_code == 409
+    assert (await referral(test_db, referral_id)).referred_user_id == "saas-user-1"
+
+
+async def test_signup_unknown_code(client: AsyncClient, test_db):
+    """Test that a signup for an unknown referral code returns 404."""
+    response = await client.post("/api/v1/signups", headers=HEADERS, json={
+        "referral_id": str(uuid.uuid4()), "referral_code": "NOSUCHCD", "referred_user_id": "saas-user-1"
+    })
+
+    assert response.status_code == 404
+
+
+async def test_signup_requires_api_key(client: AsyncClient):
+    """Test that signups are authenticated with the platform's API key."""
+    response = await client.post("/api/v1/signups", json={
+        "referral_id": str(uuid.uuid4()), "referral_code": "ABCD2345", "referred_user_id": "saas-user-1"
+    })
+
+    assert response.status_code == 401
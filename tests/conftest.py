@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 from httpx import AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
@@ -90,6 +91,18 @@ async def async_session(setup_database):
         # Roll back any changes made during the test
         await session.rollback()
 
+@pytest.fixture
+def query_counter():
+    """Records every SQL statement sent to the test database during a test."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(test_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
 @pytest.fixture
 async def client(test_db):
     """Create a test client with the test database."""
@@ -0,0 +1,25 @@
+from app.core.bloom import BloomFilter
+
+
+def test_no_false_negatives():
+    """Test that every added key is reported as possibly present."""
+    bloom = BloomFilter(size_bytes=4096, expected_items=2000)
+    keys = [f"user-{i}" for i in range(2000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    assert bloom.items == 2000
+
+
+def test_false_positive_rate_matches_estimate():
+    """Test that the measured false-positive rate is close to the estimate."""
+    bloom = BloomFilter(size_bytes=4096, expected_items=2000)
+    for i in range(2000):
+        bloom.add(f"user-{i}")
+
+    measured = sum(f"stranger-{i}" in bloom for i in range(20000)) / 20000
+
+    estimate = bloom.estimated_false_positive_rate()
+    assert 0 < estimate < 0.05
+    assert abs(measured - estimate) < 0.01
@@ -0,0 +1,81 @@
+import pytest
+
+from app.core import circuit_breaker
+from app.core.circuit_breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+from app.exceptions import CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock, **kwargs):
+    return CircuitBreaker("test", failure_threshold=3, reset_timeout=10, clock=clock, **kwargs)
+
+
+def test_opens_after_consecutive_failures():
+    """Test that the breaker opens at the threshold and then rejects calls."""
+    breaker = make_breaker(FakeClock())
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "10"
+    assert circuit_breaker.breaker_state.value(name="test") == 2
+
+
+def test_success_resets_failure_count():
+    """Test that only consecutive failures count towards the threshold."""
+    breaker = make_breaker(FakeClock())
+    for _ in range(5):
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_on_success():
+    """Test that one probe is let through after the reset timeout and closes the breaker."""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time
+
+    breaker.record_success()
+
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_half_open_probe_failure_reopens():
+    """Test that a failed probe re-opens the breaker for another reset period."""
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 10
+    breaker.before_call()
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == pytest.approx(10)
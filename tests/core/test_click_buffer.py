@@ -0,0 +1,70 @@
+import asyncio
+import uuid
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.click_buffer import ClickBuffer
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_failed_flush_keeps_clicks_for_the_next_one():
+    """Test that clicks from a failed flush are put back in front of newer clicks."""
+    buffer = ClickBuffer(flush_interval=60, max_pending=100)
+    link_id = uuid.uuid4()
+    first = buffer.record(link_id)
+    db = AsyncMock()
+    db.execute.side_effect = RuntimeError("database unavailable")
+
+    with pytest.raises(RuntimeError):
+        await buffer.flush(db)
+    second = buffer.record(link_id)
+
+    db.rollback.assert_awaited_once()
+    assert buffer.pending == 2
+    assert [row["id"] for row in buffer._referrals] == [first, second]
+    assert buffer._counts[link_id] == 2
+
+
+async def test_stop_flushes_remaining_clicks():
+    """Test that stopping the buffer writes whatever is still pending."""
+    buffer = ClickBuffer(flush_interval=60, max_pending=100)
+    db = AsyncMock()
+    buffer.start(lambda: _Session(db))
+    buffer.record(uuid.uuid4())
+
+    await buffer.stop()
+
+    assert buffer.pending == 0
+    assert db.execute.await_count == 2
+    db.commit.assert_awaited_once()
+
+
+async def test_reaching_max_pending_wakes_the_flusher():
+    """Test that a full buffer is flushed without waiting for the interval."""
+    buffer = ClickBuffer(flush_interval=60, max_pending=3)
+    db = AsyncMock()
+    buffer.start(lambda: _Session(db))
+    try:
+        for _ in range(3):
+            buffer.record(uuid.uuid4())
+        for _ in range(10):
+            if not buffer.pending:
+                break
+            await asyncio.sleep(0)
+        assert buffer.pending == 0
+        db.commit.assert_awaited_once()
+    finally:
+        await buffer.stop()
+
+
+class _Session:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self.db
+
+    async def __aexit__(self, *exc):
+        return False
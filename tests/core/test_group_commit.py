@@ -0,0 +1,110 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.group_commit import GroupCommitQueue
+from app.exceptions import ServiceUnavailableError
+
+pytestmark = pytest.mark.asyncio
+
+
+class _Session:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self.db
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def recording_queue(max_batch_size=10, max_wait=0.01, max_pending=100):
+    batches = []
+
+    async def apply(db, items):
+        batches.append(list(items))
+        return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+    queue = GroupCommitQueue("test", apply, max_batch_size=max_batch_size, max_wait=max_wait, max_pending=max_pending)
+    queue.start(lambda: _Session(AsyncMock()))
+    return queue, batches
+
+
+async def test_concurrent_items_share_one_batch():
+    """Test that items submitted together are written in one batch and get their own results."""
+    queue, batches = recording_queue()
+    try:
+        results = await asyncio.gather(*[queue.submit(i) for i in range(5)])
+    finally:
+        await queue.stop()
+
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+async def test_batches_are_capped_at_max_batch_size():
+    """Test that a burst larger than the batch size is split into several batches."""
+    queue, batches = recording_queue(max_batch_size=3)
+    try:
+        await asyncio.gather(*[queue.submit(i) for i in range(7)])
+    finally:
+        await queue.stop()
+
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+
+
+async def test_per_item_errors_fail_only_their_caller():
+    """Test that an exception returned for one item is raised to that caller only."""
+    queue, _ = recording_queue()
+    try:
+        results = await asyncio.gather(queue.submit(1), queue.submit(-1), return_exceptions=True)
+    finally:
+        await queue.stop()
+
+    assert results[0] == 2
+    assert isinstance(results[1], ValueError)
+
+
+async def test_failed_batch_fails_every_caller():
+    """Test that an error raised while writing reaches every caller in the batch."""
+    async def apply(db, items):
+        raise RuntimeError("database unavailable")
+
+    queue = GroupCommitQueue("test", apply, max_batch_size=10, max_wait=0.01, max_pending=100)
+    queue.start(lambda: _Session(AsyncMock()))
+    try:
+        results = await asyncio.gather(queue.submit(1), queue.submit(2), return_exceptions=True)
+    finally:
+        await queue.stop()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_full_queue_rejects_with_503():
+    """Test that submissions beyond max_pending are rejected instead of queued."""
+    queue, _ = recording_queue(max_pending=2)
+    try:
+        accepted = [asyncio.ensure_future(queue.submit(i)) for i in range(2)]
+        await asyncio.sleep(0) # Queued, not yet taken by the writer
+        with pytest.raises(ServiceUnavailableError) as error:
+            await queue.submit(3)
+        assert error.value.headers["Retry-After"] == "1"
+        assert await asyncio.gather(*accepted) == [0, 2]
+    finally:
+        await queue.stop()
+
+
+async def test_stop_writes_queued_items():
+    """Test that items queued before stop() are committed, and later ones rejected."""
+    queue, batches = recording_queue(max_wait=60)
+    pending = asyncio.ensure_future(queue.submit(21))
+    await asyncio.sleep(0)
+
+    await queue.stop()
+
+    assert await pending == 42
+    assert batches == [[21]]
+    with pytest.raises(ServiceUnavailableError):
+        await queue.submit(1)
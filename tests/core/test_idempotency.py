@@ -0,0 +1,39 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.future import select
+
+from app.core import idempotency
+from app.core.idempotency import StoredResponse, prune_processed_transactions
+from app.models.processed_transaction import ProcessedTransaction
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_prunes_only_records_past_retention(test_db):
+    """Test that pruning deletes old idempotency records chunk by chunk and keeps recent ones."""
+    now = datetime.utcnow()
+    for i in range(5):
+        test_db.add(ProcessedTransaction(
+            transaction_id=f"old-{i}", request_fingerprint="f", status_code=200,
+            response_body=b"{}", created_at=now - timedelta(days=40, minutes=i)
+        ))
+    test_db.add(ProcessedTransaction(
+        transaction_id="recent", request_fingerprint="f", status_code=200, response_body=b"{}", created_at=now
+    ))
+    await test_db.commit()
+
+    pruned = await prune_processed_transactions(test_db, retention=timedelta(days=30), chunk_size=2)
+
+    assert pruned == 5
+    remaining = (await test_db.execute(select(ProcessedTransaction.transaction_id))).scalars().all()
+    assert remaining == ["recent"]
+
+
+async def test_replay_requires_matching_fingerprint():
+    """Test that a stored response is only replayed for the request that produced it."""
+    stored = StoredResponse(200, b'{"status":"success"}', idempotency.request_fingerprint("txn", "user", "10.00"))
+
+    replayed = idempotency.replay(stored, idempotency.request_fingerprint("txn", "user", "10.00"), "cache")
+
+    assert replayed.replayed and replayed.body == stored.body
+    assert idempotency.replay(stored, idempotency.request_fingerprint("txn", "other", "10.00"), "cache") is None
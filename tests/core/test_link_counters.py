@@ -0,0 +1,110 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core.click_buffer import ClickBuffer
+from app.core.idempotency import StoredResponse, claim_statement, clear_idempotency_cache
+from app.core.link_counters import add_to_links, compact_link_counters, link_totals
+from app.models.referral_link import ReferralLink
+from app.models.referral_link_counter_shard import ReferralLinkCounterShard
+from app.schemas.conversion import ConversionPayload
+from app.services.tracking_service import TrackingService, build_conversion_statement
+from tests.api.v1.conversions.test_conversions import seed_referral
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    monkeypatch.setattr(settings, "link_counter_shards", 4)
+    clear_idempotency_cache()
+    yield
+    clear_idempotency_cache()
+
+
+async def columns(db, link_id):
+    db.expire_all()
+    link = (await db.execute(select(ReferralLink).where(ReferralLink.id == link_id))).scalar_one()
+    return {"click_count": link.click_count, "conversion_count": link.conversion_count}
+
+
+async def test_sharded_increments_leave_link_row_alone(test_db, sharded):
+    """Test that sharded increments land in shard rows and totals still add up exactly."""
+    link_id, _ = await seed_referral(test_db)
+
+    for _ in range(10):
+        await add_to_links(test_db, "click_count", {link_id: 2}, datetime.utcnow())
+    await add_to_links(test_db, "conversion_count", {link_id: 1}, datetime.utcnow())
+    await test_db.commit()
+
+    assert await columns(test_db, link_id) == {"click_count": 0, "conversion_count": 0}
+    shards = (await test_db.execute(select(ReferralLinkCounterShard.shard))).scalars().all()
+    assert 1 <= len(shards) <= settings.link_counter_shards
+    assert await link_totals(test_db, [link_id]) == {link_id: {"click_count": 20, "conversion_count": 1}}
+
+
+async def test_conversions_and_clicks_use_shards(test_db, sharded):
+    """Test that conversions and click flushes count on shards when sharding is enabled."""
+    link_id, _ = await seed_referral(test_db)
+    for i in range(3):
+        await TrackingService(test_db).process_conversion(ConversionPayload(
+            referred_user_id="saas-user-1", payment_amount="19.99", transaction_id=f"txn_{i}"
+        ))
+    statuses = await TrackingService(test_db).process_conversions_batch([ConversionPayload(
+        referred_user_id="saas-user-1", payment_amount="19.99", transaction_id="txn_batch"
+    )])
+    buffer = ClickBuffer(flush_interval=60, max_pending=100)
+    for _ in range(5):
+        buffer.record(link_id)
+    await buffer.flush(test_db)
+
+    assert statuses == ["processed"]
+    assert await columns(test_db, link_id) == {"click_count": 0, "conversion_count": 0}
+    assert await link_totals(test_db, [link_id]) == {link_id: {"click_count": 5, "conversion_count": 4}}
+
+
+async def test_compaction_folds_shards_into_columns(test_db, sharded):
+    """Test that compaction moves shard totals into the link columns exactly once."""
+    link_ids = [(await seed_referral(test_db, f"saas-user-{i}"))[0] for i in range(3)]
+    for i, link_id in enumerate(link_ids):
+        for _ in range(i + 1):
+            await add_to_links(test_db, "click_count", {link_id: 10}, datetime.utcnow())
+    await test_db.commit()
+    before = await link_totals(test_db, link_ids)
+
+    compacted = await compact_link_counters(test_db, chunk_size=2)
+
+    assert compacted == 3
+    assert (await test_db.execute(select(ReferralLinkCounterShard))).first() is None
+    assert await link_totals(test_db, link_ids) == before
+    assert [(await columns(test_db, link_id))["click_count"] for link_id in link_ids] == [10, 20, 30]
+    assert await compact_link_counters(test_db) == 0
+
+
+async def test_unsharded_increments_update_columns(test_db):
+    """Test that with sharding disabled increments update the link row directly."""
+    link_id, _ = await seed_referral(test_db)
+
+    await add_to_links(test_db, "click_count", {link_id: 3}, datetime.utcnow())
+    await test_db.commit()
+
+    assert await columns(test_db, link_id) == {"click_count": 3, "conversion_count": 0}
+    assert (await test_db.execute(select(ReferralLinkCounterShard))).first() is None
+
+
+def test_sharded_conversion_statement_does_not_update_link_row(sharded):
+    """Test that the sharded PostgreSQL conversion upserts a shard instead of updating the link."""
+    now = datetime.utcnow()
+    claim = claim_statement("postgresql", "txn_1", StoredResponse(200, b"{}", "fingerprint"), now)
+    statement = build_conversion_statement("saas-user-1", uuid.uuid4(), now, claim)
+
+    sql = " ".join(str(statement.compile(dialect=postgresql.asyncpg.dialect())).split())
+
+    assert "counted_link AS (INSERT INTO" in sql
+    assert "referral_link_counter_shards (link_id, shard, click_count, conversion_count)" in sql
+    assert "ON CONFLICT (link_id, shard) DO UPDATE" in sql
+    assert "referral_links SET" not in sql
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import pytest
+
+from app.core import metrics
+from app.core.executor import BoundedExecutor
+from app.core.security import hash_password_async, verify_password_async, verify_password
+from app.exceptions import ServiceUnavailableError
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_hash_and_verify_password_async():
+    """Test that the async variants produce and verify bcrypt hashes."""
+    hashed = await hash_password_async("password123")
+
+    assert hashed != "password123"
+    assert verify_password("password123", hashed)
+    assert await verify_password_async("password123", hashed) is True
+    assert await verify_password_async("wrong-password", hashed) is False
+
+
+async def test_hash_latency_is_recorded():
+    """Test that hashing records a latency observation for the pool."""
+    latency = metrics.registry.get("worker_pool_task_seconds")
+    before = latency.count(pool="password_hash", op="hash")
+
+    await hash_password_async("password123")
+
+    assert latency.count(pool="password_hash", op="hash") == before + 1
+
+
+async def test_saturated_pool_rejects_with_503():
+    """Test that work beyond the worker and queue capacity is rejected."""
+    pool = BoundedExecutor(name="test_saturation", max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    try:
+        running = asyncio.ensure_future(pool.run(release.wait))
+        queued = asyncio.ensure_future(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+
+        assert pool.in_flight == 1
+        assert pool.queue_depth == 1
+        assert metrics.registry.get("worker_pool_queue_depth").value(pool="test_saturation") == 1
+
+        with pytest.raises(ServiceUnavailableError) as exc_info:
+            await pool.run(release.wait)
+        assert exc_info.value.status_code == 503
+        assert metrics.registry.get("worker_pool_rejected_total").value(pool="test_saturation", op="task") == 1
+
+        release.set()
+        assert await running is True
+        assert await queued is True
+        assert pool.queue_depth == 0
+    finally:
+        release.set()
+        pool.shutdown()
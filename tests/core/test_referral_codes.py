@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import select
+
+from app.core.referral_codes import (
+    CodePermutation,
+    ReferralCodeAllocator,
+    CODE_LENGTH,
+    CODE_SPACE_SIZE,
+    SEQUENCE_NAME,
+)
+from app.core.security import REFERRAL_CODE_ALPHABET
+from app.models.referral_code_sequence import ReferralCodeSequence
+from tests.conftest import test_engine
+
+
+def test_two_million_sequential_codes_are_distinct():
+    """Test that consecutive sequence values never produce the same code."""
+    permutation = CodePermutation("test-key")
+    count = 2_000_000
+
+    codes = {permutation.encode(value) for value in range(count)}
+
+    assert len(codes) == count
+
+
+def test_codes_use_the_ambiguity_free_alphabet():
+    """Test that codes are 8 characters long and avoid look-alike characters."""
+    permutation = CodePermutation("test-key")
+
+    for value in (0, 1, 31, 32, 1023, 123456789, CODE_SPACE_SIZE - 1):
+        code = permutation.encode(value)
+        assert len(code) == CODE_LENGTH
+        assert set(code) <= set(REFERRAL_CODE_ALPHABET)
+        assert not set(code) & set("O0I1")
+
+
+def test_encoding_is_invertible():
+    """Test that every code maps back to its sequence value, i.e. encoding is a bijection."""
+    permutation = CodePermutation("test-key")
+
+    for value in list(range(0, 5000)) + [CODE_SPACE_SIZE - 1, 2**39, 987654321012]:
+        assert permutation.decode(permutation.encode(value)) == value
+
+
+def test_codes_do_not_look_sequential():
+    """Test that neighbouring sequence values produce unrelated codes."""
+    permutation = CodePermutation("test-key")
+
+    first, second = permutation.encode(1000), permutation.encode(1001)
+
+    assert sum(a == b for a, b in zip(first, second)) < CODE_LENGTH - 2
+
+
+def test_sequence_outside_code_space_is_rejected():
+    with pytest.raises(ValueError):
+        CodePermutation("test-key").encode(CODE_SPACE_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_allocator_reserves_blocks(test_db):
+    """Test that the allocator needs one reservation per block and never repeats a code."""
+    allocator = ReferralCodeAllocator(key="test-key", block_size=10)
+
+    codes = [await allocator.allocate(test_engine) for _ in range(25)]
+
+    assert len(set(codes)) == 25
+    sequence = (await test_db.execute(
+        select(ReferralCodeSequence).where(ReferralCodeSequence.name == SEQUENCE_NAME)
+    )).scalar_one()
+    assert sequence.next_value == 30  # three blocks of ten
+
+
+@pytest.mark.asyncio
+async def test_allocate_batch_reserves_exact_range(test_db):
+    """Test that batch mode reserves exactly the requested number of codes."""
+    allocator = ReferralCodeAllocator(key="test-key", block_size=10)
+
+    batch = await allocator.allocate_batch(test_engine, 500)
+    single = await allocator.allocate(test_engine)
+
+    assert len(set(batch)) == 500
+    assert single not in batch
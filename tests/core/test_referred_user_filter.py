@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.idempotency import clear_idempotency_cache
+from app.core.referred_user_filter import ReferredUserFilter, filter_false_positives, referred_user_filter
+from app.exceptions import NotFoundError
+from app.models.referral import Referral, ReferralStatus
+from app.schemas.conversion import ConversionPayload
+from app.services.tracking_service import TrackingService
+from tests.api.v1.conversions.test_conversions import seed_referral
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def reset_filter():
+    referred_user_filter.reset()
+    clear_idempotency_cache()
+    yield
+    referred_user_filter.reset()
+    clear_idempotency_cache()
+
+
+def conversion(referred_user_id):
+    return ConversionPayload(referred_user_id=referred_user_id, payment_amount="19.99", transaction_id=f"txn-{referred_user_id}")
+
+
+async def test_build_and_refresh_from_database(test_db):
+    """Test that the filter is built from referrals and picks up later signups."""
+    await seed_referral(test_db, "saas-user-1")
+    user_filter = ReferredUserFilter(size_bytes=1024, expected_items=100, refresh_interval=60)
+
+    assert await user_filter.build(test_db) == 1
+    assert user_filter.might_contain("saas-user-1")
+    assert not user_filter.might_contain("saas-user-2")
+
+    link_id, _ = await seed_referral(test_db, "saas-user-2")
+    assert await user_filter.refresh(test_db) >= 1
+    assert user_filter.might_contain("saas-user-2")
+
+
+async def test_unknown_user_rejected_without_queries(test_db, query_counter):
+    """Test that conversions for never-referred users cost no database round trip."""
+    await seed_referral(test_db, "saas-user-1")
+    await referred_user_filter.build(test_db)
+    del query_counter[:]
+
+    with pytest.raises(NotFoundError):
+        await TrackingService(test_db).process_conversion(conversion("never-referred"))
+    statuses = await TrackingService(test_db).process_conversions_batch([conversion("also-never-referred")])
+
+    assert statuses == ["not_found"]
+    assert query_counter == []
+
+
+async def test_known_user_still_converts(test_db):
+    """Test that referred users pass the filter and convert normally."""
+    await seed_referral(test_db, "saas-user-1")
+    await referred_user_filter.build(test_db)
+
+    await TrackingService(test_db).process_conversion(conversion("saas-user-1"))
+
+
+async def test_false_positive_is_counted(test_db):
+    """Test that a filter match with no referral behind it is recorded as a false positive."""
+    await referred_user_filter.build(test_db)
+    referred_user_filter.add("ghost-user") # Possible match with no referral in the database
+    before = filter_false_positives.value()
+
+    with pytest.raises(NotFoundError):
+        await TrackingService(test_db).process_conversion(conversion("ghost-user"))
+
+    assert filter_false_positives.value() == before + 1
+
+
+async def test_lookups_fail_open_until_built():
+    """Test that every id is a possible match before the first build."""
+    assert not referred_user_filter.ready
+    assert referred_user_filter.might_contain("anyone")
@@ -0,0 +1,59 @@
+import pytest
+
+from app.core.streaming import batched, iter_csv_column, iter_json_array, iter_lines
+from app.exceptions import ValidationError
+
+
+async def chunks_of(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+async def test_iter_lines_across_chunk_boundaries():
+    """Test that lines split across chunks are reassembled."""
+    lines = await collect(iter_lines(chunks_of(b"first\r\nsecond\nthird", 3)))
+    assert lines == ["first", "second", "third"]
+
+
+async def test_iter_lines_rejects_overlong_line():
+    """Test that a line longer than the record limit is refused instead of buffered."""
+    with pytest.raises(ValidationError):
+        await collect(iter_lines(chunks_of(b"x" * 100, 10), max_record_bytes=50))
+
+
+async def test_iter_csv_column_with_and_without_header():
+    """Test that the named column is selected when a header is present."""
+    with_header = b"name,Email\nOne,one@example.com\nTwo,two@example.com\n"
+    without_header = b"one@example.com\ntwo@example.com,extra\n"
+
+    assert await collect(iter_csv_column(chunks_of(with_header, 4), "email")) == ["one@example.com", "two@example.com"]
+    assert await collect(iter_csv_column(chunks_of(without_header, 4), "email")) == ["one@example.com", "two@example.com"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1024])
+async def test_iter_json_array_incremental(chunk_size):
+    """Test that array elements are yielded regardless of how the body is chunked."""
+    body = ' [ "a@example.com", {"email": "ü@example.com"}, 12, null ] '.encode("utf-8")
+
+    items = await collect(iter_json_array(chunks_of(body, chunk_size)))
+
+    assert items == ["a@example.com", {"email": "ü@example.com"}, 12, None]
+
+
+@pytest.mark.parametrize("body", [b'{"email": "a"}', b'["a", "b"', b'["a"] trailing', b'["a", nope]'])
+async def test_iter_json_array_rejects_malformed(body):
+    """Test that anything other than one complete JSON array is rejected."""
+    with pytest.raises(ValidationError):
+        await collect(iter_json_array(chunks_of(body, 3)))
+
+
+async def test_batched():
+    async def numbers():
+        for i in range(5):
+            yield i
+
+    assert await collect(batched(numbers(), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,86 @@
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+from app.core import security
+from app.core.security import create_access_token, verify_token, revoke_token
+from app.core.token_cache import TokenCache
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    """Start every test with an empty cache."""
+    security.token_cache.clear()
+    yield
+    security.token_cache.clear()
+
+
+def test_verify_token_served_from_cache():
+    """Test that a second verification of the same token skips jwt.decode."""
+    token = create_access_token(data={"sub": "user-1"})
+
+    first = verify_token(token)
+    with patch("app.core.security.jwt.decode") as mock_decode:
+        second = verify_token(token)
+        mock_decode.assert_not_called()
+
+    assert first == second
+    assert second["sub"] == "user-1"
+    assert security.token_cache.hits == 1
+    assert security.token_cache.misses == 1
+
+
+def test_invalid_token_is_not_cached():
+    """Test that a token with a bad signature is rejected and never cached."""
+    token = create_access_token(data={"sub": "user-1"}) + "tampered"
+
+    assert verify_token(token) is None
+    assert len(security.token_cache) == 0
+
+
+def test_expired_entry_is_never_served():
+    """Test that a cached payload is dropped once the token's exp passes."""
+    cache = TokenCache(max_size=10)
+    cache.set("token", {"sub": "user-1", "exp": time.time() + 60})
+    assert cache.get("token") == {"sub": "user-1", "exp": pytest.approx(time.time() + 60, abs=5)}
+
+    with patch("app.core.token_cache.time.time", return_value=time.time() + 61):
+        assert cache.get("token") is None
+    assert len(cache) == 0
+
+
+def test_expired_token_is_rejected():
+    """Test that an already expired token fails verification."""
+    token = create_access_token(data={"sub": "user-1"}, expires_delta=timedelta(seconds=-1))
+
+    assert verify_token(token) is None
+    assert len(security.token_cache) == 0
+
+
+def test_revoked_token_is_not_served_from_cache():
+    """Test that revoking a cached token makes verification fail immediately."""
+    token = create_access_token(data={"sub": "user-1"})
+    assert verify_token(token) is not None
+
+    revoke_token(token)
+
+    assert verify_token(token) is None
+    assert len(security.token_cache) == 0
+
+
+def test_lru_eviction_respects_size_cap():
+    """Test that the least recently used entry is evicted at the size cap."""
+    cache = TokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.set("a", {"sub": "a", "exp": exp})
+    cache.set("b", {"sub": "b", "exp": exp})
+    assert cache.get("a") is not None  # "b" is now least recently used
+
+    cache.set("c", {"sub": "c", "exp": exp})
+
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
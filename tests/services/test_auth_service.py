@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -10,22 +11,22 @@ from app.models.invitation import Invitation, InvitationStatus
 from app.models.admin_user import AdminUser
 from app.core.security import create_access_token
 from app.dependencies import get_current_admin_user
-from app.services.email_service import EmailService
+from app.models.email_outbox import EmailOutbox, EmailOutboxStatus
 
-# Mock the email_service instance globally for integration tests
-email_service_mock = AsyncMock(spec=EmailService)
+# Mock the Resend HTTP client so any network call made by a request is recorded
+email_client_mock = AsyncMock(spec=httpx.AsyncClient)
 
-# Temporarily patch the email_service instance used within AuthService
-original_email_service_path = 'app.services.auth_service.email_service'
+# Temporarily patch the HTTP client of the shared email_service instance
+original_email_client_path = 'app.services.email_service.email_service.client'
 pytestmark = pytest.mark.asyncio
 
 @pytest.fixture(autouse=True)
-def mock_email_service_in_auth_service():
-    """Fixture to patch the email_service instance within the AuthService module."""
-    with patch(original_email_service_path, email_service_mock):
+def mock_email_client():
+    """Fixture to patch the email_service HTTP client."""
+    with patch(original_email_client_path, email_client_mock):
         yield
     # Reset the mock after each test
-    email_service_mock.reset_mock()
+    email_client_mock.reset_mock()
 
 @pytest.fixture(autouse=True)
 def override_admin_dependency(client, async_session):
@@ -78,8 +79,13 @@ async def test_create_invitation_success(client: AsyncClient, async_session: Asy
     assert invitation.token is not None
     assert invitation.expires_at > datetime.utcnow() - timedelta(minutes=1)
 
-    # Verify email service was called
-    email_service_mock.send_invitation_email.assert_called_once_with(email, invitation.token)
+    # Verify the email was queued in the outbox rather than sent inline
+    email_client_mock.post.assert_not_called()
+    outbox = (await async_session.execute(select(EmailOutbox))).scalars().all()
+    assert len(outbox) == 1
+    assert outbox[0].recipient == email
+    assert outbox[0].status == EmailOutboxStatus.PENDING
+    assert invitation.token in outbox[0].html
 
 
 async def test_create_invitation_conflict(client: AsyncClient, async_session: AsyncSession):
@@ -112,5 +118,7 @@ async def test_create_invitation_conflict(client: AsyncClient, async_session: As
     # Should still only have the one existing invitation
     assert len(invitations_in_db.scalars().all()) == 1
 
-    # Verify email service was not called
-    email_service_mock.send_invitation_email.assert_not_called()
\ No newline at end of file
+    # Verify no email was queued or sent
+    email_client_mock.post.assert_not_called()
+    outbox = (await async_session.execute(select(EmailOutbox))).scalars().all()
+    assert outbox == []
\ No newline at end of file
@@ -0,0 +1,162 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.future import select
+
+from app.config import settings
+from app.core.circuit_breaker import CircuitBreaker
+from app.models.email_outbox import EmailOutbox, EmailOutboxStatus
+from app.services.auth_service import AuthService
+from app.services.email_outbox_service import EmailOutboxService
+from app.services.email_service import EmailService
+from tests.stubs.resend import ResendStub, resend_client
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+async def resend_stub():
+    """A local Resend API and an email service that talks to it."""
+    stub = ResendStub()
+    client = resend_client(stub)
+    stub.service = EmailService(
+        api_key=stub.api_key,
+        client=client,
+        breaker=CircuitBreaker("resend-outbox-test", failure_threshold=5, reset_timeout=30),
+    )
+    yield stub
+    await client.aclose()
+
+
+async def queue_emails(db, sender, *recipients):
+    outbox = EmailOutboxService(db, sender)
+    for recipient in recipients:
+        outbox.enqueue_invitation(recipient, f"token-{recipient}")
+    await db.commit()
+
+
+async def outbox_rows(db):
+    db.expire_all()
+    rows = (await db.execute(select(EmailOutbox).order_by(EmailOutbox.recipient))).scalars().all()
+    return {row.recipient: row for row in rows}
+
+
+async def make_due(db):
+    """Moves every pending retry into the past, as if its backoff had elapsed."""
+    await db.execute(update(EmailOutbox).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    await db.commit()
+
+
+async def test_create_invitation_queues_email_without_network(test_db, resend_stub):
+    """Test that creating an invitation writes an outbox row and makes no HTTP call."""
+    invitation = await AuthService(test_db).create_invitation("invitee@example.com")
+    token = invitation.token
+
+    assert resend_stub.requests == []
+    rows = await outbox_rows(test_db)
+    assert rows["invitee@example.com"].status == EmailOutboxStatus.PENDING
+    assert token in rows["invitee@example.com"].html
+
+
+async def test_drain_sends_due_emails_in_batches(test_db, resend_stub):
+    """Test that due emails are sent with the batch endpoint and marked SENT."""
+    recipients = [f"user{i}@example.com" for i in range(5)]
+    await queue_emails(test_db, resend_stub.service, *recipients)
+
+    totals = await EmailOutboxService(test_db, resend_stub.service).drain(batch_size=2)
+
+    assert totals == {"sent": 5, "retry": 0, "dead": 0}
+    assert [len(request["body"]) for request in resend_stub.batch_requests()] == [2, 2, 1]
+    assert all(request["headers"]["idempotency-key"].startswith("email-outbox/") for request in resend_stub.requests)
+    rows = await outbox_rows(test_db)
+    assert sorted(message["to"][0] for message in resend_stub.sent) == recipients
+    assert all(row.status == EmailOutboxStatus.SENT and row.provider_message_id for row in rows.values())
+    assert {row.provider_message_id for row in rows.values()} == {message["id"] for message in resend_stub.sent}
+
+
+async def test_transient_failure_is_retried_with_backoff(test_db, resend_stub):
+    """Test that a 5xx leaves emails pending with a backed-off next attempt."""
+    await queue_emails(test_db, resend_stub.service, "a@example.com", "b@example.com")
+    # Fails the first call and both of the email service's in-call retries
+    resend_stub.fail_next(503, times=1 + settings.email_max_retries)
+
+    totals = await EmailOutboxService(test_db, resend_stub.service).drain()
+
+    assert totals == {"sent": 0, "retry": 2, "dead": 0}
+    rows = await outbox_rows(test_db)
+    for row in rows.values():
+        assert row.status == EmailOutboxStatus.PENDING
+        assert row.attempts == 1
+        assert row.next_attempt_at > datetime.utcnow()
+        assert "HTTP 503" in row.last_error
+
+    # Not due yet, so a second drain does nothing
+    assert await EmailOutboxService(test_db, resend_stub.service).drain() == {"sent": 0, "retry": 0, "dead": 0}
+
+    await make_due(test_db)
+    totals = await EmailOutboxService(test_db, resend_stub.service).drain()
+
+    assert totals == {"sent": 2, "retry": 0, "dead": 0}
+    rows = await outbox_rows(test_db)
+    assert all(row.status == EmailOutboxStatus.SENT and row.attempts == 2 for row in rows.values())
+
+
+async def test_rejected_message_is_isolated_and_dead_lettered(test_db, resend_stub):
+    """Test that one invalid message doesn't block the rest of its batch."""
+    await queue_emails(test_db, resend_stub.service, "good1@example.com", "bad@example.com", "good2@example.com")
+    resend_stub.rejected_recipients.add("bad@example.com")
+
+    totals = await EmailOutboxService(test_db, resend_stub.service).drain()
+
+    assert totals == {"sent": 2, "retry": 0, "dead": 1}
+    rows = await outbox_rows(test_db)
+    assert rows["bad@example.com"].status == EmailOutboxStatus.DEAD
+    assert "HTTP 422" in rows["bad@example.com"].last_error
+    assert rows["good1@example.com"].status == EmailOutboxStatus.SENT
+    assert rows["good2@example.com"].status == EmailOutboxStatus.SENT
+
+
+async def test_email_is_dead_lettered_after_max_attempts(test_db, resend_stub, monkeypatch):
+    """Test that an email that keeps failing ends up DEAD."""
+    monkeypatch.setattr("app.services.email_outbox_service.settings.email_outbox_max_attempts", 2)
+    await queue_emails(test_db, resend_stub.service, "flaky@example.com")
+    resend_stub.fail_next(500, times=2 * (1 + settings.email_max_retries))
+
+    assert (await EmailOutboxService(test_db, resend_stub.service).drain())["retry"] == 1
+    await make_due(test_db)
+    assert (await EmailOutboxService(test_db, resend_stub.service).drain())["dead"] == 1
+
+    rows = await outbox_rows(test_db)
+    assert rows["flaky@example.com"].status == EmailOutboxStatus.DEAD
+    assert rows["flaky@example.com"].attempts == 2
+
+    # Dead emails are never picked up again
+    await make_due(test_db)
+    assert await EmailOutboxService(test_db, resend_stub.service).drain() == {"sent": 0, "retry": 0, "dead": 0}
+
+
+async def test_claimed_emails_are_leased(test_db, resend_stub):
+    """Test that a claimed batch is not handed to a second worker while in flight."""
+    await queue_emails(test_db, resend_stub.service, "lease@example.com")
+    service = EmailOutboxService(test_db, resend_stub.service)
+
+    first = await service._claim(10)
+    second = await service._claim(10)
+
+    assert [row["recipient"] for row in first] == ["lease@example.com"]
+    assert second == []
+
+
+async def test_drain_leaves_emails_queued_while_breaker_is_open(test_db, resend_stub):
+    """Test that nothing is leased or sent while the provider's breaker is open."""
+    await queue_emails(test_db, resend_stub.service, "waiting@example.com")
+    for _ in range(resend_stub.service.breaker.failure_threshold):
+        resend_stub.service.breaker.record_failure()
+
+    totals = await EmailOutboxService(test_db, resend_stub.service).drain()
+
+    assert totals == {"sent": 0, "retry": 0, "dead": 0}
+    assert resend_stub.requests == []
+    rows = await outbox_rows(test_db)
+    assert rows["waiting@example.com"].attempts == 0
+    assert rows["waiting@example.com"].next_attempt_at <= datetime.utcnow()
@@ -0,0 +1,110 @@
+import time
+
+import httpx
+import pytest
+
+from app.core.circuit_breaker import CircuitBreaker, OPEN
+from app.exceptions import CircuitOpenError
+from app.services import email_service as email_service_module
+from app.services.email_service import EmailService
+from tests.stubs.resend import ResendStub, resend_client
+
+pytestmark = pytest.mark.asyncio
+
+MESSAGE = {"from": "Test <test@example.com>", "to": ["user@example.com"], "subject": "Hi", "html": "<p>Hi</p>"}
+
+
+@pytest.fixture
+async def resend_stub():
+    """A local Resend API and an email service (with its own breaker) that talks to it."""
+    stub = ResendStub()
+    stub.service = EmailService(
+        api_key=stub.api_key,
+        client=resend_client(stub),
+        breaker=CircuitBreaker("resend-test", failure_threshold=3, reset_timeout=30),
+    )
+    yield stub
+    await stub.service.aclose()
+
+
+async def test_retries_5xx_then_succeeds(resend_stub):
+    """Test that transient 5xx responses are retried within the deadline."""
+    resend_stub.fail_next(503, times=2)
+    retries = email_service_module.retries_total.value(endpoint="/emails")
+
+    result = await resend_stub.service.send_email(MESSAGE, idempotency_key="key-1", deadline=1.0)
+
+    assert result["id"] == resend_stub.sent[0]["id"]
+    assert len(resend_stub.requests) == 3
+    assert {r["headers"]["idempotency-key"] for r in resend_stub.requests} == {"key-1"}
+    assert email_service_module.retries_total.value(endpoint="/emails") == retries + 2
+    assert email_service_module.request_seconds.count(endpoint="/emails", outcome="5xx") >= 2
+
+
+async def test_rate_limit_honours_retry_after(resend_stub):
+    """Test that a 429 is retried after its Retry-After delay."""
+    resend_stub.fail_next(429, headers={"Retry-After": "0.05"})
+
+    started = time.perf_counter()
+    await resend_stub.service.send_email(MESSAGE, deadline=1.0)
+
+    assert time.perf_counter() - started >= 0.05
+    assert len(resend_stub.requests) == 2
+    assert resend_stub.service.breaker.state != OPEN
+
+
+async def test_client_errors_are_not_retried(resend_stub):
+    """Test that a 4xx fails immediately and does not count against the provider."""
+    resend_stub.rejected_recipients.add("user@example.com")
+
+    for _ in range(5):
+        with pytest.raises(httpx.HTTPStatusError):
+            await resend_stub.service.send_email(MESSAGE)
+
+    assert len(resend_stub.requests) == 5
+    assert resend_stub.service.breaker.state == "closed"
+
+
+async def test_deadline_bounds_slow_provider(resend_stub):
+    """Test that a call gives up once its deadline passes, retries included."""
+    resend_stub.delay_next(1.0, times=3)
+
+    started = time.perf_counter()
+    with pytest.raises(httpx.TimeoutException):
+        await resend_stub.service.send_email(MESSAGE, deadline=0.2)
+
+    assert time.perf_counter() - started < 0.5
+
+
+async def test_breaker_fails_fast_while_provider_is_down(resend_stub):
+    """Test that the breaker opens after repeated failures and then skips the provider."""
+    resend_stub.fail_next(500, times=100)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await resend_stub.service.send_email(MESSAGE, deadline=1.0)
+    with pytest.raises((httpx.HTTPStatusError, CircuitOpenError)):
+        await resend_stub.service.send_email(MESSAGE, deadline=1.0)
+    calls = len(resend_stub.requests)
+    assert resend_stub.service.breaker.state == OPEN
+
+    started = time.perf_counter()
+    with pytest.raises(CircuitOpenError):
+        await resend_stub.service.send_email(MESSAGE)
+
+    assert len(resend_stub.requests) == calls
+    assert time.perf_counter() - started < 0.01
+
+
+async def test_client_lifecycle():
+    """Test that start() opens a pooled HTTP/2 client and aclose() releases it."""
+    service = EmailService(api_key="key", base_url="http://resend.invalid")
+    assert service.client is None
+
+    await service.start()
+    client = service.client
+    assert client._transport._pool._http2
+    assert client._transport._pool._max_connections == email_service_module.settings.email_max_connections
+
+    await service.aclose()
+    assert service.client is None
+    assert client.is_closed
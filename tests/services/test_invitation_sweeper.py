@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.models.invitation import Invitation, InvitationStatus
+from app.services.invitation_sweeper import InvitationSweeper, build_expire_chunk_statement
+
+pytestmark = pytest.mark.asyncio
+
+
+async def seed(db, name, expires_in, status=InvitationStatus.PENDING):
+    invitation = Invitation(
+        email=f"{name}@example.com",
+        token=f"token-{name}",
+        status=status,
+        expires_at=datetime.utcnow() + expires_in
+    )
+    db.add(invitation)
+    return invitation
+
+
+async def statuses(db):
+    db.expire_all()
+    rows = (await db.execute(select(Invitation.email, Invitation.status))).all()
+    return {email.split("@")[0]: status for email, status in rows}
+
+
+async def test_expires_only_overdue_pending_invitations(test_db):
+    """Test that overdue PENDING invitations expire and everything else is untouched."""
+    await seed(test_db, "overdue", timedelta(hours=-1))
+    await seed(test_db, "active", timedelta(days=1))
+    await seed(test_db, "accepted", timedelta(hours=-1), status=InvitationStatus.ACCEPTED)
+    await test_db.commit()
+
+    expired = await InvitationSweeper(test_db).expire_overdue()
+
+    assert expired == 1
+    assert await statuses(test_db) == {
+        "overdue": InvitationStatus.EXPIRED,
+        "active": InvitationStatus.PENDING,
+        "accepted": InvitationStatus.ACCEPTED,
+    }
+
+
+async def test_sweeps_in_bounded_chunks(test_db, query_counter):
+    """Test that each chunk is one bounded UPDATE committed on its own."""
+    for i in range(5):
+        await seed(test_db, f"overdue{i}", timedelta(minutes=-i - 1))
+    await test_db.commit()
+    del query_counter[:]
+
+    expired = await InvitationSweeper(test_db).expire_overdue(chunk_size=2)
+
+    assert expired == 5
+    assert [s.split()[0].upper() for s in query_counter] == ["UPDATE"] * 3
+    assert set((await statuses(test_db)).values()) == {InvitationStatus.EXPIRED}
+
+
+async def test_stops_after_max_chunks_and_resumes(test_db):
+    """Test that a run is bounded and the next run finishes the backlog."""
+    for i in range(5):
+        await seed(test_db, f"overdue{i}", timedelta(minutes=-i - 1))
+    await test_db.commit()
+
+    assert await InvitationSweeper(test_db).expire_overdue(chunk_size=2, max_chunks=1) == 2
+    assert await InvitationSweeper(test_db).expire_overdue(chunk_size=2) == 3
+    assert await InvitationSweeper(test_db).expire_overdue(chunk_size=2) == 0
+
+
+def test_chunk_statement_skips_locked_rows_on_postgresql():
+    """Test that the chunk is keyset-bounded and skips rows locked by other replicas."""
+    statement = build_expire_chunk_statement(
+        datetime.utcnow(), 1000, after=(datetime.utcnow(), "123e4567-e89b-12d3-a456-426614174000")
+    )
+    sql = " ".join(str(statement.compile(dialect=postgresql.dialect())).split())
+
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "invitations.expires_at, " in sql and "invitations.id) > (" in sql
+    assert "RETURNING" in sql
@@ -0,0 +1,24 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app.core.idempotency import StoredResponse, claim_statement
+from app.services.tracking_service import build_conversion_statement
+
+
+def test_conversion_statement_compiles_to_one_postgres_statement():
+    """Test that the PostgreSQL conversion is a single chain of data-modifying CTEs."""
+    now = datetime.utcnow()
+    claim = claim_statement("postgresql", "txn_1", StoredResponse(200, b"{}", "fingerprint"), now)
+    statement = build_conversion_statement("saas-user-1", uuid.uuid4(), now, claim)
+
+    sql = " ".join(str(statement.compile(dialect=postgresql.asyncpg.dialect())).split())
+
+    assert sql.startswith("WITH claimed_transaction AS (INSERT INTO")
+    assert "ON CONFLICT (transaction_id) DO NOTHING" in sql
+    assert "converted_referral AS (UPDATE" in sql
+    assert "counted_link AS (UPDATE" in sql
+    assert "scheduled_earning AS (INSERT INTO" in sql
+    assert "earnings_paid_count < $" in sql
+    assert sql.count("SELECT") >= 2  # target subquery and the earning's INSERT ... SELECT
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Resend HTTP API.
+
+ResendStub is an ASGI app that implements POST /emails and POST /emails/batch
+closely enough for the email service and outbox worker, and can inject failures
+(fail_next) and latency (delay_next). Point an httpx.AsyncClient at it with
+httpx.ASGITransport (see resend_client()).
+"""
+import asyncio
+import uuid
+from typing import List, Optional, Set
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+class ResendStub:
+    def __init__(self, api_key: str = "re_test_key"):
+        self.api_key = api_key
+        self.requests: List[dict] = [] # {"path", "headers", "body"} for every call
+        self.sent: List[dict] = [] # Messages accepted so far
+        self.rejected_recipients: Set[str] = set() # Recipients answered with 422
+        self._failures: List[tuple] = [] # (status code, headers) to answer the next calls with
+        self._delays: List[float] = [] # Seconds to stall the next calls for
+        self._idempotent = {}
+        self.app = Starlette(routes=[
+            Route("/emails", self._send, methods=["POST"]),
+            Route("/emails/batch", self._send_batch, methods=["POST"]),
+        ])
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+
+    def fail_next(self, status_code: int, times: int = 1, headers: Optional[dict] = None):
+        """Makes the next `times` requests fail with status_code."""
+        self._failures.extend([(status_code, headers)] * times)
+
+    def delay_next(self, seconds: float, times: int = 1):
+        """Makes the next `times` requests stall before answering."""
+        self._delays.extend([seconds] * times)
+
+    def batch_requests(self) -> List[dict]:
+        return [request for request in self.requests if request["path"] == "/emails/batch"]
+
+    async def _check(self, request: Request) -> Optional[JSONResponse]:
+        self.requests.append({
+            "path": request.url.path,
+            "headers": dict(request.headers),
+            "body": await request.json(),
+        })
+        if self._delays:
+            await asyncio.sleep(self._delays.pop(0))
+        if request.headers.get("authorization") != f"Bearer {self.api_key}":
+            return JSONResponse({"name": "missing_api_key"}, status_code=401)
+        if self._failures:
+            status_code, headers = self._failures.pop(0)
+            return JSONResponse({"name": "application_error"}, status_code=status_code, headers=headers)
+        return None
+
+    def _accept(self, message: dict) -> str:
+        message_id = str(uuid.uuid4())
+        self.sent.append(dict(message, id=message_id))
+        return message_id
+
+    async def _send(self, request: Request):
+        error = await self._check(request)
+        if error:
+            return error
+        message = self.requests[-1]["body"]
+        if set(message["to"]) & self.rejected_recipients:
+            return JSONResponse({"name": "validation_error"}, status_code=422)
+        key = request.headers.get("idempotency-key")
+        if key and key in self._idempotent:
+            return JSONResponse(self._idempotent[key])
+        body = {"id": self._accept(message)}
+        if key:
+            self._idempotent[key] = body
+        return JSONResponse(body)
+
+    async def _send_batch(self, request: Request):
+        error = await self._check(request)
+        if error:
+            return error
+        messages = self.requests[-1]["body"]
+        if len(messages) > 100:
+            return JSONResponse({"name": "validation_error"}, status_code=422)
+        if any(set(message["to"]) & self.rejected_recipients for message in messages):
+            # Resend validates the whole batch: one bad message rejects all of them
+            return JSONResponse({"name": "validation_error"}, status_code=422)
+        key = request.headers.get("idempotency-key")
+        if key and key in self._idempotent:
+            return JSONResponse(self._idempotent[key])
+        body = {"data": [{"id": self._accept(message)} for message in messages]}
+        if key:
+            self._idempotent[key] = body
+        return JSONResponse(body)
+
+
+def resend_client(stub: ResendStub) -> httpx.AsyncClient:
+    """An httpx client that sends Resend API calls to the stub."""
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=stub), base_url="https://api.resend.com")
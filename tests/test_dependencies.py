@@ -0,0 +1,120 @@
+import pytest
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+
+from app.core.principal_cache import clear_principal_cache
+from app.core.security import create_access_token, PRINCIPAL_ADMIN, PRINCIPAL_PARTICIPANT
+from app.dependencies import get_current_user
+from app.models.admin_user import AdminUser, AdminRole
+from app.models.user import User, UserStatus
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def reset_principal_cache():
+    clear_principal_cache()
+    yield
+    clear_principal_cache()
+
+
+async def create_participant(db):
+    user = User(
+        id=uuid.uuid4(),
+        full_name="Test User",
+        email=f"{uuid.uuid4().hex}@example.com",
+        password_hash="hashed_password",
+        phone_number="+254712345678",
+        created_at=datetime.utcnow()
+    )
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def test_participant_token_needs_single_lookup(test_db, query_counter):
+    """Test that a participant token resolves with one query against users only."""
+    user = await create_participant(test_db)
+    token = create_access_token(data={"sub": str(user.id)}, principal_type=PRINCIPAL_PARTICIPANT)
+    test_db.expunge_all()
+    query_counter.clear()
+
+    principal = await get_current_user(db=test_db, token=token)
+
+    assert isinstance(principal, User)
+    assert principal.id == user.id
+    assert len(query_counter) == 1
+    assert "admin_users" not in query_counter[0]
+
+
+async def test_cached_principal_needs_no_queries(test_db, query_counter):
+    """Test that a repeated request is resolved from the principal cache."""
+    user = await create_participant(test_db)
+    token = create_access_token(data={"sub": str(user.id)}, principal_type=PRINCIPAL_PARTICIPANT)
+    test_db.expunge_all()
+    first = await get_current_user(db=test_db, token=token)
+    query_counter.clear()
+
+    second = await get_current_user(db=test_db, token=token)
+
+    assert query_counter == []
+    assert isinstance(second, User)
+    assert second is not first
+    assert second.email == user.email
+
+
+async def test_status_change_invalidates_cached_principal(test_db, query_counter):
+    """Test that deactivating a user drops the cached principal."""
+    user = await create_participant(test_db)
+    token = create_access_token(data={"sub": str(user.id)}, principal_type=PRINCIPAL_PARTICIPANT)
+    await get_current_user(db=test_db, token=token)
+
+    user.status = UserStatus.INACTIVE
+    await test_db.commit()
+    test_db.expunge_all()
+    query_counter.clear()
+
+    principal = await get_current_user(db=test_db, token=token)
+
+    assert len(query_counter) == 1
+    assert principal.status == UserStatus.INACTIVE
+
+
+async def test_admin_token_resolves_admin(test_db, query_counter):
+    """Test that an admin token is looked up in admin_users only."""
+    admin = AdminUser(email="admin@example.com", password_hash="hashed_password", role=AdminRole.CTO)
+    test_db.add(admin)
+    await test_db.commit()
+    await test_db.refresh(admin)
+    token = create_access_token(data={"sub": str(admin.id)}, principal_type=PRINCIPAL_ADMIN)
+    test_db.expunge_all()
+    query_counter.clear()
+
+    principal = await get_current_user(db=test_db, token=token)
+
+    assert isinstance(principal, AdminUser)
+    assert len(query_counter) == 1
+    assert "admin_users" in query_counter[0]
+
+
+async def test_principal_type_mismatch_is_rejected(test_db):
+    """Test that a participant id presented with an admin claim is not resolved."""
+    user = await create_participant(test_db)
+    token = create_access_token(data={"sub": str(user.id)}, principal_type=PRINCIPAL_ADMIN)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(db=test_db, token=token)
+    assert exc_info.value.status_code == 401
+
+
+async def test_legacy_token_without_claim_still_resolves(test_db):
+    """Test that tokens issued before the principal claim keep working."""
+    user = await create_participant(test_db)
+    token = create_access_token(data={"sub": str(user.id)})
+
+    principal = await get_current_user(db=test_db, token=token)
+
+    assert isinstance(principal, User)
+    assert principal.id == user.id